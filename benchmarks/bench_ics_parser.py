@@ -0,0 +1,55 @@
+"""Compare the fast-path ICS reader with the full icalendar parser.
+
+The corpus comes from `tests/fakes.py`; one invite in six carries an RRULE, so the fast-path
+figure includes its fallback cost. Run from the repository root:
+
+    python benchmarks/bench_ics_parser.py [--invites 2000] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+
+from fakes import meetup_invite  # noqa: E402
+
+from meetup_gmail_calendar_sync.ics_parser import (  # noqa: E402
+    _decode_ics_with_icalendar,
+    decode_ics,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--invites", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = [meetup_invite(index) for index in range(args.invites)]
+    candidates = {
+        "icalendar": _decode_ics_with_icalendar,
+        "fast-path": decode_ics,
+    }
+
+    timings: dict[str, float] = {}
+    for name, decode in candidates.items():
+        best = min(
+            timeit.repeat(
+                lambda decode=decode: [decode(ics) for ics in corpus],
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        timings[name] = best
+        per_invite_us = best / len(corpus) * 1_000_000
+        print(f"{name:>10}: {best:.3f}s for {len(corpus)} invites ({per_invite_us:.0f} us/invite)")
+
+    print(f"speedup: {timings['icalendar'] / timings['fast-path']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
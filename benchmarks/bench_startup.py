@@ -0,0 +1,58 @@
+"""Measure CLI startup: import time, `--help`, and time until the first API request is ready.
+
+Each figure is the median wall time of a fresh interpreter, so module caches from earlier runs
+do not hide import regressions. "first request" imports the sync entry point, builds both
+services from the bundled discovery documents and constructs (without sending) the first
+calendar call a sync makes. Run from the repository root:
+
+    python benchmarks/bench_startup.py [--repeat 15]
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+SCENARIOS = {
+    "import cli": "import meetup_gmail_calendar_sync.cli",
+    "--help": (
+        "from meetup_gmail_calendar_sync.cli import main\n"
+        "try:\n"
+        "    main(['--help'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+    ),
+    "first request": (
+        "from google.auth.credentials import AnonymousCredentials\n"
+        "import meetup_gmail_calendar_sync.sync\n"
+        "from meetup_gmail_calendar_sync.fields import CALENDAR_SUMMARY_FIELDS\n"
+        "from meetup_gmail_calendar_sync.transport import build_services\n"
+        "_, calendar = build_services(AnonymousCredentials())\n"
+        "calendar.calendars().get(calendarId='primary', fields=CALENDAR_SUMMARY_FIELDS)\n"
+    ),
+}
+
+
+def _run(code: str) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=15)
+    args = parser.parse_args()
+
+    baseline = statistics.median(_run("pass") for _ in range(args.repeat))
+    print(f"{'interpreter':>14}: {baseline * 1000:.0f} ms")
+    for name, code in SCENARIOS.items():
+        median = statistics.median(_run(code) for _ in range(args.repeat))
+        print(f"{name:>14}: {median * 1000:.0f} ms (+{(median - baseline) * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Offline sync benchmark against simulated Gmail and Calendar services.
+
+Mailboxes come from `tests/fakes.py` (three mails per event in one thread, one mail per hour),
+served through a `FakeNetwork` with configurable per-round-trip latency and injected 503
+failures.
+The sync scenarios drive the same engines `run_sync` dispatches to, without the OAuth and
+discovery setup in front of them. For each scenario and mailbox size the harness reports wall
+time, API calls, HTTP round trips, response bytes and peak traced memory. Run from the
+repository root:
+
+    python benchmarks/bench_sync.py [--messages 100 1000 10000] [--latency 0.02]
+        [--failure-rate 0.01] [--respect-quota] [--skip-memory]
+
+Client-side quota pacing is lifted by default, so the figures show the code rather than the
+per-user quota; `--respect-quota` keeps the real token-bucket rates.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+
+from fakes import FakeCalendarService, FakeNetwork, synthetic_mailbox  # noqa: E402
+
+from meetup_gmail_calendar_sync import throttle  # noqa: E402
+from meetup_gmail_calendar_sync.config import GMAIL_QUERY_DEFAULT  # noqa: E402
+from meetup_gmail_calendar_sync.gmail_client import iter_message_ids  # noqa: E402
+from meetup_gmail_calendar_sync.pipeline import run_pipeline  # noqa: E402
+from meetup_gmail_calendar_sync.store import StateStore  # noqa: E402
+from meetup_gmail_calendar_sync.sync import collect_events, run_steps, sync_steps  # noqa: E402
+
+LOOKBACK_DAYS = 2
+LIST_SHARDS = 8
+
+Scenario = Callable[[Any, Any, Path, int], None]
+
+
+def _collect(gmail: Any, calendar: Any, state_path: Path, size: int) -> None:
+    collect_events(gmail, query=GMAIL_QUERY_DEFAULT, max_messages=size, verbose=False)
+
+
+def _collect_raw(gmail: Any, calendar: Any, state_path: Path, size: int) -> None:
+    collect_events(
+        gmail, query=GMAIL_QUERY_DEFAULT, max_messages=size, verbose=False, fetch_format="raw"
+    )
+
+
+def _collect_threads(gmail: Any, calendar: Any, state_path: Path, size: int) -> None:
+    collect_events(
+        gmail, query=GMAIL_QUERY_DEFAULT, max_messages=size, verbose=False, collapse_threads=True
+    )
+
+
+def _list(gmail: Any, calendar: Any, state_path: Path, size: int, shards: int = 1) -> None:
+    for _ in iter_message_ids(gmail, GMAIL_QUERY_DEFAULT, size, shards=shards):
+        pass
+
+
+def _list_sharded(gmail: Any, calendar: Any, state_path: Path, size: int) -> None:
+    _list(gmail, calendar, state_path, size, shards=LIST_SHARDS)
+
+
+def _phased(
+    gmail: Any, calendar: Any, state_path: Path, size: int, fetch_format: str = "full"
+) -> None:
+    with StateStore(state_path) as store:
+        run_steps(
+            sync_steps(
+                gmail,
+                calendar,
+                "cal",
+                query=GMAIL_QUERY_DEFAULT,
+                max_messages=size,
+                lookback_days=LOOKBACK_DAYS,
+                dry_run=False,
+                verbose=False,
+                store=store,
+                incremental=True,
+                fetch_format=fetch_format,
+            )
+        )
+
+
+def _phased_raw(gmail: Any, calendar: Any, state_path: Path, size: int) -> None:
+    _phased(gmail, calendar, state_path, size, fetch_format="raw")
+
+
+def _pipeline(gmail: Any, calendar: Any, state_path: Path, size: int) -> None:
+    with StateStore(state_path) as store:
+        run_pipeline(
+            lambda: gmail,
+            lambda: calendar,
+            "cal",
+            query=GMAIL_QUERY_DEFAULT,
+            max_messages=size,
+            lookback_days=LOOKBACK_DAYS,
+            dry_run=False,
+            verbose=False,
+            store=store,
+            incremental=True,
+        )
+
+
+# name -> (untimed setup, timed run)
+SCENARIOS: dict[str, tuple[Scenario | None, Scenario]] = {
+    "list": (None, _list),
+    f"list, {LIST_SHARDS} shards": (None, _list_sharded),
+    "collect_events": (None, _collect),
+    "collect_events, raw": (None, _collect_raw),
+    "collect_events, threads": (None, _collect_threads),
+    "sync phased": (None, _phased),
+    "sync phased, raw": (None, _phased_raw),
+    "sync phased, warm": (_phased, _phased),
+    "sync pipeline": (None, _pipeline),
+}
+
+
+@dataclass
+class Result:
+    wall_seconds: float
+    api_calls: int
+    round_trips: int
+    bytes_received: int
+    failures: int
+    peak_bytes: int | None
+
+
+def _api_calls(gmail: Any, calendar: Any) -> int:
+    return sum(
+        count
+        for service in (gmail, calendar)
+        for name, count in service.calls.items()
+        if name != "batch"
+    )
+
+
+def measure(
+    setup: Scenario | None,
+    run: Scenario,
+    size: int,
+    *,
+    latency: float,
+    failure_rate: float,
+    trace_memory: bool,
+) -> Result:
+    network = FakeNetwork(latency=latency, failure_rate=failure_rate)
+    gmail = synthetic_mailbox(size, network=network)
+    calendar = FakeCalendarService(network=network)
+    throttle._shared_schedulers.clear()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state_path = Path(tmp) / "state.sqlite3"
+        if setup is not None:
+            setup(gmail, calendar, state_path, size)
+        calls = _api_calls(gmail, calendar)
+        round_trips, received, failures = (
+            network.round_trips,
+            network.bytes_received,
+            network.failures,
+        )
+
+        if trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        run(gmail, calendar, state_path, size)
+        wall = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        tracemalloc.stop()
+
+    return Result(
+        wall_seconds=wall,
+        api_calls=_api_calls(gmail, calendar) - calls,
+        round_trips=network.round_trips - round_trips,
+        bytes_received=network.bytes_received - received,
+        failures=network.failures - failures,
+        peak_bytes=peak,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per round trip")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append")
+    parser.add_argument("--respect-quota", action="store_true")
+    parser.add_argument(
+        "--skip-memory",
+        action="store_true",
+        help="skip the second, tracemalloc-instrumented pass that measures peak memory",
+    )
+    args = parser.parse_args()
+
+    if not args.respect_quota:
+        for api in throttle.SCHEDULER_LIMITS:
+            throttle.SCHEDULER_LIMITS[api] = (1e9, 1e9)
+
+    print(
+        f"{'scenario':<24} {'messages':>8} {'wall s':>8} {'calls':>7} {'trips':>6} "
+        f"{'fails':>5} {'MB recv':>8} {'peak MB':>8}"
+    )
+    for size in args.messages:
+        for name in args.scenario or SCENARIOS:
+            setup, run = SCENARIOS[name]
+            options = {"latency": args.latency, "failure_rate": args.failure_rate}
+            result = measure(setup, run, size, trace_memory=False, **options)
+            peak = "-"
+            if not args.skip_memory:
+                traced = measure(setup, run, size, trace_memory=True, **options)
+                peak = f"{traced.peak_bytes / 1e6:.1f}"
+            print(
+                f"{name:<24} {size:>8} {result.wall_seconds:>8.2f} {result.api_calls:>7} "
+                f"{result.round_trips:>6} {result.failures:>5} "
+                f"{result.bytes_received / 1e6:>8.2f} {peak:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Sync several Gmail accounts in one process over a shared worker pool."""
+
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Callable, Generator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import yaml
+
+from .auth import build_credentials
+from .calendar_client import resolve_calendar
+from .config import (
+    CALENDAR_NAME_DEFAULT,
+    DEFAULT_ACCOUNT_WORKERS,
+    DEFAULT_CONFIG_DIR,
+    DEFAULT_CREDENTIALS_PATH,
+    GMAIL_FETCH_FORMATS,
+    GMAIL_QUERY_DEFAULT,
+    SYNCED_LABEL_DEFAULT,
+)
+from .store import StateStore
+from .sync import SyncStats, oldest_useful_message, sync_scopes, sync_steps
+from .transport import build_services
+
+
+@dataclass(frozen=True)
+class Account:
+    name: str
+    token_path: Path
+    credentials_path: Path = DEFAULT_CREDENTIALS_PATH
+    calendar_name: str = CALENDAR_NAME_DEFAULT
+    query: str = GMAIL_QUERY_DEFAULT
+    max_messages: int = 500
+    lookback_days: int = 2
+    state_path: Path | None = None
+    incremental: bool = False
+    stop_early: bool = False
+    fetch_format: str = "full"
+    collapse_threads: bool = False
+    synced_label: str | None = None
+    list_shards: int = 1
+
+
+@dataclass
+class AccountResult:
+    name: str
+    calendar_id: str | None = None
+    stats: SyncStats | None = None
+    error: str | None = None
+
+
+def _config_path(value: Any, base_dir: Path) -> Path:
+    path = Path(str(value)).expanduser()
+    return path if path.is_absolute() else (base_dir / path).resolve()
+
+
+def load_accounts(config_path: Path) -> list[Account]:
+    """Read the accounts file.
+
+    ```yaml
+    defaults:            # optional, applied to every account
+      credentials: credentials.json
+      query: "from:meetup filename:ics newer_than:730d"
+    accounts:
+      - name: alice
+        token: alice-token.json
+        calendar_name: Meetup
+      - name: bob
+        token: bob-token.json
+        state_db: null   # disable the state db for this account
+    ```
+
+    Relative paths are resolved against the file's directory. Each account gets its own state
+    db (`state-<name>.sqlite3` in the config dir) unless `state_db` says otherwise.
+    """
+    if not config_path.exists():
+        raise RuntimeError(f"Accounts file not found: {config_path}")
+    doc = yaml.safe_load(config_path.read_text(encoding="utf-8")) or {}
+    if not isinstance(doc, dict) or not isinstance(doc.get("accounts"), list):
+        raise RuntimeError(f"Accounts file needs an 'accounts' list: {config_path}")
+
+    base_dir = config_path.parent
+    defaults = doc.get("defaults") or {}
+    accounts: list[Account] = []
+    seen: set[str] = set()
+    for entry in doc["accounts"]:
+        if not isinstance(entry, dict):
+            raise RuntimeError(f"Unsupported account entry in {config_path}: {entry!r}")
+        settings = {**defaults, **entry}
+        name = str(settings.get("name") or "").strip()
+        if not name or "token" not in settings:
+            raise RuntimeError(f"Every account needs a 'name' and a 'token': {entry!r}")
+        if name in seen:
+            raise RuntimeError(f"Duplicate account name in {config_path}: {name}")
+        seen.add(name)
+
+        if "state_db" not in settings:
+            state_path = DEFAULT_CONFIG_DIR / f"state-{name}.sqlite3"
+        elif settings["state_db"] is None:
+            state_path = None
+        else:
+            state_path = _config_path(settings["state_db"], base_dir)
+
+        fetch_format = str(settings.get("fetch_format", "full"))
+        if fetch_format not in GMAIL_FETCH_FORMATS:
+            raise RuntimeError(f"Unsupported fetch_format for account {name}: {fetch_format}")
+
+        label = settings.get("label_synced")
+        synced_label = SYNCED_LABEL_DEFAULT if label is True else (str(label) if label else None)
+
+        accounts.append(
+            Account(
+                name=name,
+                token_path=_config_path(settings["token"], base_dir),
+                credentials_path=_config_path(
+                    settings.get("credentials", DEFAULT_CREDENTIALS_PATH), base_dir
+                ),
+                calendar_name=str(settings.get("calendar_name", CALENDAR_NAME_DEFAULT)),
+                query=str(settings.get("query", GMAIL_QUERY_DEFAULT)),
+                max_messages=int(settings.get("max_messages", 500)),
+                lookback_days=int(settings.get("lookback_days", 2)),
+                state_path=state_path,
+                incremental=bool(settings.get("incremental", False)) and state_path is not None,
+                stop_early=bool(settings.get("stop_early", False)),
+                fetch_format=fetch_format,
+                collapse_threads=bool(settings.get("collapse_threads", False)),
+                synced_label=synced_label,
+                list_shards=int(settings.get("list_shards", 1)),
+            )
+        )
+    return accounts
+
+
+def _build_services(account: Account) -> tuple[Any, Any]:
+    creds = build_credentials(
+        credentials_path=account.credentials_path,
+        token_path=account.token_path,
+        required_scopes=sync_scopes(label_synced=account.synced_label is not None),
+    )
+    return build_services(creds)
+
+
+def account_steps(
+    account: Account,
+    result: AccountResult,
+    *,
+    dry_run: bool,
+    verbose: bool,
+    build_services: Callable[[Account], tuple[Any, Any]] = _build_services,
+) -> Generator[None, None, None]:
+    gmail_service, calendar_service = build_services(account)
+    yield
+
+    store = StateStore(account.state_path) if account.state_path is not None else None
+    try:
+        result.calendar_id = resolve_calendar(calendar_service, account.calendar_name, store)
+        if verbose:
+            print(f"[{account.name}] using calendar: {result.calendar_id}")
+        yield
+
+        not_before = (
+            oldest_useful_message(store, account.lookback_days) if account.stop_early else None
+        )
+        result.stats = yield from sync_steps(
+            gmail_service,
+            calendar_service,
+            result.calendar_id,
+            query=account.query,
+            max_messages=account.max_messages,
+            lookback_days=account.lookback_days,
+            dry_run=dry_run,
+            verbose=verbose,
+            store=store,
+            incremental=account.incremental,
+            not_before=not_before,
+            fetch_format=account.fetch_format,
+            collapse_threads=account.collapse_threads,
+            synced_label=account.synced_label,
+            list_shards=account.list_shards,
+        )
+    finally:
+        if store is not None:
+            store.close()
+
+
+def run_accounts(
+    accounts: list[Account],
+    *,
+    dry_run: bool,
+    verbose: bool,
+    workers: int = DEFAULT_ACCOUNT_WORKERS,
+    build_services: Callable[[Account], tuple[Any, Any]] = _build_services,
+) -> list[AccountResult]:
+    """Sync every account, interleaving their steps round-robin over `workers` threads.
+
+    Each account runs one step (about one API batch) at a time and then goes to the back of the
+    queue, so a large mailbox cannot starve the others. A failing account records its error
+    and drops out without affecting the rest.
+    """
+    results = [AccountResult(account.name) for account in accounts]
+    ready = deque(
+        (
+            result,
+            account_steps(
+                account, result, dry_run=dry_run, verbose=verbose, build_services=build_services
+            ),
+        )
+        for account, result in zip(accounts, results)
+    )
+    running: dict[Future, tuple[AccountResult, Generator[None, None, None]]] = {}
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, workers), thread_name_prefix="meetup-sync-account"
+    ) as executor:
+        while ready or running:
+            while ready and len(running) < max(1, workers):
+                result, steps = ready.popleft()
+                running[executor.submit(next, steps)] = (result, steps)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                result, steps = running.pop(future)
+                try:
+                    future.result()
+                except StopIteration:
+                    continue
+                except Exception as exc:
+                    print(f"warning: account {result.name} failed: {exc}")
+                    result.error = str(exc)
+                    continue
+                ready.append((result, steps))
+
+    return results
@@ -5,14 +5,15 @@ from __future__ import annotations
 import json
 import os
 import stat
-from collections.abc import Iterable
+import tempfile
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Any
 
-import yaml
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
 
 from .config import GMAIL_MODIFY_SCOPE, GMAIL_READ_SCOPE
 
@@ -27,14 +28,18 @@ def _harden_file_permissions(path: Path) -> None:
         raise RuntimeError(f"Unable to secure permissions for {path}: {exc}") from exc
 
 
-def parse_token_file(token_path: Path) -> dict[str, Any]:
+def _read_token_file(token_path: Path) -> tuple[dict[str, Any], bool]:
+    """The token data, and whether the file is plain JSON rather than a legacy YAML wrapper."""
     raw = token_path.read_text(encoding="utf-8").strip()
     if not raw:
         raise RuntimeError(f"Token file is empty: {token_path}")
 
-    if raw.startswith("{"):
+    is_json = raw.startswith("{")
+    if is_json:
         data = json.loads(raw)
     else:
+        import yaml
+
         data = yaml.safe_load(raw)
         if isinstance(data, dict) and isinstance(data.get("default"), str):
             data = json.loads(data["default"])
@@ -42,7 +47,11 @@ def parse_token_file(token_path: Path) -> dict[str, Any]:
     if not isinstance(data, dict):
         raise RuntimeError(f"Unsupported token format: {token_path}")
 
-    return data
+    return data, is_json
+
+
+def parse_token_file(token_path: Path) -> dict[str, Any]:
+    return _read_token_file(token_path)[0]
 
 
 def normalize_scopes(raw_scopes: Any) -> list[str]:
@@ -76,9 +85,141 @@ def _authorized_user_info(credentials_path: Path, token_data: dict[str, Any]) ->
         "client_id": token_data.get("client_id") or installed.get("client_id"),
         "client_secret": token_data.get("client_secret") or installed.get("client_secret"),
         "scopes": token_scopes,
+        "expiry": token_data.get("expiry"),
     }
 
 
+def write_token_file(token_path: Path, creds: Credentials) -> None:
+    """Replace `token_path` atomically, so a concurrent reader never sees a partial token."""
+    token_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=token_path.parent, prefix=f".{token_path.name}.")
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(creds.to_json())
+            handle.flush()
+            os.fsync(handle.fileno())
+        _harden_file_permissions(tmp_path)
+        os.replace(tmp_path, token_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+@contextmanager
+def _token_lock(token_path: Path) -> Iterator[None]:
+    """Serialize token refreshes between processes (and threads) sharing `token_path`."""
+    if os.name != "posix":
+        yield
+        return
+    import fcntl
+
+    lock_path = token_path.with_name(f"{token_path.name}.lock")
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, stat.S_IRUSR | stat.S_IWUSR)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+class CredentialManager:
+    """Stored OAuth credentials that are refreshed ahead of expiry and written back.
+
+    Refreshed access tokens are persisted, so the next run starts with a valid token instead
+    of an OAuth round trip. Refreshes take a lock next to the token file and re-read it first:
+    when several syncs share a token, only one of them refreshes and the others pick it up.
+    A legacy YAML token file is rewritten as JSON on load, so re-reads are plain JSON.
+    """
+
+    def __init__(
+        self,
+        credentials_path: Path,
+        token_path: Path,
+        *,
+        required_scopes: Iterable[str],
+        refresh_margin: timedelta = timedelta(0),
+    ) -> None:
+        if not credentials_path.exists():
+            raise RuntimeError(f"Credentials file not found: {credentials_path}")
+        if not token_path.exists():
+            raise RuntimeError(
+                f"Token file not found: {token_path}. Run `meetup-gcal-sync auth` first."
+            )
+        self.credentials_path = credentials_path
+        self.token_path = token_path
+        self.required_scopes = list(required_scopes)
+        self.refresh_margin = refresh_margin
+        _harden_file_permissions(self.token_path)
+        token_data, is_json = _read_token_file(self.token_path)
+        self.credentials = self._credentials(token_data)
+        self._persisted_token = self.credentials.token
+        if not is_json:
+            with _token_lock(self.token_path):
+                self._persist()
+
+    def _load(self) -> Credentials:
+        """Re-read the token file, which the manager has made sure is JSON."""
+        _harden_file_permissions(self.token_path)
+        return self._credentials(json.loads(self.token_path.read_text(encoding="utf-8")))
+
+    def _credentials(self, token_data: dict[str, Any]) -> Credentials:
+        authorized_user = _authorized_user_info(self.credentials_path, token_data)
+
+        scopes = normalize_scopes(authorized_user.get("scopes"))
+        missing = [scope for scope in self.required_scopes if not _scope_satisfied(scope, scopes)]
+        if missing:
+            raise RuntimeError(
+                "Token is missing required scopes. "
+                f"Missing: {', '.join(missing)}. Run `meetup-gcal-sync auth` again."
+            )
+        return Credentials.from_authorized_user_info(authorized_user, scopes=scopes)
+
+    def _needs_refresh(self, creds: Credentials) -> bool:
+        if not creds.valid:
+            return True
+        if creds.expiry is None:
+            return False
+        # google-auth keeps expiry as naive UTC.
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return creds.expiry - self.refresh_margin <= now
+
+    def ensure_fresh(self) -> Credentials:
+        """Refresh the credentials in place if they expire within `refresh_margin`."""
+        creds = self.credentials
+        if not self._needs_refresh(creds):
+            if creds.token != self._persisted_token:
+                # The transport refreshed on its own (e.g. after a 401); keep that token unless
+                # another sync has written a newer one meanwhile.
+                with _token_lock(self.token_path):
+                    stored = self._load()
+                    if stored.expiry is None or (
+                        creds.expiry is not None and stored.expiry < creds.expiry
+                    ):
+                        self._persist()
+                    else:
+                        self._persisted_token = creds.token
+            return creds
+        if not creds.refresh_token:
+            raise RuntimeError("Google credentials are invalid. Run `meetup-gcal-sync auth` again.")
+
+        with _token_lock(self.token_path):
+            stored = self._load()
+            if stored.refresh_token == creds.refresh_token and not self._needs_refresh(stored):
+                # Another sync refreshed while we waited for the lock.
+                creds.token = stored.token
+                creds.expiry = stored.expiry
+                self._persisted_token = stored.token
+                return creds
+            creds.refresh(Request())
+            self._persist()
+        return creds
+
+    def _persist(self) -> None:
+        write_token_file(self.token_path, self.credentials)
+        self._persisted_token = self.credentials.token
+
+
 def build_credentials(
     credentials_path: Path,
     token_path: Path,
@@ -86,30 +227,8 @@ def build_credentials(
     required_scopes: Iterable[str],
     auto_refresh: bool = True,
 ) -> Credentials:
-    if not credentials_path.exists():
-        raise RuntimeError(f"Credentials file not found: {credentials_path}")
-    if not token_path.exists():
-        raise RuntimeError(
-            f"Token file not found: {token_path}. Run `meetup-gcal-sync auth` first."
-        )
-    _harden_file_permissions(token_path)
-
-    token_data = parse_token_file(token_path)
-    authorized_user = _authorized_user_info(credentials_path, token_data)
-
-    scopes = normalize_scopes(authorized_user.get("scopes"))
-    required = list(required_scopes)
-    missing = [scope for scope in required if not _scope_satisfied(scope, scopes)]
-    if missing:
-        raise RuntimeError(
-            "Token is missing required scopes. "
-            f"Missing: {', '.join(missing)}. Run `meetup-gcal-sync auth` again."
-        )
-
-    creds = Credentials.from_authorized_user_info(authorized_user, scopes=scopes)
-
-    if auto_refresh and not creds.valid and creds.refresh_token:
-        creds.refresh(Request())
+    manager = CredentialManager(credentials_path, token_path, required_scopes=required_scopes)
+    creds = manager.ensure_fresh() if auto_refresh else manager.credentials
 
     if not creds.valid:
         raise RuntimeError("Google credentials are invalid. Run `meetup-gcal-sync auth` again.")
@@ -128,13 +247,13 @@ def run_oauth_and_store_token(
     if not credentials_path.exists():
         raise RuntimeError(f"Credentials file not found: {credentials_path}")
 
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     flow = InstalledAppFlow.from_client_secrets_file(str(credentials_path), scopes=scopes)
     if use_console:
         creds = flow.run_console()
     else:
         creds = flow.run_local_server(port=port)
 
-    token_path.parent.mkdir(parents=True, exist_ok=True)
-    token_path.write_text(creds.to_json(), encoding="utf-8")
-    _harden_file_permissions(token_path)
+    write_token_file(token_path, creds)
     return token_path
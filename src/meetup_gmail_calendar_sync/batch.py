@@ -0,0 +1,104 @@
+"""Batched execution of Google API requests with per-item retries."""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from itertools import islice
+from typing import Any, TypeVar
+
+from googleapiclient.errors import HttpError
+
+from . import metrics
+from .throttle import (
+    MAX_ATTEMPTS,
+    backoff_delay,
+    is_rate_limited,
+    is_retryable_error,
+    request_cost,
+    scheduler_for,
+)
+
+T = TypeVar("T")
+
+# Gmail accepts up to 100 calls per batch but starts answering rateLimitExceeded well before
+# that, so 50 is the documented sweet spot. Calendar shares the same recommendation.
+DEFAULT_BATCH_SIZE = 50
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def execute_batched(
+    service: Any,
+    requests: Mapping[str, Callable[[], Any]],
+    *,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_attempts: int = MAX_ATTEMPTS,
+    sleep: Callable[[float], None] = time.sleep,
+) -> tuple[dict[str, Any], dict[str, Exception]]:
+    """Run `requests` through the service's batch endpoint.
+
+    Each value builds a fresh `HttpRequest`, so items that fail with a retryable error can be
+    re-queued on their own. Batches are paced by the API's shared scheduler: each one spends
+    the quota units of its items and is sized to the scheduler's current concurrency limit.
+    Returns the responses and the final errors, both keyed like `requests`.
+    """
+    results: dict[str, Any] = {}
+    errors: dict[str, Exception] = {}
+    pending = list(requests)
+
+    for attempt in range(max_attempts):
+        if attempt:
+            sleep(backoff_delay(attempt - 1))
+        failed: list[str] = []
+
+        def callback(request_id: str, response: Any, exception: Exception | None) -> None:
+            if exception is not None:
+                errors[request_id] = exception
+                failed.append(request_id)
+            else:
+                results[request_id] = response
+                errors.pop(request_id, None)
+
+        position = 0
+        while position < len(pending):
+            first = requests[pending[position]]()
+            scheduler = scheduler_for(first)
+            chunk = pending[position : position + min(batch_size, scheduler.concurrency.limit)]
+            position += len(chunk)
+            built = [first, *(requests[key]() for key in chunk[1:])]
+
+            batch = service.new_batch_http_request(callback=callback)
+            for key, request in zip(chunk, built):
+                batch.add(request, request_id=key)
+                metrics.count_call(request)
+            scheduler.bucket.acquire(sum(request_cost(request) for request in built))
+            with scheduler.concurrency:
+                try:
+                    batch.execute()
+                except HttpError as exc:
+                    for key in chunk:
+                        if key not in results and key not in failed:
+                            callback(key, None, exc)
+
+            chunk_failures = [errors[key] for key in chunk if key in failed]
+            for key, request in zip(chunk, built):
+                # Like `ApiScheduler.execute`, a failure on the last attempt is not a retry.
+                if key in failed and is_retryable_error(errors[key]) and attempt < max_attempts - 1:
+                    scheduler.retries += 1
+                    metrics.count_retry(request, throttled=is_rate_limited(errors[key]))
+            if any(is_rate_limited(exc) for exc in chunk_failures):
+                scheduler.throttled += 1
+                scheduler.concurrency.on_throttle()
+            else:
+                scheduler.concurrency.on_success(len(chunk))
+
+        pending = [key for key in failed if is_retryable_error(errors[key])]
+        if not pending:
+            break
+
+    return results, errors
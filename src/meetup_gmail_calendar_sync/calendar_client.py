@@ -2,19 +2,39 @@
 
 from __future__ import annotations
 
+import hashlib
+import json
+from collections.abc import Iterable
 from datetime import date, datetime, time, timedelta, timezone
 from typing import Any
 
+from googleapiclient.errors import HttpError
+
+from . import metrics
+from .fields import (
+    CALENDAR_FIELDS,
+    CALENDAR_LIST_FIELDS,
+    CALENDAR_SUMMARY_FIELDS,
+    EVENT_LIST_FIELDS,
+    EVENT_WRITE_FIELDS,
+)
 from .ics_parser import MeetupEvent
+from .store import StateStore
+from .throttle import execute
+
+SYNC_SOURCE = "meetup-gmail-sync"
 
 
 def ensure_calendar(calendar_service: Any, calendar_name: str) -> str:
     page_token = None
     while True:
-        result = (
-            calendar_service.calendarList()
-            .list(pageToken=page_token, minAccessRole="owner", showHidden=False)
-            .execute()
+        result = execute(
+            calendar_service.calendarList().list(
+                pageToken=page_token,
+                minAccessRole="owner",
+                showHidden=False,
+                fields=CALENDAR_LIST_FIELDS,
+            )
         )
         for item in result.get("items", []):
             if item.get("summary") == calendar_name:
@@ -23,21 +43,55 @@ def ensure_calendar(calendar_service: Any, calendar_name: str) -> str:
         if not page_token:
             break
 
-    primary = calendar_service.calendars().get(calendarId="primary").execute()
-    created = (
-        calendar_service.calendars()
-        .insert(
+    primary = execute(
+        calendar_service.calendars().get(calendarId="primary", fields=CALENDAR_FIELDS)
+    )
+    created = execute(
+        calendar_service.calendars().insert(
             body={
                 "summary": calendar_name,
                 "description": "Auto-synced from Meetup Gmail invites",
                 "timeZone": primary.get("timeZone", "UTC"),
-            }
+            },
+            fields=CALENDAR_FIELDS,
         )
-        .execute()
     )
     return created["id"]
 
 
+def _calendar_id_key(calendar_name: str) -> str:
+    return f"calendar_id:{calendar_name}"
+
+
+def resolve_calendar(
+    calendar_service: Any, calendar_name: str, store: StateStore | None = None
+) -> str:
+    """`ensure_calendar`, remembering the answer in the state db between runs.
+
+    A cached id costs one `calendars.get` to confirm the calendar still exists under that name
+    instead of paging through the whole calendar list.
+    """
+    if store is None:
+        return ensure_calendar(calendar_service, calendar_name=calendar_name)
+
+    cached = store.get_value(_calendar_id_key(calendar_name))
+    if cached:
+        try:
+            calendar = execute(
+                calendar_service.calendars().get(calendarId=cached, fields=CALENDAR_SUMMARY_FIELDS)
+            )
+        except HttpError as exc:
+            if exc.resp.status != 404:
+                raise
+        else:
+            if calendar.get("summary") == calendar_name:
+                return cached
+
+    calendar_id = ensure_calendar(calendar_service, calendar_name=calendar_name)
+    store.set_value(_calendar_id_key(calendar_name), calendar_id)
+    return calendar_id
+
+
 def event_not_too_old(event: MeetupEvent, lookback_days: int) -> bool:
     cutoff = datetime.now(timezone.utc) - timedelta(days=lookback_days)
     if isinstance(event.end, datetime):
@@ -74,23 +128,186 @@ def build_calendar_body(event: MeetupEvent) -> dict[str, Any]:
         "end": to_google_event_time(event.end),
         "extendedProperties": {
             "private": {
-                "sync_source": "meetup-gmail-sync",
+                "sync_source": SYNC_SOURCE,
                 "meetup_uid": event.uid,
             }
         },
     }
     if event.meetup_url:
         body["source"] = {"title": "Meetup", "url": event.meetup_url}
+
+    body["extendedProperties"]["private"].update(
+        {
+            "meetup_fingerprint": calendar_body_fingerprint(body),
+            "meetup_sequence": str(event.sequence),
+            "meetup_dtstamp": event.dtstamp.isoformat(),
+        }
+    )
     return body
 
 
+def calendar_body_fingerprint(body: dict[str, Any]) -> str:
+    content = {key: value for key, value in body.items() if key != "extendedProperties"}
+    encoded = json.dumps(content, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def event_is_unchanged(existing: dict[str, Any], event: MeetupEvent, body: dict[str, Any]) -> bool:
+    """Whether `existing` already holds this revision of `event`, so patching it is a no-op."""
+    if existing.get("status") == "cancelled":
+        return False
+
+    private = (existing.get("extendedProperties") or {}).get("private") or {}
+    fingerprint = body["extendedProperties"]["private"]["meetup_fingerprint"]
+    if private.get("meetup_fingerprint") == fingerprint:
+        return True
+
+    try:
+        synced_sequence = int(private["meetup_sequence"])
+        synced_dtstamp = datetime.fromisoformat(private["meetup_dtstamp"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return (synced_sequence, synced_dtstamp) >= (event.sequence, event.dtstamp)
+
+
 def find_existing_event_by_uid(
-    calendar_service: Any, calendar_id: str, uid: str
+    calendar_service: Any, calendar_id: str, uid: str, store: StateStore | None = None
 ) -> dict[str, Any] | None:
-    result = (
-        calendar_service.events()
-        .list(calendarId=calendar_id, iCalUID=uid, showDeleted=True, maxResults=5)
-        .execute()
+    """Kept for API compatibility; syncs index the calendar once per run instead.
+
+    See `list_synced_events` and `refresh_calendar_mirror`.
+    """
+    if store is not None and store.calendar_sync_token(calendar_id):
+        return index_synced_events(store.calendar_events_by_uid(calendar_id, uid)).get(uid)
+
+    result = execute(
+        calendar_service.events().list(
+            calendarId=calendar_id,
+            iCalUID=uid,
+            showDeleted=True,
+            maxResults=5,
+            fields=EVENT_LIST_FIELDS,
+        )
     )
     items = result.get("items", [])
     return items[0] if items else None
+
+
+def import_event_request(
+    calendar_service: Any, calendar_id: str, uid: str, body: dict[str, Any]
+) -> Any:
+    import_body = dict(body)
+    import_body["iCalUID"] = uid
+    return calendar_service.events().import_(
+        calendarId=calendar_id, body=import_body, fields=EVENT_WRITE_FIELDS
+    )
+
+
+def patch_event_request(
+    calendar_service: Any, calendar_id: str, event_id: str, body: dict[str, Any]
+) -> Any:
+    return calendar_service.events().patch(
+        calendarId=calendar_id,
+        eventId=event_id,
+        body=body,
+        sendUpdates="none",
+        fields=EVENT_WRITE_FIELDS,
+    )
+
+
+def delete_event_request(calendar_service: Any, calendar_id: str, event_id: str) -> Any:
+    return calendar_service.events().delete(
+        calendarId=calendar_id,
+        eventId=event_id,
+        sendUpdates="none",
+    )
+
+
+def synced_event_uid(item: dict[str, Any]) -> str | None:
+    private = (item.get("extendedProperties") or {}).get("private") or {}
+    return private.get("meetup_uid") or item.get("iCalUID")
+
+
+def _is_synced(item: dict[str, Any]) -> bool:
+    private = (item.get("extendedProperties") or {}).get("private") or {}
+    return private.get("sync_source") == SYNC_SOURCE
+
+
+def index_synced_events(items: Iterable[dict[str, Any]]) -> dict[str, dict[str, Any]]:
+    events: dict[str, dict[str, Any]] = {}
+    for item in items:
+        if not _is_synced(item):
+            continue
+        uid = synced_event_uid(item)
+        if not uid:
+            continue
+        current = events.get(uid)
+        # Prefer a live copy over a tombstone left by an earlier cancellation.
+        if current is None or current.get("status") == "cancelled":
+            events[uid] = item
+    return events
+
+
+def _list_events(
+    calendar_service: Any, calendar_id: str, **params: Any
+) -> tuple[list[dict[str, Any]], str | None]:
+    items: list[dict[str, Any]] = []
+    page_token = None
+    while True:
+        with metrics.stage("calendar_list"):
+            result = execute(
+                calendar_service.events().list(
+                    calendarId=calendar_id,
+                    showDeleted=True,
+                    maxResults=2500,
+                    pageToken=page_token,
+                    fields=EVENT_LIST_FIELDS,
+                    **params,
+                )
+            )
+        items.extend(result.get("items", []))
+        page_token = result.get("nextPageToken")
+        if not page_token:
+            return items, result.get("nextSyncToken")
+
+
+def list_synced_events(calendar_service: Any, calendar_id: str) -> dict[str, dict[str, Any]]:
+    """Index every event this tool wrote to the calendar by Meetup UID."""
+    items, _ = _list_events(
+        calendar_service,
+        calendar_id,
+        privateExtendedProperty=f"sync_source={SYNC_SOURCE}",
+    )
+    return index_synced_events(items)
+
+
+def refresh_calendar_mirror(
+    calendar_service: Any, calendar_id: str, store: StateStore, *, verbose: bool = False
+) -> dict[str, dict[str, Any]]:
+    """Bring the local calendar mirror up to date and index it by Meetup UID.
+
+    The first call lists the whole calendar; later calls only fetch changes since the stored
+    `nextSyncToken`. A 410 Gone answer means the token expired and triggers a full resync.
+    """
+    sync_token = store.calendar_sync_token(calendar_id)
+    if sync_token:
+        try:
+            items, next_token = _list_events(calendar_service, calendar_id, syncToken=sync_token)
+        except HttpError as exc:
+            if exc.resp.status != 410:
+                raise
+            if verbose:
+                print("calendar sync token expired; running full calendar resync")
+        else:
+            changed = [
+                item for item in items if _is_synced(item) or item.get("status") == "cancelled"
+            ]
+            store.update_calendar_events(calendar_id, changed, next_token or sync_token)
+            return index_synced_events(store.calendar_events(calendar_id))
+
+    items, next_token = _list_events(calendar_service, calendar_id)
+    # Sync tokens cannot be combined with extended property filters, so the mirror is seeded
+    # from an unfiltered listing and only this tool's events are kept.
+    synced = [item for item in items if _is_synced(item)]
+    store.replace_calendar_events(calendar_id, synced, next_token or "")
+    return index_synced_events(synced)
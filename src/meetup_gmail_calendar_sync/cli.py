@@ -3,26 +3,129 @@
 from __future__ import annotations
 
 import argparse
+import contextlib
+import json
 import sys
+from dataclasses import asdict
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, TextIO
 
-from googleapiclient.errors import HttpError
-
-from .auth import run_oauth_and_store_token
+# Only light modules at import time: `--help` and argument errors should not pay for the Google
+# client libraries. Each command imports what it needs.
 from .config import (
     CALENDAR_NAME_DEFAULT,
+    CALENDAR_SCOPE,
+    DEFAULT_ACCOUNT_WORKERS,
+    DEFAULT_ACCOUNTS_PATH,
     DEFAULT_CREDENTIALS_PATH,
+    DEFAULT_STATE_PATH,
     DEFAULT_TOKEN_PATH,
+    GMAIL_FETCH_FORMATS,
+    GMAIL_MODIFY_SCOPE,
     GMAIL_QUERY_DEFAULT,
+    MAX_POLL_SECONDS,
+    MIN_POLL_SECONDS,
     REQUIRED_SCOPES,
+    SYNCED_LABEL_DEFAULT,
 )
-from .sync import run_sync
+from .metrics import SyncMetrics, render_prometheus, snapshot, write_report
+
+if TYPE_CHECKING:
+    from .sync import SyncStats
 
 
 def _path(value: str) -> Path:
     return Path(value).expanduser().resolve()
 
 
+def _add_mailbox_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--credentials",
+        type=_path,
+        default=DEFAULT_CREDENTIALS_PATH,
+        help=f"Path to OAuth client secret JSON (default: {DEFAULT_CREDENTIALS_PATH})",
+    )
+    parser.add_argument(
+        "--token",
+        type=_path,
+        default=DEFAULT_TOKEN_PATH,
+        help=f"Path to token JSON (default: {DEFAULT_TOKEN_PATH})",
+    )
+    parser.add_argument(
+        "--calendar-name",
+        default=CALENDAR_NAME_DEFAULT,
+        help=f"Destination calendar name (default: {CALENDAR_NAME_DEFAULT})",
+    )
+    parser.add_argument(
+        "--query",
+        default=GMAIL_QUERY_DEFAULT,
+        help=f"Gmail query for Meetup ICS emails (default: {GMAIL_QUERY_DEFAULT})",
+    )
+    parser.add_argument(
+        "--max-messages",
+        type=int,
+        default=500,
+        help="Maximum matching Gmail messages to scan (default: 500)",
+    )
+    parser.add_argument(
+        "--lookback-days",
+        type=int,
+        default=2,
+        help="Ignore events that ended before this lookback window (default: 2)",
+    )
+    parser.add_argument(
+        "--state-db",
+        type=_path,
+        default=DEFAULT_STATE_PATH,
+        help=f"Local SQLite cache of already-scanned messages (default: {DEFAULT_STATE_PATH})",
+    )
+    parser.add_argument(
+        "--fetch-format",
+        choices=GMAIL_FETCH_FORMATS,
+        default="full",
+        help="full: MIME tree plus one request per invite attachment; raw: the whole message in "
+        "one request, invites extracted locally (default: full)",
+    )
+    parser.add_argument(
+        "--collapse-threads",
+        action="store_true",
+        help="Only download the newest matching message of each Gmail thread; older ones are "
+        "fetched only if it carries no invite or their subject differs from it",
+    )
+    parser.add_argument(
+        "--label-synced",
+        nargs="?",
+        const=SYNCED_LABEL_DEFAULT,
+        default=None,
+        metavar="LABEL",
+        help="Label scanned mail in Gmail once its events are written and leave labeled mail "
+        f"out of later scans (default label: {SYNCED_LABEL_DEFAULT}; needs a token from "
+        "`auth --gmail-modify`)",
+    )
+    parser.add_argument(
+        "--list-shards",
+        type=int,
+        default=1,
+        help="Split full scans into this many date ranges and list them concurrently; needs a "
+        "newer_than: or after: term in the query (default: 1)",
+    )
+
+
+def _add_report_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--stats-json",
+        metavar="PATH",
+        help="Write outcome counts, stage timings, API calls and retries as JSON ('-' for stdout)",
+    )
+    parser.add_argument(
+        "--prometheus-textfile",
+        type=_path,
+        metavar="PATH",
+        help="Write the same figures in the Prometheus text format, e.g. for the node "
+        "exporter's textfile collector",
+    )
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         prog="meetup-gcal-sync",
@@ -55,91 +158,287 @@ def build_parser() -> argparse.ArgumentParser:
         default=0,
         help="Port for local OAuth callback server (default: random free port).",
     )
+    auth_parser.add_argument(
+        "--gmail-modify",
+        action="store_true",
+        help="Request Gmail modify access instead of read-only, as --label-synced needs.",
+    )
 
     sync_parser = subparsers.add_parser("sync", help="Sync Meetup events into Google Calendar.")
+    _add_mailbox_arguments(sync_parser)
     sync_parser.add_argument(
-        "--credentials",
-        type=_path,
-        default=DEFAULT_CREDENTIALS_PATH,
-        help=f"Path to OAuth client secret JSON (default: {DEFAULT_CREDENTIALS_PATH})",
-    )
-    sync_parser.add_argument(
-        "--token",
-        type=_path,
-        default=DEFAULT_TOKEN_PATH,
-        help=f"Path to token JSON (default: {DEFAULT_TOKEN_PATH})",
+        "--no-state-db",
+        action="store_true",
+        help="Do not use the local message cache; refetch every matching message.",
     )
     sync_parser.add_argument(
-        "--calendar-name",
-        default=CALENDAR_NAME_DEFAULT,
-        help=f"Destination calendar name (default: {CALENDAR_NAME_DEFAULT})",
+        "--incremental",
+        action="store_true",
+        help="Only scan mail added since the last run's Gmail history checkpoint "
+        "(needs the state db; falls back to a full scan when the checkpoint expires).",
     )
     sync_parser.add_argument(
-        "--query",
-        default=GMAIL_QUERY_DEFAULT,
-        help=f"Gmail query for Meetup ICS emails (default: {GMAIL_QUERY_DEFAULT})",
+        "--parse-workers",
+        type=int,
+        default=1,
+        help="Processes used to parse ICS attachments while mail is still downloading "
+        "(default: 1, parse inline)",
     )
     sync_parser.add_argument(
-        "--max-messages",
-        type=int,
-        default=500,
-        help="Maximum matching Gmail messages to scan (default: 500)",
+        "--stop-early",
+        action="store_true",
+        help="Only scan mail recent enough to announce an event inside --lookback-days, "
+        "based on the longest invite lead time seen so far",
     )
     sync_parser.add_argument(
-        "--lookback-days",
-        type=int,
-        default=2,
-        help="Ignore events that ended before this lookback window (default: 2)",
+        "--engine",
+        choices=("phased", "pipeline"),
+        default="phased",
+        help="phased: scan, parse, then write; pipeline: stream every stage concurrently "
+        "through bounded queues (default: phased)",
     )
+    _add_report_arguments(sync_parser)
     sync_parser.add_argument("--dry-run", action="store_true", help="Do not write to calendar.")
     sync_parser.add_argument("--verbose", action="store_true", help="Verbose output.")
 
+    serve_parser = subparsers.add_parser(
+        "serve", help="Keep syncing in the foreground, polling Gmail for new invites."
+    )
+    _add_mailbox_arguments(serve_parser)
+    serve_parser.add_argument(
+        "--stop-early",
+        action="store_true",
+        help="Only scan mail recent enough to announce an event inside --lookback-days",
+    )
+    serve_parser.add_argument(
+        "--min-interval",
+        type=float,
+        default=MIN_POLL_SECONDS,
+        help=f"Shortest time between polls in seconds (default: {MIN_POLL_SECONDS:g})",
+    )
+    serve_parser.add_argument(
+        "--max-interval",
+        type=float,
+        default=MAX_POLL_SECONDS,
+        help=f"Longest time between polls in seconds (default: {MAX_POLL_SECONDS:g})",
+    )
+    _add_report_arguments(serve_parser)
+    serve_parser.add_argument("--dry-run", action="store_true", help="Do not write to calendar.")
+    serve_parser.add_argument("--verbose", action="store_true", help="Verbose output.")
+
+    accounts_parser = subparsers.add_parser(
+        "sync-accounts", help="Sync every account listed in an accounts file."
+    )
+    accounts_parser.add_argument(
+        "--config",
+        type=_path,
+        default=DEFAULT_ACCOUNTS_PATH,
+        help=f"YAML file listing accounts (default: {DEFAULT_ACCOUNTS_PATH})",
+    )
+    accounts_parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_ACCOUNT_WORKERS,
+        help="Threads shared by all accounts; each account gets a fair turn "
+        f"(default: {DEFAULT_ACCOUNT_WORKERS})",
+    )
+    _add_report_arguments(accounts_parser)
+    accounts_parser.add_argument("--dry-run", action="store_true", help="Do not write to calendar.")
+    accounts_parser.add_argument("--verbose", action="store_true", help="Verbose output.")
+
     return parser
 
 
+def _stats_line(stats: SyncStats) -> str:
+    return (
+        f"parsed={stats.parsed} deduped={stats.deduped} processed={stats.processed} "
+        f"created={stats.created} updated={stats.updated} unchanged={stats.unchanged} "
+        f"deleted={stats.deleted} skipped={stats.skipped} failed={stats.failed} "
+        f"labeled={stats.labeled} dry_run={stats.dry_run}"
+    )
+
+
+def _write_reports(
+    args: argparse.Namespace,
+    document: dict[str, Any],
+    metrics: SyncMetrics,
+    outcomes: dict[str, int],
+    stdout: TextIO,
+) -> None:
+    if args.stats_json == "-":
+        print(json.dumps(document, indent=2, sort_keys=True), file=stdout)
+    elif args.stats_json:
+        write_report(_path(args.stats_json), json.dumps(document, indent=2, sort_keys=True) + "\n")
+    if args.prometheus_textfile:
+        write_report(args.prometheus_textfile, render_prometheus(metrics, outcomes))
+
+
+def _report_sync(
+    args: argparse.Namespace, calendar_id: str, stats: SyncStats, stdout: TextIO
+) -> None:
+    _write_reports(
+        args,
+        {"calendar_id": calendar_id, **asdict(stats)},
+        stats.metrics,
+        stats.outcomes(),
+        stdout,
+    )
+
+
+def _human_output(args: argparse.Namespace) -> contextlib.AbstractContextManager:
+    # With `--stats-json -` stdout carries only the JSON, so progress lines move to stderr.
+    if getattr(args, "stats_json", None) == "-":
+        return contextlib.redirect_stdout(sys.stderr)
+    return contextlib.nullcontext()
+
+
+def _is_google_api_error(exc: Exception) -> bool:
+    # An HttpError can only have been raised if its module is already loaded.
+    errors = sys.modules.get("googleapiclient.errors")
+    return errors is not None and isinstance(exc, errors.HttpError)
+
+
 def main(argv: list[str] | None = None) -> int:
     parser = build_parser()
     args = parser.parse_args(argv)
 
+    if args.command == "sync" and args.incremental and args.no_state_db:
+        parser.error("--incremental requires the state db; drop --no-state-db")
+    if args.command in ("sync", "serve") and args.list_shards < 1:
+        parser.error("--list-shards must be at least 1")
+    if args.command == "sync" and args.parse_workers < 1:
+        parser.error("--parse-workers must be at least 1")
+
+    stdout = sys.stdout
     try:
-        if args.command == "auth":
-            token_path = run_oauth_and_store_token(
-                credentials_path=args.credentials,
-                token_path=args.token,
-                scopes=REQUIRED_SCOPES,
-                use_console=args.console,
-                port=args.port,
-            )
-            print(f"token saved: {token_path}")
-            return 0
-
-        if args.command == "sync":
-            calendar_id, stats = run_sync(
-                credentials_path=args.credentials,
-                token_path=args.token,
-                calendar_name=args.calendar_name,
-                query=args.query,
-                max_messages=args.max_messages,
-                lookback_days=args.lookback_days,
-                dry_run=args.dry_run,
-                verbose=args.verbose,
-            )
-            print(f"calendar_id={calendar_id}")
-            print(
-                "sync complete "
-                f"parsed={stats.parsed} deduped={stats.deduped} processed={stats.processed} "
-                f"created={stats.created} updated={stats.updated} "
-                f"deleted={stats.deleted} skipped={stats.skipped} dry_run={stats.dry_run}"
-            )
-            return 0
-
-        parser.error(f"Unknown command: {args.command}")
-        return 2
-    except HttpError as exc:
-        print(f"google api error: {exc}", file=sys.stderr)
-        return 1
+        with _human_output(args):
+            if args.command == "auth":
+                from .auth import run_oauth_and_store_token
+
+                scopes = (
+                    [CALENDAR_SCOPE, GMAIL_MODIFY_SCOPE] if args.gmail_modify else REQUIRED_SCOPES
+                )
+                token_path = run_oauth_and_store_token(
+                    credentials_path=args.credentials,
+                    token_path=args.token,
+                    scopes=scopes,
+                    use_console=args.console,
+                    port=args.port,
+                )
+                print(f"token saved: {token_path}")
+                return 0
+
+            if args.command == "sync":
+                from .sync import run_sync
+
+                calendar_id, stats = run_sync(
+                    credentials_path=args.credentials,
+                    token_path=args.token,
+                    calendar_name=args.calendar_name,
+                    query=args.query,
+                    max_messages=args.max_messages,
+                    lookback_days=args.lookback_days,
+                    dry_run=args.dry_run,
+                    verbose=args.verbose,
+                    state_path=None if args.no_state_db else args.state_db,
+                    incremental=args.incremental,
+                    parse_workers=args.parse_workers,
+                    engine=args.engine,
+                    stop_early=args.stop_early,
+                    fetch_format=args.fetch_format,
+                    collapse_threads=args.collapse_threads,
+                    synced_label=args.label_synced,
+                    list_shards=args.list_shards,
+                )
+                print(f"calendar_id={calendar_id}")
+                print(f"sync complete {_stats_line(stats)}")
+                _report_sync(args, calendar_id, stats, stdout)
+                return 1 if stats.failed else 0
+
+            if args.command == "serve":
+                from .serve import PollSchedule, SyncSession, serve
+
+                session = SyncSession(
+                    credentials_path=args.credentials,
+                    token_path=args.token,
+                    calendar_name=args.calendar_name,
+                    query=args.query,
+                    max_messages=args.max_messages,
+                    lookback_days=args.lookback_days,
+                    dry_run=args.dry_run,
+                    verbose=args.verbose,
+                    state_path=args.state_db,
+                    stop_early=args.stop_early,
+                    fetch_format=args.fetch_format,
+                    collapse_threads=args.collapse_threads,
+                    synced_label=args.label_synced,
+                    list_shards=args.list_shards,
+                )
+                print(f"calendar_id={session.calendar_id}")
+                serve(
+                    session,
+                    PollSchedule(args.min_interval, args.max_interval),
+                    report=lambda stats: _report_sync(args, session.calendar_id, stats, stdout),
+                )
+                return 0
+
+            if args.command == "sync-accounts":
+                from .accounts import load_accounts, run_accounts
+
+                started = snapshot()
+                results = run_accounts(
+                    load_accounts(args.config),
+                    dry_run=args.dry_run,
+                    verbose=args.verbose,
+                    workers=args.workers,
+                )
+                for result in results:
+                    if result.error is not None:
+                        print(f"account={result.name} error: {result.error}")
+                    elif result.stats is not None:
+                        print(
+                            f"account={result.name} calendar_id={result.calendar_id} "
+                            f"{_stats_line(result.stats)}"
+                        )
+                totals = snapshot().since(started)
+                outcomes: dict[str, int] = {}
+                for result in results:
+                    for name, count in (result.stats.outcomes() if result.stats else {}).items():
+                        outcomes[name] = outcomes.get(name, 0) + count
+                _write_reports(
+                    args,
+                    {
+                        "accounts": [
+                            {
+                                "name": result.name,
+                                "calendar_id": result.calendar_id,
+                                "error": result.error,
+                                "outcomes": result.stats.outcomes() if result.stats else None,
+                            }
+                            for result in results
+                        ],
+                        "outcomes": outcomes,
+                        "metrics": asdict(totals),
+                    },
+                    totals,
+                    outcomes,
+                    stdout,
+                )
+                failed = [
+                    result
+                    for result in results
+                    if result.error is not None
+                    or (result.stats is not None and result.stats.failed)
+                ]
+                return 1 if failed else 0
+
+            parser.error(f"Unknown command: {args.command}")
+            return 2
     except Exception as exc:
-        print(f"error: {exc}", file=sys.stderr)
+        if _is_google_api_error(exc):
+            print(f"google api error: {exc}", file=sys.stderr)
+        else:
+            print(f"error: {exc}", file=sys.stderr)
         return 1
 
 
@@ -8,6 +8,22 @@ from pathlib import Path
 APP_NAME = "meetup-gcal-sync"
 GMAIL_QUERY_DEFAULT = "from:meetup filename:ics newer_than:730d"
 CALENDAR_NAME_DEFAULT = "Meetup"
+SYNCED_LABEL_DEFAULT = "meetup-synced"
+# How far ahead of an event its invite may arrive, until the state db has seen real invites.
+INVITE_LEAD_DAYS_DEFAULT = 180
+
+# "full" returns the MIME tree and needs one attachments.get per attached invite; "raw" returns
+# the whole RFC 822 message in one call and the invites are cut out locally.
+GMAIL_FETCH_FORMATS = ("full", "raw")
+
+# Threads shared by all accounts in `sync-accounts`.
+DEFAULT_ACCOUNT_WORKERS = 4
+# Bounds of the adaptive poll interval in `serve`, in seconds.
+MIN_POLL_SECONDS = 60.0
+MAX_POLL_SECONDS = 3600.0
+# `serve` refreshes the access token this long before it expires, between cycles, so a cycle
+# never stalls on a refresh halfway through.
+TOKEN_REFRESH_MARGIN_SECONDS = 600
 
 CALENDAR_SCOPE = "https://www.googleapis.com/auth/calendar"
 GMAIL_READ_SCOPE = "https://www.googleapis.com/auth/gmail.readonly"
@@ -27,3 +43,5 @@ DEFAULT_CREDENTIALS_PATH = Path(
     os.getenv("MEETUP_GCAL_CREDENTIALS", str(DEFAULT_CONFIG_DIR / "credentials.json"))
 )
 DEFAULT_TOKEN_PATH = Path(os.getenv("MEETUP_GCAL_TOKEN", str(DEFAULT_CONFIG_DIR / "token.json")))
+DEFAULT_ACCOUNTS_PATH = DEFAULT_CONFIG_DIR / "accounts.yaml"
+DEFAULT_STATE_PATH = Path(os.getenv("MEETUP_GCAL_STATE", str(DEFAULT_CONFIG_DIR / "state.sqlite3")))
@@ -0,0 +1,37 @@
+"""Partial-response field masks for every Google API call we make.
+
+Each mask lists exactly the keys the code reads from that response. When code starts reading a
+new key, add it here as well; the fakes in the test suite only return what the mask requests.
+"""
+
+from __future__ import annotations
+
+# Meetup mails nest the invite at most three levels deep (mixed > alternative > text/calendar).
+# Deeper parts are still returned, just without trimming their headers.
+MIME_PART_DEPTH = 4
+MIME_PART_FIELDS = "mimeType,filename,body(data,attachmentId)"
+
+
+def _payload_fields(depth: int) -> str:
+    if depth == 0:
+        return f"{MIME_PART_FIELDS},parts"
+    return f"{MIME_PART_FIELDS},parts({_payload_fields(depth - 1)})"
+
+
+GMAIL_MESSAGE_FIELDS = f"id,internalDate,payload({_payload_fields(MIME_PART_DEPTH)})"
+GMAIL_RAW_MESSAGE_FIELDS = "id,internalDate,raw"
+GMAIL_ATTACHMENT_FIELDS = "data"
+GMAIL_MESSAGE_LIST_FIELDS = "messages(id,threadId),nextPageToken"
+GMAIL_THREAD_SUBJECT_FIELDS = "messages(id,payload/headers)"
+GMAIL_HISTORY_FIELDS = "history/messagesAdded/message/id,historyId,nextPageToken"
+GMAIL_PROFILE_FIELDS = "historyId"
+GMAIL_LABEL_LIST_FIELDS = "labels(id,name)"
+GMAIL_LABEL_FIELDS = "id"
+
+CALENDAR_LIST_FIELDS = "items(id,summary),nextPageToken"
+CALENDAR_FIELDS = "id,timeZone"
+CALENDAR_SUMMARY_FIELDS = "id,summary"
+EVENT_FIELDS = "id,iCalUID,status,extendedProperties/private"
+EVENT_LIST_FIELDS = f"items({EVENT_FIELDS}),nextPageToken,nextSyncToken"
+# Write responses are not read beyond success or failure.
+EVENT_WRITE_FIELDS = "id"
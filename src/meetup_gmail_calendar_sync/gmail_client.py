@@ -3,14 +3,42 @@
 from __future__ import annotations
 
 import base64
-from collections.abc import Iterator
-from datetime import datetime, timezone
+import queue
+import re
+import threading
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email import message_from_bytes
+from email.policy import compat32
+from functools import partial
 from typing import Any
 
+from . import metrics
+from .batch import DEFAULT_BATCH_SIZE, chunked, execute_batched
+from .fields import (
+    GMAIL_ATTACHMENT_FIELDS,
+    GMAIL_HISTORY_FIELDS,
+    GMAIL_LABEL_FIELDS,
+    GMAIL_LABEL_LIST_FIELDS,
+    GMAIL_MESSAGE_FIELDS,
+    GMAIL_MESSAGE_LIST_FIELDS,
+    GMAIL_PROFILE_FIELDS,
+    GMAIL_RAW_MESSAGE_FIELDS,
+    GMAIL_THREAD_SUBJECT_FIELDS,
+)
+from .throttle import execute
+
+# messages.batchModify accepts at most this many ids per call.
+BATCH_MODIFY_LIMIT = 1000
+_NEWER_THAN_DAYS = {"d": 1, "m": 31, "y": 366}
+
 
 def decode_base64url(value: str) -> bytes:
     padding = "=" * ((4 - (len(value) % 4)) % 4)
-    return base64.urlsafe_b64decode(value + padding)
+    data = base64.urlsafe_b64decode(value + padding)
+    metrics.count_decoded(len(data))
+    return data
 
 
 def iter_payload_parts(payload: dict[str, Any]) -> Iterator[dict[str, Any]]:
@@ -32,14 +60,43 @@ def parse_message_ts(message: dict[str, Any]) -> datetime:
     return datetime.fromtimestamp(internal_date_ms / 1000.0, tz=timezone.utc)
 
 
-def load_ics_payloads(gmail_service: Any, message_id: str, payload: dict[str, Any]) -> list[bytes]:
-    calendars: list[bytes] = []
+def _calendar_bodies(payload: dict[str, Any]) -> list[dict[str, Any]]:
+    return [
+        part.get("body", {}) or {}
+        for part in iter_payload_parts(payload)
+        if part_contains_calendar(part)
+    ]
+
 
-    for part in iter_payload_parts(payload):
-        if not part_contains_calendar(part):
+def ics_payloads_from_raw(raw: str) -> list[bytes]:
+    """Calendar parts of a `format="raw"` message, matched like `part_contains_calendar`."""
+    message = message_from_bytes(decode_base64url(raw), policy=compat32)
+    payloads: list[bytes] = []
+    for part in message.walk():
+        if part.is_multipart():
             continue
+        matched = part_contains_calendar(
+            {"mimeType": part.get_content_type(), "filename": part.get_filename() or ""}
+        )
+        data = part.get_payload(decode=True) if matched else None
+        if data:
+            payloads.append(data)
+    return payloads
+
+
+def _attachment_request(gmail_service: Any, message_id: str, attachment_id: str) -> Any:
+    return (
+        gmail_service.users()
+        .messages()
+        .attachments()
+        .get(userId="me", messageId=message_id, id=attachment_id, fields=GMAIL_ATTACHMENT_FIELDS)
+    )
+
+
+def load_ics_payloads(gmail_service: Any, message_id: str, payload: dict[str, Any]) -> list[bytes]:
+    calendars: list[bytes] = []
 
-        body = part.get("body", {}) or {}
+    for body in _calendar_bodies(payload):
         data = body.get("data")
         attachment_id = body.get("attachmentId")
 
@@ -48,13 +105,8 @@ def load_ics_payloads(gmail_service: Any, message_id: str, payload: dict[str, An
             continue
 
         if attachment_id:
-            attachment = (
-                gmail_service.users()
-                .messages()
-                .attachments()
-                .get(userId="me", messageId=message_id, id=attachment_id)
-                .execute()
-            )
+            with metrics.stage("attachments"):
+                attachment = execute(_attachment_request(gmail_service, message_id, attachment_id))
             attachment_data = attachment.get("data")
             if attachment_data:
                 calendars.append(decode_base64url(attachment_data))
@@ -62,38 +114,401 @@ def load_ics_payloads(gmail_service: Any, message_id: str, payload: dict[str, An
     return calendars
 
 
-def iter_messages(gmail_service: Any, query: str, max_messages: int) -> Iterator[dict[str, Any]]:
-    seen = 0
+def _message_request(gmail_service: Any, message_id: str, fetch_format: str = "full") -> Any:
+    fields = GMAIL_RAW_MESSAGE_FIELDS if fetch_format == "raw" else GMAIL_MESSAGE_FIELDS
+    return (
+        gmail_service.users()
+        .messages()
+        .get(userId="me", id=message_id, format=fetch_format, fields=fields)
+    )
+
+
+def get_messages(
+    gmail_service: Any,
+    message_ids: list[str],
+    *,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    fetch_format: str = "full",
+) -> tuple[dict[str, dict[str, Any]], dict[str, Exception]]:
+    with metrics.stage("messages"):
+        return execute_batched(
+            gmail_service,
+            {
+                message_id: partial(_message_request, gmail_service, message_id, fetch_format)
+                for message_id in message_ids
+            },
+            batch_size=batch_size,
+        )
+
+
+def download_ics_payloads(
+    gmail_service: Any,
+    messages: dict[str, dict[str, Any]],
+    *,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    fetch_format: str = "full",
+) -> tuple[dict[str, tuple[datetime, list[bytes]]], dict[str, Exception]]:
+    """Extract the calendar payloads of already fetched messages, batching attachment gets.
+
+    Returns `(message_ts, ics_payloads)` per message id, plus the errors of messages whose
+    attachments could not be downloaded. Raw messages already hold their attachments.
+    """
+    if fetch_format == "raw":
+        with metrics.stage("mime"):
+            return {
+                message_id: (parse_message_ts(message), ics_payloads_from_raw(message["raw"]))
+                for message_id, message in messages.items()
+            }, {}
+
+    slots: dict[str, list[bytes | None]] = {}
+    attachment_requests: dict[str, Callable[[], Any]] = {}
+    for message_id, message in messages.items():
+        slots[message_id] = []
+        for body in _calendar_bodies(message.get("payload", {})):
+            if body.get("data"):
+                slots[message_id].append(decode_base64url(body["data"]))
+            elif body.get("attachmentId"):
+                key = f"{message_id}/{len(slots[message_id])}"
+                attachment_requests[key] = partial(
+                    _attachment_request, gmail_service, message_id, body["attachmentId"]
+                )
+                slots[message_id].append(None)
+
+    with metrics.stage("attachments"):
+        attachments, attachment_errors = execute_batched(
+            gmail_service, attachment_requests, batch_size=batch_size
+        )
+    for key, attachment in attachments.items():
+        message_id, position = key.rsplit("/", 1)
+        attachment_data = attachment.get("data")
+        if attachment_data:
+            slots[message_id][int(position)] = decode_base64url(attachment_data)
+    errors = {key.rsplit("/", 1)[0]: exc for key, exc in attachment_errors.items()}
+
+    fetched = {
+        message_id: (
+            parse_message_ts(messages[message_id]),
+            [data for data in payloads if data is not None],
+        )
+        for message_id, payloads in slots.items()
+        if message_id not in errors
+    }
+    return fetched, errors
+
+
+def fetch_ics_payloads(
+    gmail_service: Any,
+    message_ids: list[str],
+    *,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    fetch_format: str = "full",
+) -> tuple[dict[str, tuple[datetime, list[bytes]]], dict[str, Exception]]:
+    """Fetch messages and their calendar attachments in batches."""
+    messages, errors = get_messages(
+        gmail_service, message_ids, batch_size=batch_size, fetch_format=fetch_format
+    )
+    fetched, attachment_errors = download_ics_payloads(
+        gmail_service, messages, batch_size=batch_size, fetch_format=fetch_format
+    )
+    return fetched, {**errors, **attachment_errors}
+
+
+def get_message(gmail_service: Any, message_id: str) -> dict[str, Any]:
+    with metrics.stage("messages"):
+        return execute(_message_request(gmail_service, message_id))
+
+
+def _thread_subjects_request(gmail_service: Any, thread_id: str) -> Any:
+    return (
+        gmail_service.users()
+        .threads()
+        .get(
+            userId="me",
+            id=thread_id,
+            format="metadata",
+            metadataHeaders=["Subject"],
+            fields=GMAIL_THREAD_SUBJECT_FIELDS,
+        )
+    )
+
+
+def get_thread_subjects(
+    gmail_service: Any, thread_ids: list[str], *, batch_size: int = DEFAULT_BATCH_SIZE
+) -> tuple[dict[str, dict[str, str]], dict[str, Exception]]:
+    """The `Subject` header of every message in each thread, keyed by thread and message id."""
+    with metrics.stage("threads"):
+        threads, errors = execute_batched(
+            gmail_service,
+            {
+                thread_id: partial(_thread_subjects_request, gmail_service, thread_id)
+                for thread_id in thread_ids
+            },
+            batch_size=batch_size,
+        )
+    subjects = {
+        thread_id: {
+            message["id"]: next(
+                (
+                    header["value"]
+                    for header in message.get("payload", {}).get("headers", [])
+                    if header["name"].lower() == "subject"
+                ),
+                "",
+            )
+            for message in thread.get("messages", [])
+        }
+        for thread_id, thread in threads.items()
+    }
+    return subjects, errors
+
+
+def label_search_term(label_name: str) -> str:
+    """`label:` search operand for a user label; Gmail search spells spaces and `/` as `-`."""
+    return "label:" + re.sub(r"[\s/]+", "-", label_name.strip())
+
+
+def ensure_label(gmail_service: Any, label_name: str) -> str:
+    """Id of the user label called `label_name`, created if it does not exist yet."""
+    with metrics.stage("label"):
+        response = execute(
+            gmail_service.users().labels().list(userId="me", fields=GMAIL_LABEL_LIST_FIELDS)
+        )
+        for label in response.get("labels", []):
+            if str(label.get("name", "")).casefold() == label_name.casefold():
+                return label["id"]
+        created = execute(
+            gmail_service.users()
+            .labels()
+            .create(
+                userId="me",
+                body={
+                    "name": label_name,
+                    "labelListVisibility": "labelShow",
+                    "messageListVisibility": "show",
+                },
+                fields=GMAIL_LABEL_FIELDS,
+            )
+        )
+    return created["id"]
+
+
+def add_label(gmail_service: Any, label_id: str, message_ids: list[str]) -> None:
+    with metrics.stage("label"):
+        for chunk in chunked(message_ids, BATCH_MODIFY_LIMIT):
+            # The response has no body, so there is nothing to mask.
+            execute(
+                gmail_service.users()
+                .messages()
+                .batchModify(userId="me", body={"ids": chunk, "addLabelIds": [label_id]})
+            )
+
+
+def get_history_id(gmail_service: Any) -> str:
+    with metrics.stage("list"):
+        profile = execute(
+            gmail_service.users().getProfile(userId="me", fields=GMAIL_PROFILE_FIELDS)
+        )
+    return str(profile["historyId"])
+
+
+def list_added_message_ids(gmail_service: Any, start_history_id: str) -> tuple[list[str], str]:
+    """Return message ids added since `start_history_id` and the mailbox's current history id.
+
+    Raises `HttpError` with status 404 when the checkpoint is too old for Gmail to serve.
+    """
+    added: dict[str, None] = {}
+    history_id = start_history_id
     page_token = None
 
-    while seen < max_messages:
-        response = (
+    while True:
+        with metrics.stage("list"):
+            response = execute(
+                gmail_service.users()
+                .history()
+                .list(
+                    userId="me",
+                    startHistoryId=start_history_id,
+                    historyTypes=["messageAdded"],
+                    pageToken=page_token,
+                    fields=GMAIL_HISTORY_FIELDS,
+                )
+            )
+        for record in response.get("history", []):
+            for added_ref in record.get("messagesAdded", []):
+                message_id = added_ref.get("message", {}).get("id")
+                if message_id:
+                    added[message_id] = None
+        history_id = str(response.get("historyId") or history_id)
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return list(added), history_id
+
+
+def _list_page(
+    gmail_service: Any, query: str, page_size: int, page_token: str | None
+) -> tuple[list[dict[str, str]], str | None]:
+    with metrics.stage("list"):
+        response = execute(
             gmail_service.users()
             .messages()
             .list(
                 userId="me",
                 q=query,
-                maxResults=min(100, max_messages - seen),
+                maxResults=min(100, page_size),
                 pageToken=page_token,
+                fields=GMAIL_MESSAGE_LIST_FIELDS,
             )
-            .execute()
         )
+    return response.get("messages", []), response.get("nextPageToken")
+
+
+def _iter_message_pages(
+    gmail_service: Any, query: str, max_messages: int, page_token: str | None = None
+) -> Iterator[dict[str, str]]:
+    seen = 0
 
-        messages = response.get("messages", [])
+    while seen < max_messages:
+        messages, page_token = _list_page(gmail_service, query, max_messages - seen, page_token)
         if not messages:
             return
 
         for message_ref in messages:
-            yield (
-                gmail_service.users()
-                .messages()
-                .get(userId="me", id=message_ref["id"], format="full")
-                .execute()
-            )
+            yield message_ref
             seen += 1
             if seen >= max_messages:
                 return
 
-        page_token = response.get("nextPageToken")
         if not page_token:
             return
+
+
+def query_window_start(query: str, now: datetime) -> datetime | None:
+    """Earliest receive time `query` can match, from its `newer_than:` and `after:` terms."""
+    starts: list[datetime] = []
+    for amount, unit in re.findall(r"\bnewer_than:(\d+)([dmy])\b", query):
+        # Months and years rounded up, so the window is never too short.
+        starts.append(now - timedelta(days=int(amount) * _NEWER_THAN_DAYS[unit]))
+    for seconds in re.findall(r"\bafter:(\d+)(?![\d/])", query):
+        starts.append(datetime.fromtimestamp(int(seconds), timezone.utc))
+    for year, month, day in re.findall(r"\bafter:(\d{4})/(\d{1,2})/(\d{1,2})\b", query):
+        starts.append(datetime(int(year), int(month), int(day), tzinfo=timezone.utc))
+    return max(starts) if starts else None
+
+
+def shard_queries(query: str, start: datetime, end: datetime, shards: int) -> list[str]:
+    """`query` split into `shards` receive-time ranges, newest first.
+
+    The newest and oldest ranges are open-ended, and neighbours overlap by a second, so mail
+    right at a cut is listed at least once.
+    """
+    step = (end - start) / shards
+    cuts = [int((end - step * index).timestamp()) for index in range(1, shards)]
+    queries = []
+    for index in range(shards):
+        terms = [query]
+        if index < shards - 1:
+            terms.append(f"after:{cuts[index] - 1}")
+        if index > 0:
+            terms.append(f"before:{cuts[index - 1] + 1}")
+        queries.append(" ".join(terms))
+    return queries
+
+
+def _iter_sharded_message_refs(
+    gmail_service: Any, queries: list[str], max_messages: int
+) -> Iterator[dict[str, str]]:
+    stop = threading.Event()
+    lock = threading.Lock()
+    listed = [0] * len(queries)
+    # Each shard queues its pages, then the page token it stopped at (None once exhausted).
+    pages: list[queue.SimpleQueue] = [queue.SimpleQueue() for _ in queries]
+
+    def list_shard(index: int) -> None:
+        page_token = None
+        try:
+            while not stop.is_set():
+                # Newer shards come first in the merge, so this one only needs what they left.
+                with lock:
+                    budget = max_messages - sum(listed[: index + 1])
+                if budget <= 0:
+                    break
+                message_refs, next_token = _list_page(
+                    gmail_service, queries[index], budget, page_token
+                )
+                with lock:
+                    listed[index] += len(message_refs)
+                pages[index].put(message_refs)
+                page_token = next_token if message_refs else None
+                if not page_token:
+                    break
+        except Exception as exc:
+            pages[index].put(exc)
+            return
+        pages[index].put(page_token)
+
+    executor = ThreadPoolExecutor(max_workers=len(queries), thread_name_prefix="meetup-sync-list")
+    try:
+        for index in range(len(queries)):
+            executor.submit(list_shard, index)
+        seen: set[str] = set()
+        # Shards are disjoint apart from their edges, so shard order keeps the listing newest first.
+        for index, shard_query in enumerate(queries):
+            while isinstance(item := pages[index].get(), list):
+                for message_ref in item:
+                    if message_ref["id"] in seen:
+                        continue
+                    seen.add(message_ref["id"])
+                    yield message_ref
+                    if len(seen) >= max_messages:
+                        return
+            if isinstance(item, Exception):
+                raise item
+            if item is None:
+                continue
+            # Duplicates at the shard edges left this shard short of the budget; page on inline.
+            for message_ref in _iter_message_pages(
+                gmail_service, shard_query, max_messages - len(seen), item
+            ):
+                if message_ref["id"] in seen:
+                    continue
+                seen.add(message_ref["id"])
+                yield message_ref
+                if len(seen) >= max_messages:
+                    return
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_message_refs(
+    gmail_service: Any, query: str, max_messages: int, *, shards: int = 1
+) -> Iterator[dict[str, str]]:
+    """Matching messages newest first, as `{"id": ..., "threadId": ...}`.
+
+    With `shards > 1` and a query bounded by `newer_than:` or `after:`, the window is split
+    into that many date ranges whose pages are listed concurrently.
+    """
+    now = datetime.now(timezone.utc)
+    start = query_window_start(query, now) if shards > 1 else None
+    if start is None or start >= now:
+        return _iter_message_pages(gmail_service, query, max_messages)
+    return _iter_sharded_message_refs(
+        gmail_service, shard_queries(query, start, now, shards), max_messages
+    )
+
+
+def iter_message_ids(
+    gmail_service: Any, query: str, max_messages: int, *, shards: int = 1
+) -> Iterator[str]:
+    for message_ref in iter_message_refs(gmail_service, query, max_messages, shards=shards):
+        yield message_ref["id"]
+
+
+def iter_messages(gmail_service: Any, query: str, max_messages: int) -> Iterator[dict[str, Any]]:
+    message_ids = iter_message_ids(gmail_service, query=query, max_messages=max_messages)
+    for chunk in chunked(message_ids, DEFAULT_BATCH_SIZE):
+        messages, errors = get_messages(gmail_service, chunk)
+        if errors:
+            raise next(iter(errors.values()))
+        for message_id in chunk:
+            yield messages[message_id]
@@ -2,16 +2,38 @@
 
 from __future__ import annotations
 
+import hashlib
+import json
 import re
 from collections.abc import Iterable
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta, timezone
 from typing import Any
-
-from icalendar import Calendar
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 URL_PATTERN = re.compile(r"https?://\\S+")
 
+FOLD_PATTERN = re.compile(r"\r?\n[ \t]")
+LINE_PATTERN = re.compile(r"\r?\n")
+DATE_PATTERN = re.compile(r"\d{8}")
+DATETIME_PATTERN = re.compile(r"(\d{4})(\d{2})(\d{2})T(\d{2})(\d{2})(\d{2})(Z?)")
+TEXT_ESCAPE_PATTERN = re.compile(r"\\([\\;,nN])")
+TEXT_ESCAPES = {"\\": "\\", ";": ";", ",": ",", "n": "\n", "N": "\n"}
+FAST_PROPERTIES = {
+    "UID",
+    "SEQUENCE",
+    "DTSTAMP",
+    "DTSTART",
+    "DTEND",
+    "STATUS",
+    "SUMMARY",
+    "DESCRIPTION",
+    "LOCATION",
+}
+RECURRENCE_PROPERTIES = {"RRULE", "RDATE", "EXDATE", "EXRULE", "RECURRENCE-ID"}
+READ_PROPERTIES = FAST_PROPERTIES | RECURRENCE_PROPERTIES | {"BEGIN", "END"}
+NAME_PATTERN = re.compile(r"[A-Za-z0-9-]+")
+
 
 @dataclass(frozen=True)
 class MeetupEvent:
@@ -28,7 +50,7 @@ class MeetupEvent:
     meetup_url: str
 
 
-def _to_datetime_utc(value: Any, fallback: datetime) -> datetime:
+def _to_datetime_utc(value: Any, fallback: datetime | None) -> datetime | None:
     if isinstance(value, datetime):
         if value.tzinfo is None:
             return value.replace(tzinfo=timezone.utc)
@@ -42,9 +64,194 @@ def _normalize_text(value: Any) -> str:
     return str(value).strip()
 
 
-def parse_ics_bytes(ics_bytes: bytes, message_ts: datetime) -> list[MeetupEvent]:
+def _unescape_text(value: str) -> str:
+    return TEXT_ESCAPE_PATTERN.sub(lambda match: TEXT_ESCAPES[match.group(1)], value)
+
+
+def _split_content_line(line: str) -> tuple[str, dict[str, str], str] | None:
+    """Split `NAME;PARAM=VALUE:content`, honouring quoted parameter values."""
+    colon = line.find(":")
+    if colon < 0:
+        return None
+    if '"' in line[:colon]:
+        in_quotes = False
+        for index, char in enumerate(line):
+            if char == '"':
+                in_quotes = not in_quotes
+            elif char == ":" and not in_quotes:
+                colon = index
+                break
+        else:
+            return None
+    head, value = line[:colon], line[colon + 1 :]
+
+    name, *raw_params = head.split(";")
+    params: dict[str, str] = {}
+    for raw_param in raw_params:
+        key, sep, param_value = raw_param.partition("=")
+        if not sep:
+            return None
+        params[key.upper()] = param_value.strip('"')
+    return name.upper(), params, value
+
+
+def _fast_time(value: str, params: dict[str, str]) -> date | datetime | None:
+    if params.get("VALUE", "").upper() == "DATE" or DATE_PATTERN.fullmatch(value):
+        if not DATE_PATTERN.fullmatch(value):
+            return None
+        return date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+
+    match = DATETIME_PATTERN.fullmatch(value)
+    if not match:
+        return None
+    parsed = datetime(*(int(part) for part in match.groups()[:6]))
+    if match.group(7):
+        return parsed.replace(tzinfo=timezone.utc)
+    tzid = params.get("TZID")
+    if not tzid:
+        return parsed
+    try:
+        return parsed.replace(tzinfo=ZoneInfo(tzid))
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def _fast_decode_ics(ics_bytes: bytes) -> list[dict[str, Any]] | None:
+    """Read Meetup-style invites without building an icalendar object tree.
+
+    Returns `None` whenever the payload needs the full parser: recurrence, duplicated or
+    encoded properties, unknown time zones, or anything that does not look well formed.
+    """
+    try:
+        text = ics_bytes.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+    records: list[dict[str, Any]] = []
+    properties: dict[str, tuple[dict[str, str], str]] | None = None
+    nested = 0
+
+    for line in LINE_PATTERN.split(FOLD_PATTERN.sub("", text)):
+        if not line:
+            continue
+        name_match = NAME_PATTERN.match(line)
+        if name_match is None:
+            return None
+        if name_match.group(0).upper() not in READ_PROPERTIES:
+            continue
+        parsed = _split_content_line(line)
+        if parsed is None:
+            return None
+        name, params, value = parsed
+
+        if name == "BEGIN":
+            if value.upper() == "VEVENT":
+                if properties is not None:
+                    return None
+                properties = {}
+            elif properties is not None:
+                nested += 1
+            continue
+        if name == "END":
+            if properties is not None and nested:
+                nested -= 1
+            elif value.upper() == "VEVENT":
+                if properties is None:
+                    return None
+                record = _fast_record(properties)
+                if record is None:
+                    return None
+                if record:
+                    records.append(record)
+                properties = None
+            continue
+        if properties is None or nested:
+            continue
+        if name in RECURRENCE_PROPERTIES:
+            return None
+        if name not in FAST_PROPERTIES:
+            continue
+        if name in properties or "ENCODING" in params:
+            return None
+        properties[name] = (params, value)
+
+    if properties is not None:
+        return None
+    return records
+
+
+def _fast_record(properties: dict[str, tuple[dict[str, str], str]]) -> dict[str, Any] | None:
+    """Build a record like `_decode_ics_with_icalendar`; `{}` means "skip", `None` "fall back"."""
+
+    def text(name: str) -> str:
+        if name not in properties:
+            return ""
+        return _unescape_text(properties[name][1]).strip()
+
+    uid = text("UID")
+    if not uid:
+        return {}
+    if "DTSTART" not in properties:
+        return None
+
+    try:
+        sequence = int(properties["SEQUENCE"][1]) if "SEQUENCE" in properties else 0
+    except ValueError:
+        sequence = 0
+
+    dtstamp = None
+    if "DTSTAMP" in properties:
+        raw_dtstamp = _fast_time(properties["DTSTAMP"][1], properties["DTSTAMP"][0])
+        if raw_dtstamp is None:
+            return None
+        dtstamp = _to_datetime_utc(raw_dtstamp, None)
+
+    start = _fast_time(properties["DTSTART"][1], properties["DTSTART"][0])
+    if start is None:
+        return None
+    if "DTEND" in properties:
+        end = _fast_time(properties["DTEND"][1], properties["DTEND"][0])
+        if end is None:
+            return None
+    elif isinstance(start, datetime):
+        end = start + timedelta(hours=2)
+    else:
+        end = start + timedelta(days=1)
+
+    description = text("DESCRIPTION")
+    meetup_url_match = URL_PATTERN.search(description)
+    return {
+        "uid": uid,
+        "sequence": sequence,
+        "dtstamp": dtstamp,
+        "status": (text("STATUS") or "CONFIRMED").upper(),
+        "summary": text("SUMMARY") or "Meetup event",
+        "description": description,
+        "location": text("LOCATION"),
+        "start": start,
+        "end": end,
+        "meetup_url": meetup_url_match.group(0) if meetup_url_match else "",
+    }
+
+
+def decode_ics(ics_bytes: bytes) -> list[dict[str, Any]]:
+    """Extract the VEVENT fields we sync, independent of the message that carried them.
+
+    `dtstamp` is `None` when the invite has no usable DTSTAMP; `events_from_records` then
+    falls back to the message timestamp.
+    """
+    records = _fast_decode_ics(ics_bytes)
+    if records is not None:
+        return records
+    return _decode_ics_with_icalendar(ics_bytes)
+
+
+def _decode_ics_with_icalendar(ics_bytes: bytes) -> list[dict[str, Any]]:
+    # Imported on first use: plain Meetup invites never reach this fallback.
+    from icalendar import Calendar
+
     calendar = Calendar.from_ical(ics_bytes)
-    events: list[MeetupEvent] = []
+    records: list[dict[str, Any]] = []
 
     for component in calendar.walk("VEVENT"):
         uid = _normalize_text(component.get("uid"))
@@ -59,8 +266,8 @@ def parse_ics_bytes(ics_bytes: bytes, message_ts: datetime) -> list[MeetupEvent]
         except Exception:
             sequence = 0
 
-        dtstamp_raw = component.decoded("dtstamp") if component.get("dtstamp") else message_ts
-        dtstamp = _to_datetime_utc(dtstamp_raw, message_ts)
+        dtstamp_raw = component.decoded("dtstamp") if component.get("dtstamp") else None
+        dtstamp = _to_datetime_utc(dtstamp_raw, None)
 
         start = component.decoded("dtstart")
         if component.get("dtend"):
@@ -76,31 +283,93 @@ def parse_ics_bytes(ics_bytes: bytes, message_ts: datetime) -> list[MeetupEvent]
         meetup_url_match = URL_PATTERN.search(description)
         meetup_url = meetup_url_match.group(0) if meetup_url_match else ""
 
-        events.append(
-            MeetupEvent(
-                uid=uid,
-                sequence=sequence,
-                dtstamp=dtstamp,
-                message_ts=message_ts,
-                status=status,
-                summary=summary,
-                description=description,
-                location=location,
-                start=start,
-                end=end,
-                meetup_url=meetup_url,
-            )
+        records.append(
+            {
+                "uid": uid,
+                "sequence": sequence,
+                "dtstamp": dtstamp,
+                "status": status,
+                "summary": summary,
+                "description": description,
+                "location": location,
+                "start": start,
+                "end": end,
+                "meetup_url": meetup_url,
+            }
         )
 
-    return events
+    return records
+
+
+def events_from_records(records: list[dict[str, Any]], message_ts: datetime) -> list[MeetupEvent]:
+    return [
+        MeetupEvent(
+            **{**record, "dtstamp": record["dtstamp"] or message_ts},
+            message_ts=message_ts,
+        )
+        for record in records
+    ]
+
+
+def parse_ics_bytes(ics_bytes: bytes, message_ts: datetime) -> list[MeetupEvent]:
+    return events_from_records(decode_ics(ics_bytes), message_ts)
+
+
+def ics_digest(ics_bytes: bytes) -> str:
+    return hashlib.sha256(ics_bytes).hexdigest()
+
+
+def _encode_time(value: date | datetime | None) -> dict[str, str] | None:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return {"datetime": value.isoformat()}
+    return {"date": value.isoformat()}
+
+
+def _decode_time(value: dict[str, str] | None) -> date | datetime | None:
+    if value is None:
+        return None
+    if "datetime" in value:
+        return datetime.fromisoformat(value["datetime"])
+    return date.fromisoformat(value["date"])
+
+
+def dump_records(records: list[dict[str, Any]]) -> str:
+    return json.dumps(
+        [
+            {
+                **record,
+                "dtstamp": _encode_time(record["dtstamp"]),
+                "start": _encode_time(record["start"]),
+                "end": _encode_time(record["end"]),
+            }
+            for record in records
+        ]
+    )
+
+
+def load_records(data: str) -> list[dict[str, Any]]:
+    return [
+        {
+            **record,
+            "dtstamp": _decode_time(record["dtstamp"]),
+            "start": _decode_time(record["start"]),
+            "end": _decode_time(record["end"]),
+        }
+        for record in json.loads(data)
+    ]
 
 
 def _rank(event: MeetupEvent) -> tuple[int, datetime, datetime]:
     return (event.sequence, event.dtstamp, event.message_ts)
 
 
-def dedupe_latest(events: Iterable[MeetupEvent]) -> dict[str, MeetupEvent]:
-    latest_by_uid: dict[str, MeetupEvent] = {}
+def dedupe_latest(
+    events: Iterable[MeetupEvent], *, into: dict[str, MeetupEvent] | None = None
+) -> dict[str, MeetupEvent]:
+    """Keep the newest revision per UID; pass `into` to fold events in incrementally."""
+    latest_by_uid: dict[str, MeetupEvent] = {} if into is None else into
     for event in events:
         current = latest_by_uid.get(event.uid)
         if current is None or _rank(event) > _rank(current):
@@ -0,0 +1,201 @@
+"""Process-wide instrumentation: stage durations, API calls, retries and decoded bytes.
+
+The counters only grow. A run reports the difference between snapshots taken before and after
+it, which is exact as long as one sync runs at a time; with `sync-accounts` the interleaved
+accounts are reported together.
+
+Stage seconds are summed over threads. In the pipeline engine, stages overlap, so their sum
+can exceed the wall time.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+PROMETHEUS_PREFIX = "meetup_gcal_sync"
+UNKNOWN_METHOD = "unknown"
+
+
+@dataclass
+class SyncMetrics:
+    wall_seconds: float = 0.0
+    stage_seconds: dict[str, float] = field(default_factory=dict)
+    api_calls: dict[str, int] = field(default_factory=dict)  # by API method id
+    retries: dict[str, int] = field(default_factory=dict)
+    throttled: dict[str, int] = field(default_factory=dict)
+    bytes_decoded: int = 0
+
+    def since(self, earlier: SyncMetrics) -> SyncMetrics:
+        def delta(now: dict[str, Any], before: dict[str, Any]) -> dict[str, Any]:
+            changed = {key: value - before.get(key, 0) for key, value in now.items()}
+            return {key: value for key, value in changed.items() if value}
+
+        return SyncMetrics(
+            wall_seconds=self.wall_seconds - earlier.wall_seconds,
+            stage_seconds=delta(self.stage_seconds, earlier.stage_seconds),
+            api_calls=delta(self.api_calls, earlier.api_calls),
+            retries=delta(self.retries, earlier.retries),
+            throttled=delta(self.throttled, earlier.throttled),
+            bytes_decoded=self.bytes_decoded - earlier.bytes_decoded,
+        )
+
+
+_lock = threading.Lock()
+_totals = SyncMetrics()
+
+
+def snapshot() -> SyncMetrics:
+    with _lock:
+        copy = SyncMetrics(**asdict(_totals))
+    # A clock reading, so that `since` turns it into the elapsed wall time.
+    copy.wall_seconds = time.perf_counter()
+    return copy
+
+
+def _method(request: Any) -> str:
+    return getattr(request, "methodId", None) or UNKNOWN_METHOD
+
+
+def count_call(request: Any) -> None:
+    method = _method(request)
+    with _lock:
+        _totals.api_calls[method] = _totals.api_calls.get(method, 0) + 1
+
+
+def count_retry(request: Any, *, throttled: bool) -> None:
+    method = _method(request)
+    with _lock:
+        _totals.retries[method] = _totals.retries.get(method, 0) + 1
+        if throttled:
+            _totals.throttled[method] = _totals.throttled.get(method, 0) + 1
+
+
+def count_decoded(size: int) -> None:
+    with _lock:
+        _totals.bytes_decoded += size
+
+
+def add_stage_time(name: str, seconds: float) -> None:
+    with _lock:
+        _totals.stage_seconds[name] = _totals.stage_seconds.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage_time(name, time.perf_counter() - started)
+
+
+def timed(name: str, items: Iterable[Any]) -> Iterator[Any]:
+    """Yield from `items`, counting the time spent producing each item towards `name`."""
+    iterator = iter(items)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            add_stage_time(name, time.perf_counter() - started)
+        yield item
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in sorted(labels.items())) + "}"
+
+
+def _sample_value(value: float) -> str:
+    return str(value) if isinstance(value, int) else repr(round(value, 6))
+
+
+def render_prometheus(
+    metrics: SyncMetrics,
+    outcomes: dict[str, int],
+    *,
+    labels: dict[str, str] | None = None,
+    finished_at: float | None = None,
+) -> str:
+    """The last run's figures in the Prometheus text exposition format, as gauges."""
+    labels = labels or {}
+    families: list[tuple[str, str, list[tuple[dict[str, str], float]]]] = [
+        (
+            "last_run_seconds",
+            "Wall time of the last sync run.",
+            [({}, metrics.wall_seconds)],
+        ),
+        (
+            "last_run_timestamp_seconds",
+            "Unix time the last sync run finished.",
+            [({}, time.time() if finished_at is None else finished_at)],
+        ),
+        (
+            "stage_seconds",
+            "Time spent per stage in the last run, summed over threads.",
+            [({"stage": name}, value) for name, value in sorted(metrics.stage_seconds.items())],
+        ),
+        (
+            "api_calls",
+            "API requests sent in the last run, by method.",
+            [({"method": name}, value) for name, value in sorted(metrics.api_calls.items())],
+        ),
+        (
+            "api_retries",
+            "API requests retried in the last run, by method.",
+            [({"method": name}, value) for name, value in sorted(metrics.retries.items())],
+        ),
+        (
+            "api_throttled",
+            "Rate-limit answers in the last run, by method.",
+            [({"method": name}, value) for name, value in sorted(metrics.throttled.items())],
+        ),
+        (
+            "decoded_bytes",
+            "Bytes of message and attachment data decoded in the last run.",
+            [({}, metrics.bytes_decoded)],
+        ),
+        (
+            "events",
+            "Events in the last run, by outcome.",
+            [({"outcome": name}, value) for name, value in sorted(outcomes.items())],
+        ),
+    ]
+
+    lines: list[str] = []
+    for name, help_text, samples in families:
+        metric = f"{PROMETHEUS_PREFIX}_{name}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        for sample_labels, value in samples:
+            lines.append(f"{metric}{_labels({**labels, **sample_labels})} {_sample_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def write_report(path: Path, content: str) -> None:
+    """Replace `path` atomically; the node exporter's textfile collector relies on it."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(content)
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
@@ -0,0 +1,416 @@
+"""Streaming asyncio sync engine.
+
+Stages are connected by bounded queues, so memory and latency track the queue depth rather than
+the mailbox size:
+
+    list ids -> fetch messages -> fetch attachments -> parse -> dedupe -> reconcile -> write
+
+Google API clients are blocking, so network calls run on worker threads. Each thread gets its
+service objects from the given factories: with the pooled transport (see `transport`) they can
+return shared services, while services on the default httplib2 transport must be built per
+thread.
+Dedupe is the one barrier: the newest revision of an event can arrive last, so reconciliation
+starts once every message has been parsed. Its memory is bounded by the number of distinct
+events, not by the number of messages.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections.abc import Awaitable, Callable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any
+
+from . import metrics
+from .batch import DEFAULT_BATCH_SIZE, chunked
+from .calendar_client import list_synced_events, refresh_calendar_mirror
+from .gmail_client import (
+    download_ics_payloads,
+    fetch_ics_payloads,
+    get_messages,
+    label_search_term,
+)
+from .ics_parser import (
+    MeetupEvent,
+    decode_ics,
+    dedupe_latest,
+    dump_records,
+    events_from_records,
+    ics_digest,
+    load_records,
+)
+from .store import StateStore
+from .sync import (
+    SyncStats,
+    ThreadHeads,
+    apply_calendar_writes,
+    invite_lead,
+    label_synced_messages,
+    message_id_source,
+    plan_calendar_writes,
+    record_invite_lead,
+    save_history_checkpoint,
+    select_eligible,
+)
+
+_DONE = object()
+_WRITE_COUNTERS = ("created", "updated", "deleted", "skipped", "unchanged", "failed")
+
+
+@dataclass(frozen=True)
+class PipelineLimits:
+    queue_depth: int = 4
+    fetch_concurrency: int = 4
+    attachment_concurrency: int = 4
+    parse_concurrency: int = 4
+    write_concurrency: int = 2
+
+
+class _ThreadServices:
+    """One Gmail and one Calendar service per worker thread."""
+
+    def __init__(self, gmail_factory: Callable[[], Any], calendar_factory: Callable[[], Any]):
+        self._gmail_factory = gmail_factory
+        self._calendar_factory = calendar_factory
+        self._local = threading.local()
+
+    def gmail(self) -> Any:
+        if not hasattr(self._local, "gmail"):
+            self._local.gmail = self._gmail_factory()
+        return self._local.gmail
+
+    def calendar(self) -> Any:
+        if not hasattr(self._local, "calendar"):
+            self._local.calendar = self._calendar_factory()
+        return self._local.calendar
+
+
+async def _stage(
+    source: asyncio.Queue,
+    sink: asyncio.Queue | None,
+    handle: Callable[[Any], Awaitable[Any]],
+    concurrency: int,
+) -> None:
+    """Run `concurrency` workers from `source` into `sink`, then pass the end marker on."""
+
+    async def worker() -> None:
+        while True:
+            item = await source.get()
+            if item is _DONE:
+                await source.put(_DONE)
+                return
+            result = await handle(item)
+            if sink is not None and result is not None:
+                await sink.put(result)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    if sink is not None:
+        await sink.put(_DONE)
+
+
+class _Pipeline:
+    def __init__(
+        self,
+        services: _ThreadServices,
+        calendar_id: str,
+        *,
+        query: str,
+        max_messages: int,
+        lookback_days: int,
+        dry_run: bool,
+        verbose: bool,
+        store: StateStore | None,
+        incremental: bool,
+        parse_workers: int,
+        not_before: datetime | None,
+        fetch_format: str,
+        collapse_threads: bool,
+        synced_label: str | None,
+        list_shards: int,
+        limits: PipelineLimits,
+    ) -> None:
+        self.services = services
+        self.calendar_id = calendar_id
+        self.query = (
+            query if synced_label is None else f"{query} -{label_search_term(synced_label)}"
+        )
+        self.max_messages = max_messages
+        self.lookback_days = lookback_days
+        self.verbose = verbose
+        self.store = store
+        self.incremental = incremental
+        self.parse_workers = parse_workers
+        self.not_before = not_before
+        self.fetch_format = fetch_format
+        self.threads = ThreadHeads() if collapse_threads else None
+        self.synced_label = synced_label
+        self.list_shards = list_shards
+        self.scanned: list[str] = []
+        self.listed: set[str] = set()
+        self.parse_failed: set[str] = set()
+        self.limits = limits
+        self.stats = SyncStats(dry_run=dry_run)
+        self.fetch_failed = False
+        self.latest_by_uid: dict[str, MeetupEvent] = {}
+        self.max_lead: timedelta | None = None
+        self._io = ThreadPoolExecutor(
+            max_workers=limits.fetch_concurrency
+            + limits.attachment_concurrency
+            + limits.parse_concurrency
+            + limits.write_concurrency
+            + 1,
+            thread_name_prefix="meetup-sync",
+        )
+        # Listing pages through one generator, so it keeps to a single thread and service.
+        self._lister = ThreadPoolExecutor(max_workers=1, thread_name_prefix="meetup-sync-list")
+        self._parser: Executor = (
+            ProcessPoolExecutor(max_workers=parse_workers) if parse_workers > 1 else self._io
+        )
+
+    async def _call(self, executor: Executor, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+    def _list_ids(self) -> tuple[Iterator[list[str]], str | None]:
+        message_ids, history_id = message_id_source(
+            self.services.gmail(),
+            self.store,
+            query=self.query,
+            max_messages=self.max_messages,
+            incremental=self.incremental,
+            verbose=self.verbose,
+            not_before=self.not_before,
+            threads=self.threads,
+            list_shards=self.list_shards,
+            listed=self.listed if self.synced_label is not None else None,
+        )
+        return chunked(message_ids, DEFAULT_BATCH_SIZE), history_id
+
+    async def _produce_ids(self, sink: asyncio.Queue) -> str | None:
+        chunks, history_id = await self._call(self._lister, self._list_ids)
+        while True:
+            chunk = await self._call(self._lister, next, chunks, None)
+            if chunk is None:
+                break
+            await sink.put(chunk)
+        await sink.put(_DONE)
+        return history_id
+
+    async def _fetch_messages(self, chunk: list[str]) -> tuple[list[str], dict, dict, dict]:
+        cached: dict[str, tuple[datetime, list[bytes]]] = {}
+        missing: list[str] = []
+        for message_id in chunk:
+            stored = self.store.get_message(message_id) if self.store is not None else None
+            if stored is not None:
+                cached[message_id] = (stored.message_ts, stored.payloads)
+            else:
+                missing.append(message_id)
+
+        messages: dict[str, dict[str, Any]] = {}
+        errors: dict[str, Exception] = {}
+        if missing:
+            messages, errors = await self._call(
+                self._io,
+                lambda: get_messages(
+                    self.services.gmail(), missing, fetch_format=self.fetch_format
+                ),
+            )
+        return chunk, cached, messages, errors
+
+    async def _fetch_attachments(self, item: tuple[list[str], dict, dict, dict]) -> list[tuple]:
+        chunk, found, messages, errors = item
+        if messages:
+            fetched, attachment_errors = await self._call(
+                self._io,
+                lambda: download_ics_payloads(
+                    self.services.gmail(), messages, fetch_format=self.fetch_format
+                ),
+            )
+            errors = {**errors, **attachment_errors}
+            for message_id, (message_ts, ics_payloads) in fetched.items():
+                if self.store is not None:
+                    self.store.put_message(message_id, message_ts, ics_payloads)
+                found[message_id] = (message_ts, ics_payloads)
+
+        older_ids = self.threads.release_empty(found) if self.threads is not None else []
+        if older_ids:
+            # Rare: the newest message of a thread held no invite, so fall back to the older
+            # ones right here rather than sending them back up the pipeline.
+            older, older_errors = await self._call(
+                self._io,
+                lambda: fetch_ics_payloads(
+                    self.services.gmail(), older_ids, fetch_format=self.fetch_format
+                ),
+            )
+            errors = {**errors, **older_errors}
+            for message_id, (message_ts, ics_payloads) in older.items():
+                if self.store is not None:
+                    self.store.put_message(message_id, message_ts, ics_payloads)
+                found[message_id] = (message_ts, ics_payloads)
+            chunk = chunk + older_ids
+            self.listed.update(older_ids)
+
+        payloads: list[tuple[str, datetime, bytes]] = []
+        for message_id in chunk:
+            if message_id in errors:
+                print(f"warning: failed to fetch message {message_id}: {errors[message_id]}")
+                self.fetch_failed = True
+                continue
+            message_ts, ics_payloads = found[message_id]
+            if message_id in self.listed:
+                self.scanned.append(message_id)
+            if self.verbose:
+                print(f"message {message_id}: found {len(ics_payloads)} ICS attachment(s)")
+            payloads.extend((message_id, message_ts, ics_bytes) for ics_bytes in ics_payloads)
+        return payloads
+
+    async def _parse(self, payloads: list[tuple[str, datetime, bytes]]) -> list[MeetupEvent]:
+        events: list[MeetupEvent] = []
+        for message_id, message_ts, ics_bytes in payloads:
+            digest = ics_digest(ics_bytes)
+            cached = self.store.get_parsed_ics(digest) if self.store is not None else None
+            if cached is not None:
+                events.extend(events_from_records(load_records(cached), message_ts))
+                continue
+            try:
+                with metrics.stage("parse"):
+                    records = await self._call(self._parser, decode_ics, ics_bytes)
+            except Exception as exc:
+                print(f"warning: failed to parse ICS for message {message_id}: {exc}")
+                self.parse_failed.add(message_id)
+                continue
+            if self.store is not None:
+                self.store.put_parsed_ics(digest, dump_records(records))
+            events.extend(events_from_records(records, message_ts))
+        return events
+
+    async def _dedupe(self, events: list[MeetupEvent]) -> None:
+        self.stats.parsed += len(events)
+        lead = invite_lead(events)
+        if lead is not None and (self.max_lead is None or lead > self.max_lead):
+            self.max_lead = lead
+        dedupe_latest(events, into=self.latest_by_uid)
+
+    def _existing_events(self) -> dict[str, dict[str, Any]]:
+        if self.store is not None:
+            return refresh_calendar_mirror(
+                self.services.calendar(), self.calendar_id, self.store, verbose=self.verbose
+            )
+        return list_synced_events(self.services.calendar(), self.calendar_id)
+
+    def _reconcile_chunk(
+        self, events: list[MeetupEvent], existing_by_uid: dict[str, dict[str, Any]]
+    ) -> SyncStats:
+        # Requests are planned on the thread that sends them, so each batch uses that thread's
+        # service and HTTP connection.
+        calendar_service = self.services.calendar()
+        chunk_stats = SyncStats(dry_run=self.stats.dry_run)
+        writes = plan_calendar_writes(
+            calendar_service, self.calendar_id, events, existing_by_uid, stats=chunk_stats
+        )
+        if writes:
+            apply_calendar_writes(calendar_service, writes, stats=chunk_stats, verbose=self.verbose)
+        return chunk_stats
+
+    async def _reconcile(self, item: tuple[list[MeetupEvent], dict[str, dict[str, Any]]]) -> None:
+        chunk_stats = await self._call(self._io, self._reconcile_chunk, *item)
+        for name in _WRITE_COUNTERS:
+            setattr(self.stats, name, getattr(self.stats, name) + getattr(chunk_stats, name))
+
+    async def run(self) -> SyncStats:
+        depth = self.limits.queue_depth
+        ids: asyncio.Queue = asyncio.Queue(depth)
+        messages: asyncio.Queue = asyncio.Queue(depth)
+        payloads: asyncio.Queue = asyncio.Queue(depth)
+        events: asyncio.Queue = asyncio.Queue(depth)
+
+        # The calendar listing does not depend on Gmail, so it overlaps with the scan.
+        existing_task = asyncio.ensure_future(self._call(self._io, self._existing_events))
+        history_id, *_ = await asyncio.gather(
+            self._produce_ids(ids),
+            _stage(ids, messages, self._fetch_messages, self.limits.fetch_concurrency),
+            _stage(messages, payloads, self._fetch_attachments, self.limits.attachment_concurrency),
+            _stage(payloads, events, self._parse, self.limits.parse_concurrency),
+            _stage(events, None, self._dedupe, 1),
+        )
+        save_history_checkpoint(self.store, self.query, history_id, fetch_failed=self.fetch_failed)
+        record_invite_lead(self.store, self.max_lead)
+
+        deduped, eligible = select_eligible(self.latest_by_uid.values(), self.lookback_days)
+        self.stats.deduped = len(deduped)
+        self.stats.processed = len(eligible)
+        existing_by_uid = await existing_task
+        if eligible:
+            write_queue: asyncio.Queue = asyncio.Queue()
+            for event_chunk in chunked(eligible, DEFAULT_BATCH_SIZE):
+                write_queue.put_nowait((event_chunk, existing_by_uid))
+            write_queue.put_nowait(_DONE)
+            await _stage(write_queue, None, self._reconcile, self.limits.write_concurrency)
+
+        if self.synced_label is not None:
+            await self._call(self._io, self._label_scanned, self.synced_label)
+        return self.stats
+
+    def _label_scanned(self, label_name: str) -> None:
+        scanned = [message_id for message_id in self.scanned if message_id not in self.parse_failed]
+        label_synced_messages(
+            self.services.gmail(),
+            label_name,
+            scanned,
+            stats=self.stats,
+            verbose=self.verbose,
+            store=self.store,
+        )
+
+    def close(self) -> None:
+        self._io.shutdown(wait=False, cancel_futures=True)
+        self._lister.shutdown(wait=False, cancel_futures=True)
+        if isinstance(self._parser, ProcessPoolExecutor):
+            self._parser.shutdown(cancel_futures=True)
+
+
+def run_pipeline(
+    gmail_factory: Callable[[], Any],
+    calendar_factory: Callable[[], Any],
+    calendar_id: str,
+    *,
+    query: str,
+    max_messages: int,
+    lookback_days: int,
+    dry_run: bool,
+    verbose: bool,
+    store: StateStore | None = None,
+    incremental: bool = False,
+    parse_workers: int = 1,
+    not_before: datetime | None = None,
+    fetch_format: str = "full",
+    collapse_threads: bool = False,
+    synced_label: str | None = None,
+    list_shards: int = 1,
+    limits: PipelineLimits | None = None,
+) -> SyncStats:
+    """Synchronous front end for the streaming engine; returns the same `SyncStats`."""
+    pipeline = _Pipeline(
+        _ThreadServices(gmail_factory, calendar_factory),
+        calendar_id,
+        query=query,
+        max_messages=max_messages,
+        lookback_days=lookback_days,
+        dry_run=dry_run,
+        verbose=verbose,
+        store=store,
+        incremental=incremental,
+        parse_workers=parse_workers,
+        not_before=not_before,
+        fetch_format=fetch_format,
+        collapse_threads=collapse_threads,
+        synced_label=synced_label,
+        list_shards=list_shards,
+        limits=limits or PipelineLimits(),
+    )
+    try:
+        return asyncio.run(pipeline.run())
+    finally:
+        pipeline.close()
@@ -0,0 +1,188 @@
+"""Long-running sync daemon that keeps clients and caches warm between cycles."""
+
+from __future__ import annotations
+
+import signal
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+
+from . import metrics
+from .auth import CredentialManager
+from .calendar_client import resolve_calendar
+from .config import MAX_POLL_SECONDS, MIN_POLL_SECONDS, TOKEN_REFRESH_MARGIN_SECONDS
+from .store import StateStore
+from .sync import SyncStats, oldest_useful_message, run_steps, sync_scopes, sync_steps
+from .transport import build_services
+
+# Weight of the latest cycle in the smoothed arrival rate.
+ARRIVAL_SMOOTHING = 0.3
+
+
+@dataclass
+class PollSchedule:
+    """Poll about once per expected new invite, within `[min_seconds, max_seconds]`.
+
+    The invite arrival rate is an exponentially weighted moving average over cycles, so a burst
+    of new mail shortens the interval right away and quiet periods stretch it back out.
+    """
+
+    min_seconds: float = MIN_POLL_SECONDS
+    max_seconds: float = MAX_POLL_SECONDS
+    smoothing: float = ARRIVAL_SMOOTHING
+    rate: float = 0.0  # new messages per second
+
+    def observe(self, arrivals: int, elapsed_seconds: float) -> None:
+        sample = arrivals / max(elapsed_seconds, 1.0)
+        self.rate = self.smoothing * sample + (1 - self.smoothing) * self.rate
+
+    @property
+    def interval(self) -> float:
+        if self.rate <= 0:
+            return self.max_seconds
+        return min(self.max_seconds, max(self.min_seconds, 1 / self.rate))
+
+
+class SyncSession:
+    """Credentials, service objects, calendar id and state db, reused by every cycle."""
+
+    def __init__(
+        self,
+        *,
+        credentials_path: Path,
+        token_path: Path,
+        calendar_name: str,
+        query: str,
+        max_messages: int,
+        lookback_days: int,
+        dry_run: bool,
+        verbose: bool,
+        state_path: Path,
+        stop_early: bool = False,
+        fetch_format: str = "full",
+        collapse_threads: bool = False,
+        synced_label: str | None = None,
+        list_shards: int = 1,
+    ) -> None:
+        self.credentials = CredentialManager(
+            credentials_path,
+            token_path,
+            required_scopes=sync_scopes(label_synced=synced_label is not None),
+            refresh_margin=timedelta(seconds=TOKEN_REFRESH_MARGIN_SECONDS),
+        )
+        creds = self.credentials.ensure_fresh()
+        self.gmail_service, self.calendar_service = build_services(creds)
+        self.store = StateStore(state_path)
+        self.calendar_id = resolve_calendar(self.calendar_service, calendar_name, self.store)
+        self.query = query
+        self.max_messages = max_messages
+        self.lookback_days = lookback_days
+        self.dry_run = dry_run
+        self.verbose = verbose
+        self.stop_early = stop_early
+        self.fetch_format = fetch_format
+        self.collapse_threads = collapse_threads
+        self.synced_label = synced_label
+        self.list_shards = list_shards
+
+    def run_cycle(self) -> tuple[SyncStats, int]:
+        """Run one incremental sync; returns its stats and how many new messages it saw."""
+        started = metrics.snapshot()
+        with metrics.stage("setup"):
+            self.credentials.ensure_fresh()
+        known = self.store.message_count()
+        not_before = (
+            oldest_useful_message(self.store, self.lookback_days) if self.stop_early else None
+        )
+        stats = run_steps(
+            sync_steps(
+                self.gmail_service,
+                self.calendar_service,
+                self.calendar_id,
+                query=self.query,
+                max_messages=self.max_messages,
+                lookback_days=self.lookback_days,
+                dry_run=self.dry_run,
+                verbose=self.verbose,
+                store=self.store,
+                incremental=True,
+                not_before=not_before,
+                fetch_format=self.fetch_format,
+                collapse_threads=self.collapse_threads,
+                synced_label=self.synced_label,
+                list_shards=self.list_shards,
+            )
+        )
+        self.store.flush_parse_cache_usage()
+        stats.metrics = metrics.snapshot().since(started)
+        return stats, self.store.message_count() - known
+
+    def close(self) -> None:
+        self.store.close()
+
+
+def serve_loop(
+    run_cycle: Callable[[], tuple[SyncStats, int]],
+    schedule: PollSchedule,
+    stop: threading.Event,
+    *,
+    clock: Callable[[], float] = time.monotonic,
+    report: Callable[[SyncStats], None] | None = None,
+) -> int:
+    """Run cycles until `stop` is set, sleeping `schedule.interval` between them.
+
+    A failed cycle is reported and retried at the next poll; `report` is called with the stats
+    of every cycle that completes. Returns the number of cycles run.
+    """
+    cycles = 0
+    last_started = 0.0
+    while not stop.is_set():
+        started = clock()
+        try:
+            stats, arrivals = run_cycle()
+        except Exception as exc:
+            print(f"warning: sync cycle failed: {exc}")
+            arrivals = 0
+        else:
+            print(
+                f"cycle complete new_messages={arrivals} created={stats.created} "
+                f"updated={stats.updated} deleted={stats.deleted} failed={stats.failed}"
+            )
+            if report is not None:
+                try:
+                    report(stats)
+                except Exception as exc:
+                    print(f"warning: failed to write cycle stats: {exc}")
+        # The first cycle catches up on everything since the last run; it says nothing about
+        # the arrival rate.
+        if cycles:
+            schedule.observe(arrivals, started - last_started)
+        cycles += 1
+        last_started = started
+        stop.wait(schedule.interval)
+    return cycles
+
+
+def serve(
+    session: SyncSession,
+    schedule: PollSchedule,
+    *,
+    report: Callable[[SyncStats], None] | None = None,
+) -> int:
+    """Serve until SIGINT or SIGTERM; the cycle in progress is finished before exiting."""
+    stop = threading.Event()
+
+    def request_stop(signum: int, frame: object) -> None:
+        print(f"received {signal.Signals(signum).name}; stopping after the current cycle")
+        stop.set()
+
+    previous = {sig: signal.signal(sig, request_stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        return serve_loop(session.run_cycle, schedule, stop, report=report)
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+        session.close()
@@ -0,0 +1,307 @@
+"""Persistent local sync state backed by SQLite."""
+
+from __future__ import annotations
+
+import functools
+import json
+import sqlite3
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, TypeVar
+
+from .auth import _harden_file_permissions
+
+# Parsed invites are a few KB each, so this keeps thousands of distinct payloads.
+PARSE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    message_id TEXT PRIMARY KEY,
+    internal_ms INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS message_payloads (
+    message_id TEXT NOT NULL REFERENCES messages(message_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (message_id, position)
+);
+CREATE TABLE IF NOT EXISTS listed_messages (
+    query TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    PRIMARY KEY (query, message_id)
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS parsed_ics (
+    digest TEXT PRIMARY KEY,
+    records TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS parsed_ics_last_used ON parsed_ics (last_used);
+CREATE TABLE IF NOT EXISTS calendar_events (
+    calendar_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    ical_uid TEXT,
+    PRIMARY KEY (calendar_id, event_id)
+);
+CREATE INDEX IF NOT EXISTS calendar_events_uid ON calendar_events (calendar_id, ical_uid);
+"""
+
+
+def _locked(method: F) -> F:
+    @functools.wraps(method)
+    def wrapper(self: StateStore, *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper  # type: ignore[return-value]
+
+
+@dataclass(frozen=True)
+class StoredMessage:
+    message_id: str
+    message_ts: datetime
+    payloads: list[bytes]
+
+
+class StateStore:
+    """Local cache of scanned Gmail messages, the calendar mirror and sync checkpoints.
+
+    Methods are serialized with a lock so worker threads can share one store.
+    """
+
+    def __init__(self, path: Path, *, parse_cache_max_bytes: int = PARSE_CACHE_MAX_BYTES) -> None:
+        self.path = path
+        self.parse_cache_max_bytes = parse_cache_max_bytes
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        # Parse cache hits, oldest first, whose `last_used` has not been written back yet.
+        self._touched: dict[str, None] = {}
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript(SCHEMA)
+        _harden_file_permissions(path)
+
+    @_locked
+    def close(self) -> None:
+        self.flush_parse_cache_usage()
+        self._conn.close()
+
+    def __enter__(self) -> StateStore:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    @_locked
+    def get_value(self, key: str) -> str | None:
+        row = self._conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @_locked
+    def set_value(self, key: str, value: str) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    @_locked
+    def delete_value(self, key: str) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM settings WHERE key = ?", (key,))
+
+    @_locked
+    def has_message(self, message_id: str) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM messages WHERE message_id = ?", (message_id,)
+        ).fetchone()
+        return row is not None
+
+    @_locked
+    def message_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    @_locked
+    def record_listed(self, query: str, message_ids: list[str]) -> None:
+        """Remember that `query` listed `message_ids`, so its replays stay within its matches."""
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO listed_messages (query, message_id) VALUES (?, ?)",
+                [(query, message_id) for message_id in message_ids],
+            )
+
+    @_locked
+    def recent_message_ids(self, query: str, limit: int) -> list[str]:
+        """The newest stored messages that `query` listed."""
+        return [
+            message_id
+            for (message_id,) in self._conn.execute(
+                "SELECT messages.message_id FROM messages "
+                "JOIN listed_messages USING (message_id) WHERE listed_messages.query = ? "
+                "ORDER BY internal_ms DESC LIMIT ?",
+                (query, limit),
+            )
+        ]
+
+    @_locked
+    def get_message(self, message_id: str) -> StoredMessage | None:
+        row = self._conn.execute(
+            "SELECT internal_ms FROM messages WHERE message_id = ?", (message_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        payloads = [
+            bytes(data)
+            for (data,) in self._conn.execute(
+                "SELECT data FROM message_payloads WHERE message_id = ? ORDER BY position",
+                (message_id,),
+            )
+        ]
+        message_ts = datetime.fromtimestamp(row[0] / 1000.0, tz=timezone.utc)
+        return StoredMessage(message_id=message_id, message_ts=message_ts, payloads=payloads)
+
+    @_locked
+    def put_message(self, message_id: str, message_ts: datetime, payloads: list[bytes]) -> None:
+        internal_ms = int(message_ts.timestamp() * 1000)
+        with self._conn:
+            self._conn.execute("DELETE FROM messages WHERE message_id = ?", (message_id,))
+            self._conn.execute(
+                "INSERT INTO messages (message_id, internal_ms) VALUES (?, ?)",
+                (message_id, internal_ms),
+            )
+            self._conn.executemany(
+                "INSERT INTO message_payloads (message_id, position, data) VALUES (?, ?, ?)",
+                [(message_id, position, data) for position, data in enumerate(payloads)],
+            )
+
+    @_locked
+    def get_parsed_ics(self, digest: str) -> str | None:
+        row = self._conn.execute(
+            "SELECT records FROM parsed_ics WHERE digest = ?", (digest,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._touched.pop(digest, None)
+        self._touched[digest] = None
+        return row[0]
+
+    @_locked
+    def flush_parse_cache_usage(self) -> None:
+        """Write back the recency of parse cache hits in one transaction."""
+        if not self._touched:
+            return
+        with self._conn:
+            self._write_touched()
+
+    def _write_touched(self) -> None:
+        self._conn.executemany(
+            "UPDATE parsed_ics SET last_used = "
+            "(SELECT MAX(last_used) + 1 FROM parsed_ics) WHERE digest = ?",
+            [(digest,) for digest in self._touched],
+        )
+        self._touched.clear()
+
+    @_locked
+    def put_parsed_ics(self, digest: str, records: str) -> None:
+        """Cache parse results and evict least recently used entries beyond the size cap."""
+        with self._conn:
+            # Pending hits count as used before this entry, and before anything is evicted.
+            self._write_touched()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO parsed_ics (digest, records, size, last_used) "
+                "VALUES (?, ?, ?, (SELECT COALESCE(MAX(last_used), 0) + 1 FROM parsed_ics))",
+                (digest, records, len(records)),
+            )
+            self._conn.execute(
+                """
+                DELETE FROM parsed_ics WHERE digest IN (
+                    SELECT digest FROM (
+                        SELECT digest, SUM(size) OVER (ORDER BY last_used DESC) AS running
+                        FROM parsed_ics
+                    )
+                    WHERE running > ?
+                )
+                """,
+                (self.parse_cache_max_bytes,),
+            )
+
+    def _calendar_sync_token_key(self, calendar_id: str) -> str:
+        return f"calendar_sync_token:{calendar_id}"
+
+    @_locked
+    def calendar_sync_token(self, calendar_id: str) -> str | None:
+        return self.get_value(self._calendar_sync_token_key(calendar_id))
+
+    @_locked
+    def calendar_events(self, calendar_id: str) -> list[dict[str, Any]]:
+        return [
+            json.loads(data)
+            for (data,) in self._conn.execute(
+                "SELECT data FROM calendar_events WHERE calendar_id = ? ORDER BY rowid",
+                (calendar_id,),
+            )
+        ]
+
+    @_locked
+    def calendar_events_by_uid(self, calendar_id: str, uid: str) -> list[dict[str, Any]]:
+        return [
+            json.loads(data)
+            for (data,) in self._conn.execute(
+                "SELECT data FROM calendar_events WHERE calendar_id = ? AND ical_uid = ? "
+                "ORDER BY rowid",
+                (calendar_id, uid),
+            )
+        ]
+
+    @_locked
+    def replace_calendar_events(
+        self, calendar_id: str, items: list[dict[str, Any]], sync_token: str
+    ) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM calendar_events WHERE calendar_id = ?", (calendar_id,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO calendar_events (calendar_id, event_id, data, ical_uid) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (calendar_id, item["id"], json.dumps(item), item.get("iCalUID"))
+                    for item in items
+                ],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                (self._calendar_sync_token_key(calendar_id), sync_token),
+            )
+
+    @_locked
+    def update_calendar_events(
+        self, calendar_id: str, items: list[dict[str, Any]], sync_token: str
+    ) -> None:
+        """Merge incremental changes; deletions arrive as bare `{id, status}` stubs."""
+        with self._conn:
+            for item in items:
+                row = self._conn.execute(
+                    "SELECT data FROM calendar_events WHERE calendar_id = ? AND event_id = ?",
+                    (calendar_id, item["id"]),
+                ).fetchone()
+                if row is None and "extendedProperties" not in item:
+                    continue
+                merged = {**json.loads(row[0]), **item} if row else item
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO calendar_events "
+                    "(calendar_id, event_id, data, ical_uid) VALUES (?, ?, ?, ?)",
+                    (calendar_id, item["id"], json.dumps(merged), merged.get("iCalUID")),
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                (self._calendar_sync_token_key(calendar_id), sync_token),
+            )
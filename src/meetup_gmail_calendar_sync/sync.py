@@ -2,23 +2,66 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+import re
+import threading
+from collections.abc import Callable, Generator, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from functools import partial
 from pathlib import Path
-from typing import Any
+from typing import Any, TypeVar
 
-from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 
+from . import metrics
 from .auth import build_credentials
+from .batch import DEFAULT_BATCH_SIZE, chunked, execute_batched
 from .calendar_client import (
     build_calendar_body,
-    ensure_calendar,
+    delete_event_request,
+    event_is_unchanged,
     event_not_too_old,
     event_start_sort_key,
-    find_existing_event_by_uid,
+    import_event_request,
+    list_synced_events,
+    patch_event_request,
+    refresh_calendar_mirror,
+    resolve_calendar,
 )
-from .config import CALENDAR_SCOPE, GMAIL_READ_SCOPE
-from .gmail_client import iter_messages, load_ics_payloads, parse_message_ts
-from .ics_parser import dedupe_latest, parse_ics_bytes
+from .config import (
+    CALENDAR_SCOPE,
+    GMAIL_MODIFY_SCOPE,
+    GMAIL_READ_SCOPE,
+    INVITE_LEAD_DAYS_DEFAULT,
+)
+from .gmail_client import (
+    add_label,
+    ensure_label,
+    fetch_ics_payloads,
+    get_history_id,
+    get_thread_subjects,
+    iter_message_refs,
+    label_search_term,
+    list_added_message_ids,
+)
+from .ics_parser import (
+    MeetupEvent,
+    decode_ics,
+    dedupe_latest,
+    dump_records,
+    events_from_records,
+    ics_digest,
+    load_records,
+)
+from .metrics import SyncMetrics
+from .store import StateStore
+from .transport import build_services
+
+T = TypeVar("T")
+
+INVITE_LEAD_KEY = "max_invite_lead_seconds"
+INVITE_LEAD_MARGIN = timedelta(days=14)
 
 
 @dataclass
@@ -30,85 +73,570 @@ class SyncStats:
     updated: int = 0
     deleted: int = 0
     skipped: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    labeled: int = 0
     dry_run: bool = False
+    metrics: SyncMetrics = field(default_factory=SyncMetrics)
 
+    def outcomes(self) -> dict[str, int]:
+        return {
+            "parsed": self.parsed,
+            "deduped": self.deduped,
+            "processed": self.processed,
+            "created": self.created,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "deleted": self.deleted,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "labeled": self.labeled,
+        }
 
-def _sync_scopes() -> list[str]:
-    return [CALENDAR_SCOPE, GMAIL_READ_SCOPE]
 
+def sync_scopes(*, label_synced: bool = False) -> list[str]:
+    return [CALENDAR_SCOPE, GMAIL_MODIFY_SCOPE if label_synced else GMAIL_READ_SCOPE]
 
-def collect_events(
+
+def _fetch_ics_payloads(
+    gmail_service: Any,
+    message_ids: list[str],
+    store: StateStore | None,
+    fetch_format: str = "full",
+) -> tuple[dict[str, tuple[datetime, list[bytes]]], dict[str, Exception]]:
+    found: dict[str, tuple[datetime, list[bytes]]] = {}
+    missing: list[str] = []
+    for message_id in message_ids:
+        cached = store.get_message(message_id) if store is not None else None
+        if cached is not None:
+            found[message_id] = (cached.message_ts, cached.payloads)
+        else:
+            missing.append(message_id)
+
+    if not missing:
+        return found, {}
+
+    fetched, errors = fetch_ics_payloads(gmail_service, missing, fetch_format=fetch_format)
+    for message_id, (message_ts, ics_payloads) in fetched.items():
+        if store is not None:
+            store.put_message(message_id, message_ts, ics_payloads)
+        found[message_id] = (message_ts, ics_payloads)
+    return found, errors
+
+
+class _ParseQueue:
+    """Parse ICS payloads inline or on a process pool, consulting the parse cache first.
+
+    With `workers > 1` parsing overlaps with the Gmail fetches that feed the queue; results
+    are gathered by `finish()`.
+    """
+
+    def __init__(self, store: StateStore | None, workers: int) -> None:
+        self.store = store
+        self.events: list[MeetupEvent] = []
+        self.failed: set[str] = set()  # message ids with an unparseable payload
+        self._executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        self._futures: dict[str, Future] = {}
+        self._pending: list[tuple[str, datetime, str]] = []
+
+    def submit(self, message_id: str, message_ts: datetime, ics_bytes: bytes) -> None:
+        digest = ics_digest(ics_bytes)
+        cached = self.store.get_parsed_ics(digest) if self.store is not None else None
+        if cached is not None:
+            self.events.extend(events_from_records(load_records(cached), message_ts))
+            return
+
+        if self._executor is None:
+            try:
+                with metrics.stage("parse"):
+                    records = decode_ics(ics_bytes)
+            except Exception as exc:
+                print(f"warning: failed to parse ICS for message {message_id}: {exc}")
+                self.failed.add(message_id)
+                return
+            self._add(digest, records, message_ts)
+            return
+
+        if digest not in self._futures:
+            self._futures[digest] = self._executor.submit(decode_ics, ics_bytes)
+        self._pending.append((message_id, message_ts, digest))
+
+    def _add(self, digest: str, records: list[dict[str, Any]], message_ts: datetime) -> None:
+        if self.store is not None:
+            self.store.put_parsed_ics(digest, dump_records(records))
+        self.events.extend(events_from_records(records, message_ts))
+
+    def finish(self) -> list[MeetupEvent]:
+        cached: set[str] = set()
+        for message_id, message_ts, digest in self._pending:
+            try:
+                with metrics.stage("parse"):
+                    records = self._futures[digest].result()
+            except Exception as exc:
+                print(f"warning: failed to parse ICS for message {message_id}: {exc}")
+                self.failed.add(message_id)
+                continue
+            if digest in cached:
+                self.events.extend(events_from_records(records, message_ts))
+            else:
+                self._add(digest, records, message_ts)
+                cached.add(digest)
+        self.close()
+        return self.events
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+def invite_lead(events: Iterable[MeetupEvent]) -> timedelta | None:
+    """Longest gap between an invite arriving and the end of the event it announces."""
+    leads = [event_start_sort_key(event.end) - event.message_ts for event in events]
+    return max(leads) if leads else None
+
+
+def record_invite_lead(store: StateStore | None, lead: timedelta | None) -> None:
+    if store is None or lead is None:
+        return
+    known = store.get_value(INVITE_LEAD_KEY)
+    seconds = max(0, int(lead.total_seconds()))
+    if known is None or seconds > int(known):
+        store.set_value(INVITE_LEAD_KEY, str(seconds))
+
+
+def oldest_useful_message(
+    store: StateStore | None, lookback_days: int, *, now: datetime | None = None
+) -> datetime:
+    """Mail received before this cannot carry an event that ends inside the lookback window.
+
+    The bound assumes no invite arrives earlier than the longest lead time seen so far (plus a
+    margin), or `INVITE_LEAD_DAYS_DEFAULT` days before the state db has seen any invites.
+    """
+    known = store.get_value(INVITE_LEAD_KEY) if store is not None else None
+    if known is None:
+        lead = timedelta(days=INVITE_LEAD_DAYS_DEFAULT)
+    else:
+        lead = timedelta(seconds=int(known)) + INVITE_LEAD_MARGIN
+    now = now or datetime.now(timezone.utc)
+    return now - timedelta(days=lookback_days) - lead
+
+
+def bounded_query(query: str, not_before: datetime | None) -> str:
+    if not_before is None:
+        return query
+    return f"{query} after:{int(not_before.timestamp())}"
+
+
+_REPLY_PREFIX = re.compile(r"^(?:\s*(?:re|fwd?)\s*:)+", re.IGNORECASE)
+
+
+def _thread_subject(subject: str | None) -> str | None:
+    if not subject:
+        return None
+    return " ".join(_REPLY_PREFIX.sub("", subject).split()).casefold()
+
+
+class ThreadHeads:
+    """Collapse newest-first listings to the newest message of each Gmail thread.
+
+    Meetup sends an event's invite, updates and cancellation into one thread, and the newest
+    message carries the latest revision, so the older ones are held back. If a thread's newest
+    message turns out to hold no invite, `release_empty` hands back the held messages and the
+    thread is no longer collapsed. Gmail also threads unrelated mail whose subjects match up to a
+    reply prefix, such as a recurring event's weekly invites, so `release_mixed` hands back held
+    messages whose subject differs from their head's.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._held: dict[str, list[str]] = {}
+        self._thread_of_head: dict[str, str] = {}
+        self._released: set[str] = set()
+
+    def filter(self, message_refs: Iterable[dict[str, str]]) -> Iterator[str]:
+        for message_ref in message_refs:
+            message_id = message_ref["id"]
+            thread_id = message_ref.get("threadId")
+            with self._lock:
+                if thread_id is None or thread_id in self._released:
+                    pass
+                elif thread_id in self._held:
+                    self._held[thread_id].append(message_id)
+                    continue
+                else:
+                    self._held[thread_id] = []
+                    self._thread_of_head[message_id] = thread_id
+            yield message_id
+
+    def release_empty(self, fetched: dict[str, tuple[datetime, list[bytes]]]) -> list[str]:
+        """Held messages of the threads whose fetched head carries no calendar payload."""
+        released: list[str] = []
+        with self._lock:
+            for message_id, (_, ics_payloads) in fetched.items():
+                thread_id = self._thread_of_head.get(message_id)
+                if thread_id is None or ics_payloads:
+                    continue
+                del self._thread_of_head[message_id]
+                self._released.add(thread_id)
+                released.extend(self._held.pop(thread_id))
+        return released
+
+    def held_threads(self) -> list[str]:
+        """Threads that still hold back messages behind their head."""
+        with self._lock:
+            return [
+                thread_id for thread_id in self._thread_of_head.values() if self._held[thread_id]
+            ]
+
+    def release_mixed(self, subjects: dict[str, dict[str, str]]) -> list[str]:
+        """Held messages whose subject is unknown or differs from their thread head's.
+
+        `subjects` maps thread ids to the subject of each of their messages.
+        """
+        released: list[str] = []
+        with self._lock:
+            for head_id, thread_id in self._thread_of_head.items():
+                if thread_id not in subjects or not self._held.get(thread_id):
+                    continue
+                by_message = subjects[thread_id]
+                head_subject = _thread_subject(by_message.get(head_id))
+                kept: list[str] = []
+                for message_id in self._held[thread_id]:
+                    subject = _thread_subject(by_message.get(message_id))
+                    if head_subject is not None and subject == head_subject:
+                        kept.append(message_id)
+                    else:
+                        released.append(message_id)
+                self._held[thread_id] = kept
+        return released
+
+    @property
+    def held_back(self) -> int:
+        with self._lock:
+            return sum(len(held) for held in self._held.values())
+
+
+def _listed_ids(
     gmail_service: Any,
+    query: str,
+    max_messages: int,
+    threads: ThreadHeads | None,
+    shards: int = 1,
+    listed: set[str] | None = None,
+) -> Iterator[str]:
+    message_refs = iter_message_refs(
+        gmail_service, query=query, max_messages=max_messages, shards=shards
+    )
+    message_ids = (
+        threads.filter(message_refs)
+        if threads is not None
+        else (message_ref["id"] for message_ref in message_refs)
+    )
+    for message_id in message_ids:
+        if listed is not None:
+            listed.add(message_id)
+        yield message_id
+    if threads is not None:
+        for message_id in _release_mixed_threads(gmail_service, threads):
+            if listed is not None:
+                listed.add(message_id)
+            yield message_id
+
+
+def _release_mixed_threads(gmail_service: Any, threads: ThreadHeads) -> list[str]:
+    """Held messages that may carry other events than their thread's head, once listing ends."""
+    thread_ids = threads.held_threads()
+    if not thread_ids:
+        return []
+    subjects, errors = get_thread_subjects(gmail_service, thread_ids)
+    for thread_id, exc in errors.items():
+        # Unknown subjects release the whole thread rather than risk missing an event.
+        print(f"warning: failed to check thread {thread_id} for other events: {exc}")
+        subjects[thread_id] = {}
+    return threads.release_mixed(subjects)
+
+
+def _history_checkpoint_key(query: str) -> str:
+    return f"gmail_history_id:{query}"
+
+
+def _incremental_message_ids(
+    gmail_service: Any,
+    store: StateStore,
     *,
     query: str,
     max_messages: int,
     verbose: bool,
-):
-    events = []
-
-    for message in iter_messages(gmail_service, query=query, max_messages=max_messages):
-        message_id = message["id"]
-        message_ts = parse_message_ts(message)
-        payload = message.get("payload", {})
-        ics_payloads = load_ics_payloads(gmail_service, message_id=message_id, payload=payload)
+    not_before: datetime | None = None,
+    threads: ThreadHeads | None = None,
+    listed: set[str] | None = None,
+) -> tuple[list[str], str] | None:
+    checkpoint = store.get_value(_history_checkpoint_key(query))
+    if checkpoint is None:
+        return None
 
+    try:
+        added, history_id = list_added_message_ids(gmail_service, checkpoint)
+    except HttpError as exc:
+        if exc.resp.status != 404:
+            raise
         if verbose:
-            print(f"message {message_id}: found {len(ics_payloads)} ICS attachment(s)")
+            print(f"history checkpoint {checkpoint} expired; running full scan")
+        return None
 
-        for ics_bytes in ics_payloads:
-            try:
-                events.extend(parse_ics_bytes(ics_bytes, message_ts=message_ts))
-            except Exception as exc:
-                print(f"warning: failed to parse ICS for message {message_id}: {exc}")
+    # Listing is newest first, so new matches end at the first message scanned on an earlier run.
+    new_refs: list[dict[str, str]] = []
+    if added:
+        listing_query = bounded_query(query, not_before)
+        for message_ref in iter_message_refs(
+            gmail_service, query=listing_query, max_messages=max_messages
+        ):
+            if store.has_message(message_ref["id"]):
+                break
+            new_refs.append(message_ref)
+    if threads is not None:
+        new_ids = list(threads.filter(new_refs))
+        new_ids.extend(_release_mixed_threads(gmail_service, threads))
+    else:
+        new_ids = [message_ref["id"] for message_ref in new_refs]
+    if listed is not None:
+        listed.update(new_ids)
+    store.record_listed(query, new_ids)
+    if verbose:
+        print(f"history: {len(added)} message(s) added, {len(new_ids)} new match(es)")
 
-    return events
+    known_ids = store.recent_message_ids(query, max_messages - len(new_ids))
+    return new_ids + known_ids, history_id
 
 
-def run_sync(
+def message_id_source(
+    gmail_service: Any,
+    store: StateStore | None,
     *,
-    credentials_path: Path,
-    token_path: Path,
-    calendar_name: str,
     query: str,
     max_messages: int,
-    lookback_days: int,
-    dry_run: bool,
+    incremental: bool,
     verbose: bool,
-) -> tuple[str, SyncStats]:
-    creds = build_credentials(
-        credentials_path=credentials_path,
-        token_path=token_path,
-        required_scopes=_sync_scopes(),
+    not_before: datetime | None = None,
+    threads: ThreadHeads | None = None,
+    list_shards: int = 1,
+    listed: set[str] | None = None,
+) -> tuple[Iterable[str], str | None]:
+    """Pick the message ids to scan and the history id to checkpoint once they are handled.
+
+    With `not_before`, Gmail only lists mail received after it; checkpoints stay keyed by the
+    unbounded query. With `threads`, listed mail is collapsed to the newest message per thread.
+    Full scans list `list_shards` date ranges concurrently; incremental ones stay sequential.
+    `listed`, if given, receives the ids that came from a Gmail listing rather than the state db.
+    The state db remembers which query listed each message, and only replays that query's mail.
+    """
+    if incremental and store is not None:
+        result = _incremental_message_ids(
+            gmail_service,
+            store,
+            query=query,
+            max_messages=max_messages,
+            verbose=verbose,
+            not_before=not_before,
+            threads=threads,
+            listed=listed,
+        )
+        if result is not None:
+            return result
+        history_id = get_history_id(gmail_service)
+    else:
+        history_id = None
+    listing_query = bounded_query(query, not_before)
+    message_ids = _listed_ids(
+        gmail_service, listing_query, max_messages, threads, list_shards, listed
     )
-    gmail_service = build("gmail", "v1", credentials=creds, cache_discovery=False)
-    calendar_service = build("calendar", "v3", credentials=creds, cache_discovery=False)
+    if store is not None:
+        message_ids = _record_listed(store, query, message_ids)
+    return message_ids, history_id
+
+
+def _record_listed(store: StateStore, query: str, message_ids: Iterable[str]) -> Iterator[str]:
+    for chunk in chunked(message_ids, DEFAULT_BATCH_SIZE):
+        store.record_listed(query, chunk)
+        yield from chunk
+
+
+def save_history_checkpoint(
+    store: StateStore | None, query: str, history_id: str | None, *, fetch_failed: bool
+) -> None:
+    if store is None or history_id is None:
+        return
+    # A message that failed to download would be hidden behind the checkpoint, so force the
+    # next run back onto a full scan instead.
+    if fetch_failed:
+        store.delete_value(_history_checkpoint_key(query))
+    else:
+        store.set_value(_history_checkpoint_key(query), history_id)
+
+
+def run_steps(steps: Generator[None, None, T]) -> T:
+    """Drive a step generator to completion and return its result."""
+    while True:
+        try:
+            next(steps)
+        except StopIteration as done:
+            return done.value
 
-    calendar_id = ensure_calendar(calendar_service, calendar_name=calendar_name)
-    if verbose:
-        print(f"using calendar: {calendar_id}")
 
-    all_events = collect_events(
+def collect_event_steps(
+    gmail_service: Any,
+    *,
+    query: str,
+    max_messages: int,
+    verbose: bool,
+    store: StateStore | None = None,
+    incremental: bool = False,
+    parse_workers: int = 1,
+    not_before: datetime | None = None,
+    fetch_format: str = "full",
+    collapse_threads: bool = False,
+    list_shards: int = 1,
+    scanned: list[str] | None = None,
+) -> Generator[None, None, list[MeetupEvent]]:
+    """`collect_events`, pausing after each batch of messages so callers can interleave work.
+
+    `scanned`, if given, receives the ids of the messages that this run's Gmail listing returned
+    and that were fetched and parsed cleanly; ids replayed from the state db are left out.
+    """
+    threads = ThreadHeads() if collapse_threads else None
+    listed: set[str] | None = set() if scanned is not None else None
+    message_ids, history_id = message_id_source(
         gmail_service,
+        store,
         query=query,
         max_messages=max_messages,
+        incremental=incremental,
         verbose=verbose,
+        not_before=not_before,
+        threads=threads,
+        list_shards=list_shards,
+        listed=listed,
     )
-    deduped = dedupe_latest(all_events)
+
+    fetch_failed = False
+    parse_queue = _ParseQueue(store, parse_workers)
+    try:
+        for chunk in chunked(message_ids, DEFAULT_BATCH_SIZE):
+            fetched, errors = _fetch_ics_payloads(gmail_service, chunk, store, fetch_format)
+            older_ids = threads.release_empty(fetched) if threads is not None else []
+            if older_ids:
+                older, older_errors = _fetch_ics_payloads(
+                    gmail_service, older_ids, store, fetch_format
+                )
+                fetched.update(older)
+                errors.update(older_errors)
+                chunk = chunk + older_ids
+                if listed is not None:
+                    listed.update(older_ids)
+
+            for message_id in chunk:
+                if message_id in errors:
+                    print(f"warning: failed to fetch message {message_id}: {errors[message_id]}")
+                    fetch_failed = True
+                    continue
+                message_ts, ics_payloads = fetched[message_id]
+                if scanned is not None and listed is not None and message_id in listed:
+                    scanned.append(message_id)
+
+                if verbose:
+                    print(f"message {message_id}: found {len(ics_payloads)} ICS attachment(s)")
+
+                for ics_bytes in ics_payloads:
+                    parse_queue.submit(message_id, message_ts, ics_bytes)
+
+            # Listing is newest first: once a whole chunk predates the bound, so does the rest.
+            if (
+                not_before is not None
+                and fetched
+                and all(message_ts < not_before for message_ts, _ in fetched.values())
+            ):
+                if verbose:
+                    print(f"stopping scan at mail older than {not_before.isoformat()}")
+                break
+            yield
+        events = parse_queue.finish()
+    finally:
+        parse_queue.close()
+
+    if scanned is not None and parse_queue.failed:
+        scanned[:] = [message_id for message_id in scanned if message_id not in parse_queue.failed]
+
+    if verbose and threads is not None:
+        print(f"skipped {threads.held_back} older message(s) in already scanned threads")
+
+    save_history_checkpoint(store, query, history_id, fetch_failed=fetch_failed)
+    record_invite_lead(store, invite_lead(events))
+    return events
+
+
+def collect_events(
+    gmail_service: Any,
+    *,
+    query: str,
+    max_messages: int,
+    verbose: bool,
+    store: StateStore | None = None,
+    incremental: bool = False,
+    parse_workers: int = 1,
+    not_before: datetime | None = None,
+    fetch_format: str = "full",
+    collapse_threads: bool = False,
+    list_shards: int = 1,
+) -> list[MeetupEvent]:
+    return run_steps(
+        collect_event_steps(
+            gmail_service,
+            query=query,
+            max_messages=max_messages,
+            verbose=verbose,
+            store=store,
+            incremental=incremental,
+            parse_workers=parse_workers,
+            not_before=not_before,
+            fetch_format=fetch_format,
+            collapse_threads=collapse_threads,
+            list_shards=list_shards,
+        )
+    )
+
+
+def select_eligible(
+    events: Iterable[MeetupEvent], lookback_days: int
+) -> tuple[dict[str, MeetupEvent], list[MeetupEvent]]:
+    deduped = dedupe_latest(events)
     eligible = [event for event in deduped.values() if event_not_too_old(event, lookback_days)]
     eligible.sort(key=lambda event: event_start_sort_key(event.start))
+    return deduped, eligible
+
+
+@dataclass(frozen=True)
+class CalendarWrite:
+    action: str  # "create", "update" or "delete"
+    event: MeetupEvent
+    request: Callable[[], Any]
 
-    stats = SyncStats(
-        parsed=len(all_events),
-        deduped=len(deduped),
-        processed=len(eligible),
-        dry_run=dry_run,
-    )
+
+def plan_calendar_writes(
+    calendar_service: Any,
+    calendar_id: str,
+    eligible: list[MeetupEvent],
+    existing_by_uid: dict[str, dict[str, Any]],
+    *,
+    stats: SyncStats,
+) -> list[CalendarWrite]:
+    writes: list[CalendarWrite] = []
 
     for event in eligible:
-        existing = find_existing_event_by_uid(calendar_service, calendar_id, event.uid)
+        existing = existing_by_uid.get(event.uid)
 
         if event.status == "CANCELLED":
-            if dry_run:
+            if stats.dry_run:
                 if existing:
                     print(f"dry-run delete: {event.summary} ({event.uid})")
                     stats.deleted += 1
@@ -117,19 +645,20 @@ def run_sync(
                 continue
 
             if existing and existing.get("status") != "cancelled":
-                calendar_service.events().delete(
-                    calendarId=calendar_id,
-                    eventId=existing["id"],
-                    sendUpdates="none",
-                ).execute()
-                stats.deleted += 1
+                request = partial(
+                    delete_event_request, calendar_service, calendar_id, existing["id"]
+                )
+                writes.append(CalendarWrite("delete", event, request))
             else:
                 stats.skipped += 1
             continue
 
         body = build_calendar_body(event)
+        if existing and event_is_unchanged(existing, event, body):
+            stats.unchanged += 1
+            continue
 
-        if dry_run:
+        if stats.dry_run:
             if existing:
                 print(f"dry-run update: {event.summary} ({event.uid})")
                 stats.updated += 1
@@ -139,17 +668,280 @@ def run_sync(
             continue
 
         if existing:
-            calendar_service.events().patch(
-                calendarId=calendar_id,
-                eventId=existing["id"],
-                body=body,
-                sendUpdates="none",
-            ).execute()
-            stats.updated += 1
+            request = partial(
+                patch_event_request, calendar_service, calendar_id, existing["id"], body
+            )
+            writes.append(CalendarWrite("update", event, request))
         else:
-            import_body = dict(body)
-            import_body["iCalUID"] = event.uid
-            calendar_service.events().import_(calendarId=calendar_id, body=import_body).execute()
+            request = partial(import_event_request, calendar_service, calendar_id, event.uid, body)
+            writes.append(CalendarWrite("create", event, request))
+
+    return writes
+
+
+def apply_calendar_writes(
+    calendar_service: Any,
+    writes: list[CalendarWrite],
+    *,
+    stats: SyncStats,
+    verbose: bool,
+) -> None:
+    requests = {str(index): write.request for index, write in enumerate(writes)}
+    with metrics.stage("calendar_write"):
+        _, errors = execute_batched(calendar_service, requests)
+
+    for index, write in enumerate(writes):
+        label = f"{write.event.summary} ({write.event.uid})"
+        exc = errors.get(str(index))
+        if exc is not None:
+            print(f"warning: failed to {write.action} {label}: {exc}")
+            stats.failed += 1
+            continue
+
+        if write.action == "create":
             stats.created += 1
+        elif write.action == "update":
+            stats.updated += 1
+        else:
+            stats.deleted += 1
+        if verbose:
+            print(f"{write.action}: {label}")
+
+
+def reconcile_steps(
+    calendar_service: Any,
+    calendar_id: str,
+    eligible: list[MeetupEvent],
+    *,
+    stats: SyncStats,
+    verbose: bool,
+    store: StateStore | None = None,
+) -> Generator[None, None, None]:
+    """`reconcile_events`, pausing after the calendar listing and after each batch of writes."""
+    if not eligible:
+        return
+    if store is not None:
+        existing_by_uid = refresh_calendar_mirror(
+            calendar_service, calendar_id, store, verbose=verbose
+        )
+    else:
+        existing_by_uid = list_synced_events(calendar_service, calendar_id)
+    yield
+    writes = plan_calendar_writes(
+        calendar_service, calendar_id, eligible, existing_by_uid, stats=stats
+    )
+    for write_chunk in chunked(writes, DEFAULT_BATCH_SIZE):
+        apply_calendar_writes(calendar_service, write_chunk, stats=stats, verbose=verbose)
+        yield
+
+
+def reconcile_events(
+    calendar_service: Any,
+    calendar_id: str,
+    eligible: list[MeetupEvent],
+    *,
+    stats: SyncStats,
+    verbose: bool,
+    store: StateStore | None = None,
+) -> None:
+    run_steps(
+        reconcile_steps(
+            calendar_service, calendar_id, eligible, stats=stats, verbose=verbose, store=store
+        )
+    )
+
+
+def _label_id_key(label_name: str) -> str:
+    return f"gmail_label_id:{label_name}"
+
+
+def label_synced_messages(
+    gmail_service: Any,
+    label_name: str,
+    message_ids: list[str],
+    *,
+    stats: SyncStats,
+    verbose: bool,
+    store: StateStore | None = None,
+) -> None:
+    """Label scanned mail once its events are in the calendar, so later listings skip it.
+
+    The label id is remembered in the state db, so steady-state runs cost one `batchModify`.
+    """
+    if stats.dry_run or not message_ids:
+        return
+    if stats.failed:
+        # Which message a failed write came from is not tracked, so all of them stay visible.
+        print("warning: not labeling scanned messages because some calendar writes failed")
+        return
+
+    cached = store.get_value(_label_id_key(label_name)) if store is not None else None
+    try:
+        label_id = cached or ensure_label(gmail_service, label_name)
+        try:
+            add_label(gmail_service, label_id, message_ids)
+        except HttpError as exc:
+            # The cached label may have been deleted since; look it up once more.
+            if cached is None or exc.resp.status not in (400, 404):
+                raise
+            label_id = ensure_label(gmail_service, label_name)
+            add_label(gmail_service, label_id, message_ids)
+    except HttpError as exc:
+        print(f"warning: failed to label synced messages: {exc}")
+        return
+    if store is not None and label_id != cached:
+        store.set_value(_label_id_key(label_name), label_id)
+    stats.labeled = len(message_ids)
+    if verbose:
+        print(f"labeled {len(message_ids)} message(s) {label_name}")
+
+
+def sync_steps(
+    gmail_service: Any,
+    calendar_service: Any,
+    calendar_id: str,
+    *,
+    query: str,
+    max_messages: int,
+    lookback_days: int,
+    dry_run: bool,
+    verbose: bool,
+    store: StateStore | None = None,
+    incremental: bool = False,
+    parse_workers: int = 1,
+    not_before: datetime | None = None,
+    fetch_format: str = "full",
+    collapse_threads: bool = False,
+    list_shards: int = 1,
+    synced_label: str | None = None,
+) -> Generator[None, None, SyncStats]:
+    """One account's phased sync as steps of roughly one API batch each.
+
+    With `synced_label`, mail carrying that label is left out of the scan, and scanned mail is
+    labeled once its events are written.
+    """
+    scanned: list[str] | None = None
+    if synced_label is not None:
+        query = f"{query} -{label_search_term(synced_label)}"
+        scanned = []
+    all_events = yield from collect_event_steps(
+        gmail_service,
+        query=query,
+        max_messages=max_messages,
+        verbose=verbose,
+        store=store,
+        incremental=incremental,
+        parse_workers=parse_workers,
+        not_before=not_before,
+        fetch_format=fetch_format,
+        collapse_threads=collapse_threads,
+        list_shards=list_shards,
+        scanned=scanned,
+    )
+    deduped, eligible = select_eligible(all_events, lookback_days)
+
+    stats = SyncStats(
+        parsed=len(all_events),
+        deduped=len(deduped),
+        processed=len(eligible),
+        dry_run=dry_run,
+    )
+    yield from reconcile_steps(
+        calendar_service, calendar_id, eligible, stats=stats, verbose=verbose, store=store
+    )
+    if synced_label is not None and scanned is not None:
+        label_synced_messages(
+            gmail_service, synced_label, scanned, stats=stats, verbose=verbose, store=store
+        )
+    return stats
+
+
+def run_sync(
+    *,
+    credentials_path: Path,
+    token_path: Path,
+    calendar_name: str,
+    query: str,
+    max_messages: int,
+    lookback_days: int,
+    dry_run: bool,
+    verbose: bool,
+    state_path: Path | None = None,
+    incremental: bool = False,
+    parse_workers: int = 1,
+    engine: str = "phased",
+    stop_early: bool = False,
+    fetch_format: str = "full",
+    collapse_threads: bool = False,
+    synced_label: str | None = None,
+    list_shards: int = 1,
+) -> tuple[str, SyncStats]:
+    started = metrics.snapshot()
+    with metrics.stage("setup"):
+        creds = build_credentials(
+            credentials_path=credentials_path,
+            token_path=token_path,
+            required_scopes=sync_scopes(label_synced=synced_label is not None),
+        )
+        gmail_service, calendar_service = build_services(creds)
+
+    store = StateStore(state_path) if state_path is not None else None
+    try:
+        with metrics.stage("setup"):
+            calendar_id = resolve_calendar(calendar_service, calendar_name, store)
+        if verbose:
+            print(f"using calendar: {calendar_id}")
+
+        not_before = oldest_useful_message(store, lookback_days) if stop_early else None
+        if verbose and not_before is not None:
+            print(f"scanning mail received after {not_before.isoformat()}")
+
+        if engine == "pipeline":
+            from .pipeline import run_pipeline
+
+            stats = run_pipeline(
+                # The pooled transport is thread-safe, so every worker can share the services.
+                lambda: gmail_service,
+                lambda: calendar_service,
+                calendar_id,
+                query=query,
+                max_messages=max_messages,
+                lookback_days=lookback_days,
+                dry_run=dry_run,
+                verbose=verbose,
+                store=store,
+                incremental=incremental,
+                parse_workers=parse_workers,
+                not_before=not_before,
+                fetch_format=fetch_format,
+                collapse_threads=collapse_threads,
+                list_shards=list_shards,
+                synced_label=synced_label,
+            )
+        else:
+            stats = run_steps(
+                sync_steps(
+                    gmail_service,
+                    calendar_service,
+                    calendar_id,
+                    query=query,
+                    max_messages=max_messages,
+                    lookback_days=lookback_days,
+                    dry_run=dry_run,
+                    verbose=verbose,
+                    store=store,
+                    incremental=incremental,
+                    parse_workers=parse_workers,
+                    not_before=not_before,
+                    fetch_format=fetch_format,
+                    collapse_threads=collapse_threads,
+                    list_shards=list_shards,
+                    synced_label=synced_label,
+                )
+            )
+    finally:
+        if store is not None:
+            store.close()
 
+    stats.metrics = metrics.snapshot().since(started)
     return calendar_id, stats
@@ -0,0 +1,240 @@
+"""Client-side quota accounting and adaptive concurrency for Google API calls.
+
+Every Gmail and Calendar request goes through the scheduler of its API and user. It spends
+the request's quota units from a token bucket refilled at the per-user quota rate, bounds the
+number of requests in flight with an AIMD controller, and retries throttled or transient
+failures with jittered exponential backoff.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+import weakref
+from collections.abc import Callable
+from typing import Any
+
+from googleapiclient.errors import HttpError
+
+from . import metrics
+
+MAX_ATTEMPTS = 4
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+# https://developers.google.com/gmail/api/reference/quota; methods not listed cost one unit.
+QUOTA_UNITS = {
+    "gmail.users.getProfile": 1,
+    "gmail.users.history.list": 2,
+    "gmail.users.labels.create": 5,
+    "gmail.users.labels.list": 1,
+    "gmail.users.messages.attachments.get": 5,
+    "gmail.users.messages.batchModify": 50,
+    "gmail.users.messages.get": 5,
+    "gmail.users.messages.list": 5,
+    "gmail.users.threads.get": 10,
+}
+DEFAULT_QUOTA_UNITS = 1
+# Gmail allows 250 units per user per second as a moving average; Calendar 600 queries per user
+# per minute. Buckets hold a couple of seconds' worth so short bursts are not delayed.
+GMAIL_UNITS_PER_SECOND = 250.0
+GMAIL_BURST_UNITS = 500.0
+CALENDAR_UNITS_PER_SECOND = 10.0
+CALENDAR_BURST_UNITS = 100.0
+INITIAL_CONCURRENCY = 8
+MAX_CONCURRENCY = 50
+
+
+def _error_reasons(exc: HttpError) -> set[str]:
+    try:
+        doc = json.loads(exc.content.decode("utf-8"))
+    except Exception:
+        return set()
+    errors = (doc.get("error") or {}).get("errors") or []
+    return {str(error.get("reason")) for error in errors if isinstance(error, dict)}
+
+
+def is_rate_limited(exc: Exception) -> bool:
+    if not isinstance(exc, HttpError):
+        return False
+    status = exc.resp.status
+    return status == 429 or (status == 403 and bool(_error_reasons(exc) & RATE_LIMIT_REASONS))
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    if not isinstance(exc, HttpError):
+        return False
+    return exc.resp.status in RETRYABLE_STATUSES or is_rate_limited(exc)
+
+
+def backoff_delay(attempt: int, base_seconds: float = 1.0, cap_seconds: float = 32.0) -> float:
+    """Full-jitter exponential backoff for the given zero-based retry attempt."""
+    return random.uniform(0, min(cap_seconds, base_seconds * (2**attempt)))
+
+
+def request_cost(request: Any) -> int:
+    return QUOTA_UNITS.get(getattr(request, "methodId", None) or "", DEFAULT_QUOTA_UNITS)
+
+
+class TokenBucket:
+    """Quota units refilled continuously at `rate` per second, holding at most `capacity`."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, units: float) -> None:
+        units = min(units, self.capacity)
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= units:
+                    self._tokens -= units
+                    return
+                wait = (units - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on requests in flight.
+
+    The limit doubles per round of successes until the first throttling answer (slow start),
+    then grows by one per round and halves whenever the API pushes back.
+    """
+
+    def __init__(
+        self,
+        initial: int = INITIAL_CONCURRENCY,
+        *,
+        minimum: int = 1,
+        maximum: int = MAX_CONCURRENCY,
+    ) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self._limit = float(initial)
+        self._slow_start = True
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def __enter__(self) -> AdaptiveConcurrency:
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, count: int = 1) -> None:
+        with self._condition:
+            step = count if self._slow_start else count / self._limit
+            self._limit = min(self.maximum, self._limit + step)
+            self._condition.notify_all()
+
+    def on_throttle(self) -> None:
+        with self._condition:
+            self._slow_start = False
+            self._limit = max(self.minimum, self._limit / 2)
+
+
+class ApiScheduler:
+    def __init__(
+        self,
+        units_per_second: float,
+        burst_units: float,
+        *,
+        initial_concurrency: int = INITIAL_CONCURRENCY,
+        max_concurrency: int = MAX_CONCURRENCY,
+        max_attempts: int = MAX_ATTEMPTS,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.bucket = TokenBucket(units_per_second, burst_units, clock=clock, sleep=sleep)
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, maximum=max_concurrency)
+        self.max_attempts = max_attempts
+        self.sleep = sleep
+        self.retries = 0
+        self.throttled = 0
+
+    def record_failure(self, exc: Exception) -> None:
+        self.retries += 1
+        if is_rate_limited(exc):
+            self.throttled += 1
+            self.concurrency.on_throttle()
+
+    def execute(self, request: Any) -> Any:
+        """Execute one request, retrying throttled and transient failures."""
+        cost = request_cost(request)
+        attempt = 0
+        while True:
+            self.bucket.acquire(cost)
+            with self.concurrency:
+                metrics.count_call(request)
+                try:
+                    response = request.execute()
+                except HttpError as exc:
+                    attempt += 1
+                    if attempt >= self.max_attempts or not is_retryable_error(exc):
+                        raise
+                    self.record_failure(exc)
+                    metrics.count_retry(request, throttled=is_rate_limited(exc))
+                else:
+                    self.concurrency.on_success()
+                    return response
+            self.sleep(backoff_delay(attempt - 1))
+
+
+SCHEDULER_LIMITS = {
+    "gmail": (GMAIL_UNITS_PER_SECOND, GMAIL_BURST_UNITS),
+    "calendar": (CALENDAR_UNITS_PER_SECOND, CALENDAR_BURST_UNITS),
+}
+# Quotas are per user, so every set of credentials gets its own schedulers. Requests without
+# credentials (tests, custom transports) share one set.
+_user_schedulers: weakref.WeakKeyDictionary[Any, dict[str, ApiScheduler]] = (
+    weakref.WeakKeyDictionary()
+)
+_shared_schedulers: dict[str, ApiScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def scheduler_for(request: Any) -> ApiScheduler:
+    """The scheduler of the API and user `request` belongs to (Gmail limits when unknown)."""
+    api = (getattr(request, "methodId", None) or "").split(".", 1)[0]
+    if api not in SCHEDULER_LIMITS:
+        api = "gmail"
+    user = getattr(getattr(request, "http", None), "credentials", None)
+    with _schedulers_lock:
+        if user is None:
+            schedulers = _shared_schedulers
+        else:
+            schedulers = _user_schedulers.setdefault(user, {})
+        if api not in schedulers:
+            schedulers[api] = ApiScheduler(*SCHEDULER_LIMITS[api])
+        return schedulers[api]
+
+
+def execute(request: Any) -> Any:
+    return scheduler_for(request).execute(request)
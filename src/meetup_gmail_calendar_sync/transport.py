@@ -0,0 +1,83 @@
+"""Pooled, thread-safe HTTP transport shared by the Gmail and Calendar services.
+
+`googleapiclient` defaults to one `httplib2.Http` per service, which cannot be used from two
+threads at once and keeps at most one connection per host. Here every service talks through
+an `AuthorizedSession` instead, and all sessions in the process mount the same urllib3
+connection pool. TLS connections are then reused by every call of a run, by both APIs, by
+every account of `sync-accounts` and by every `serve` cycle.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+import httplib2
+from google.auth.credentials import Credentials
+from google.auth.transport.requests import AuthorizedSession
+from googleapiclient.discovery import build
+from requests.adapters import HTTPAdapter
+
+# Enough keep-alive connections per host for the pipeline's I/O workers plus the default
+# number of account workers.
+POOL_SIZE = 16
+# Matches googleapiclient's own default socket timeout.
+HTTP_TIMEOUT_SECONDS = 60.0
+
+_adapter: HTTPAdapter | None = None
+_adapter_lock = threading.Lock()
+
+
+def shared_adapter() -> HTTPAdapter:
+    """The process-wide HTTPS connection pool. Retries are left to the API scheduler."""
+    global _adapter
+    with _adapter_lock:
+        if _adapter is None:
+            _adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=0)
+        return _adapter
+
+
+class PooledHttp:
+    """`httplib2.Http` look-alike over an `AuthorizedSession`, safe to share between threads.
+
+    Exposes `credentials` like `google_auth_httplib2.AuthorizedHttp`, so batch requests apply
+    them per item and the API scheduler can tell users apart.
+    """
+
+    def __init__(self, credentials: Credentials, *, timeout: float = HTTP_TIMEOUT_SECONDS):
+        self.credentials = credentials
+        self.timeout = timeout
+        self.session = AuthorizedSession(credentials)
+        self.session.mount("https://", shared_adapter())
+
+    def request(
+        self,
+        uri: str,
+        method: str = "GET",
+        body: Any = None,
+        headers: dict[str, str] | None = None,
+        redirections: int = 5,
+        connection_type: Any = None,
+    ) -> tuple[httplib2.Response, bytes]:
+        response = self.session.request(
+            method, uri, data=body, headers=headers, timeout=self.timeout
+        )
+        # requests has already decompressed the body.
+        info = {
+            key: value
+            for key, value in response.headers.items()
+            if key.lower() != "content-encoding"
+        }
+        info["status"] = str(response.status_code)
+        http_response = httplib2.Response(info)
+        http_response.reason = response.reason
+        return http_response, response.content
+
+
+def build_services(credentials: Credentials) -> tuple[Any, Any]:
+    """Gmail and Calendar services sharing one pooled transport."""
+    http = PooledHttp(credentials)
+    return (
+        build("gmail", "v1", http=http, cache_discovery=False),
+        build("calendar", "v3", http=http, cache_discovery=False),
+    )
@@ -0,0 +1,9 @@
+import pytest
+
+from meetup_gmail_calendar_sync import throttle
+
+
+@pytest.fixture(autouse=True)
+def fresh_api_schedulers(monkeypatch):
+    """Give every test its own quota buckets so earlier tests cannot slow later ones down."""
+    monkeypatch.setattr(throttle, "_shared_schedulers", {})
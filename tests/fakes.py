@@ -0,0 +1,780 @@
+"""In-memory stand-ins for the Gmail and Calendar service objects used in tests."""
+
+from __future__ import annotations
+
+import base64
+import functools
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator, Mapping
+from typing import Any
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+RAW_BOUNDARY = "meetup-invite"
+
+
+def encode_base64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def make_ics(
+    uid: str,
+    *,
+    sequence: int = 0,
+    summary: str = "Meetup event",
+    status: str = "CONFIRMED",
+    start: str = "20990220T170000Z",
+    end: str = "20990220T190000Z",
+) -> bytes:
+    return "\r\n".join(
+        [
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "BEGIN:VEVENT",
+            f"UID:{uid}",
+            f"SEQUENCE:{sequence}",
+            f"STATUS:{status}",
+            "DTSTAMP:20260210T120000Z",
+            f"DTSTART:{start}",
+            f"DTEND:{end}",
+            f"SUMMARY:{summary}",
+            "DESCRIPTION:https://www.meetup.com/x/events/1",
+            "END:VEVENT",
+            "END:VCALENDAR",
+            "",
+        ]
+    ).encode("utf-8")
+
+
+NEW_YORK_VTIMEZONE = [
+    "BEGIN:VTIMEZONE",
+    "TZID:America/New_York",
+    "X-LIC-LOCATION:America/New_York",
+    "BEGIN:DAYLIGHT",
+    "TZOFFSETFROM:-0500",
+    "TZOFFSETTO:-0400",
+    "TZNAME:EDT",
+    "DTSTART:19700308T020000",
+    "RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=2SU",
+    "END:DAYLIGHT",
+    "BEGIN:STANDARD",
+    "TZOFFSETFROM:-0400",
+    "TZOFFSETTO:-0500",
+    "TZNAME:EST",
+    "DTSTART:19701101T020000",
+    "RRULE:FREQ=YEARLY;BYMONTH=11;BYDAY=1SU",
+    "END:STANDARD",
+    "END:VTIMEZONE",
+]
+
+
+def _fold(line: str) -> list[str]:
+    chunks = [line[:75]]
+    chunks.extend(" " + line[start : start + 74] for start in range(75, len(line), 74))
+    return chunks
+
+
+def meetup_invite(index: int, *, variant: int | None = None, year: int = 2026) -> bytes:
+    """An invite shaped like the ones Meetup mails out, varied by `variant`."""
+    variant = index % 6 if variant is None else variant
+    day = 1 + index % 27
+    month = f"{year}03"
+    event_url = f"https://www.meetup.com/python-nyc/events/{300000000 + index}/"
+    description = (
+        f"Python NYC\\nThursday\\, March {day} at 6:30 PM\\n\\n"
+        "Lightning talks\\; pizza\\; and a hands-on workshop. Bring a laptop\\, a charger "
+        f"and your questions.\\n\\n{event_url}"
+    )
+    event = [
+        "BEGIN:VEVENT",
+        "DTSTAMP:20260210T120000Z",
+        f"DTSTART;TZID=America/New_York:{month}{day:02d}T183000",
+        f"DTEND;TZID=America/New_York:{month}{day:02d}T203000",
+        "STATUS:CONFIRMED",
+        f"SUMMARY:Python Night #{index}",
+        f"DESCRIPTION:{description}",
+        "CLASS:PUBLIC",
+        "CREATED:20260101T000000Z",
+        "GEO:40.7411;-73.9897",
+        "LOCATION:Venue (123 Main St\\, New York\\, NY)",
+        f"URL:{event_url}",
+        "LAST-MODIFIED:20260210T120000Z",
+        f"UID:event_{300000000 + index}@meetup.com",
+        f"SEQUENCE:{index % 4}",
+        'ORGANIZER;CN="Meetup Reminder":MAILTO:info@meetup.com',
+        "BEGIN:VALARM",
+        "ACTION:DISPLAY",
+        "DESCRIPTION:Reminder",
+        "TRIGGER:-PT1H",
+        "END:VALARM",
+        "END:VEVENT",
+    ]
+    if variant == 1:
+        event[1:4] = [
+            "DTSTAMP:20260211T090000Z",
+            f"DTSTART:{month}{day:02d}T223000Z",
+            f"DTEND:{month}{day:02d}T233000Z",
+        ]
+    elif variant == 2:
+        event[3:5] = ["STATUS:CANCELLED"]
+    elif variant == 3:
+        event[2:4] = [f"DTSTART;VALUE=DATE:{month}{day:02d}"]
+    elif variant == 4:
+        event.remove("DTSTAMP:20260210T120000Z")
+    elif variant == 5:
+        event.insert(1, "RRULE:FREQ=WEEKLY;COUNT=4")
+
+    lines = [
+        "BEGIN:VCALENDAR",
+        "PRODID:-//Meetup//RemoteApi//EN",
+        "VERSION:2.0",
+        "CALSCALE:GREGORIAN",
+        "METHOD:REQUEST",
+        "X-WR-CALNAME:Events - Python NYC",
+        *NEW_YORK_VTIMEZONE,
+        *event,
+        "END:VCALENDAR",
+    ]
+    return ("\r\n".join(folded for line in lines for folded in _fold(line)) + "\r\n").encode(
+        "utf-8"
+    )
+
+
+def http_error(status: int, reason: str = "") -> HttpError:
+    content = json.dumps({"error": {"errors": [{"reason": reason}]}}).encode("utf-8")
+    return HttpError(httplib2.Response({"status": status}), content)
+
+
+def synced_event(event_id: str, uid: str, **fields: Any) -> dict[str, Any]:
+    return {
+        "id": event_id,
+        "iCalUID": uid,
+        "status": "confirmed",
+        "extendedProperties": {
+            "private": {"sync_source": "meetup-gmail-sync", "meetup_uid": uid},
+        },
+        **fields,
+    }
+
+
+def _parse_field_mask(fields: str, pos: int = 0) -> tuple[dict[str, Any], int]:
+    """Parse `a,b/c,d(e,f)` into `{"a": None, "b": {"c": None}, "d": {"e": None, "f": None}}`."""
+    tree: dict[str, Any] = {}
+    while pos < len(fields) and fields[pos] != ")":
+        match = re.compile(r"[A-Za-z0-9_/]+").match(fields, pos)
+        assert match, f"bad field mask at {fields[pos:]!r}"
+        *parents, name = match.group(0).split("/")
+        pos = match.end()
+        subtree = None
+        if pos < len(fields) and fields[pos] == "(":
+            subtree, pos = _parse_field_mask(fields, pos + 1)
+            pos += 1
+        node = tree
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[name] = subtree
+        if pos < len(fields) and fields[pos] == ",":
+            pos += 1
+    return tree, pos
+
+
+class MaskedDict(dict):
+    """A partial response that fails loudly when code reads a field its mask left out."""
+
+    def __init__(self, data: dict[str, Any], allowed: set[str]) -> None:
+        super().__init__(data)
+        self.allowed = allowed
+
+    def _check(self, key: str) -> None:
+        assert key in self.allowed, f"read {key!r} outside the field mask {sorted(self.allowed)}"
+
+    def __getitem__(self, key: str) -> Any:
+        self._check(key)
+        return super().__getitem__(key)
+
+    def __contains__(self, key: object) -> bool:
+        self._check(str(key))
+        return super().__contains__(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        self._check(key)
+        return super().get(key, default)
+
+
+@functools.cache
+def _field_mask_tree(fields: str) -> dict[str, Any]:
+    return _parse_field_mask(fields)[0]
+
+
+def apply_field_mask(value: Any, tree: dict[str, Any] | None) -> Any:
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [apply_field_mask(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return MaskedDict(
+        {key: apply_field_mask(value[key], tree[key]) for key in tree if key in value},
+        set(tree),
+    )
+
+
+class FakeNetwork:
+    """What the fakes put between the code and the "server": latency, failures, traffic.
+
+    Every HTTP round trip (a single call or a whole batch) sleeps `latency` seconds, and each
+    call fails with a retryable 503 with probability `failure_rate`. Response sizes are counted
+    after field masks are applied, like bytes on the wire.
+    """
+
+    def __init__(self, *, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0) -> None:
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.round_trips = 0
+        self.failures = 0
+        self.bytes_received = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def round_trip(self) -> None:
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def maybe_fail(self) -> None:
+        if not self.failure_rate:
+            return
+        with self._lock:
+            failed = self._random.random() < self.failure_rate
+            self.failures += failed
+        if failed:
+            raise http_error(503, "backendError")
+
+    def record(self, response: Any) -> None:
+        size = len(json.dumps(response)) if response else 0
+        with self._lock:
+            self.bytes_received += size
+
+
+class FakeRequest:
+    """Runs `fn` on execute and, like the real API, returns only the fields asked for."""
+
+    def __init__(
+        self,
+        fn: Callable[[], Any],
+        fields: str | None = None,
+        network: FakeNetwork | None = None,
+    ) -> None:
+        self._fn = fn
+        self._fields = fields
+        self._network = network
+
+    def execute(self, **kwargs: Any) -> Any:
+        if self._network is not None:
+            self._network.round_trip()
+        return self.respond()
+
+    def respond(self) -> Any:
+        """The response without a round trip of its own, as an item of a batch."""
+        if self._network is not None:
+            self._network.maybe_fail()
+        response = self._fn()
+        if self._fields is not None and isinstance(response, dict):
+            response = apply_field_mask(response, _field_mask_tree(self._fields))
+        if self._network is not None:
+            self._network.record(response)
+        return response
+
+
+class FakeBatch:
+    def __init__(
+        self,
+        calls: Counter[str],
+        callback: Callable[..., None],
+        network: FakeNetwork | None = None,
+    ) -> None:
+        self._calls = calls
+        self._callback = callback
+        self._network = network
+        self._requests: list[tuple[str, FakeRequest]] = []
+
+    def add(self, request: FakeRequest, request_id: str) -> None:
+        self._requests.append((request_id, request))
+
+    def execute(self) -> None:
+        self._calls["batch"] += 1
+        if self._network is not None:
+            self._network.round_trip()
+        for request_id, request in self._requests:
+            try:
+                response = request.respond()
+            except HttpError as exc:
+                self._callback(request_id, None, exc)
+            else:
+                self._callback(request_id, response, None)
+
+
+class _Attachments:
+    def __init__(self, service: FakeGmailService) -> None:
+        self._service = service
+
+    def get(
+        self, *, userId: str, messageId: str, id: str, fields: str | None = None
+    ) -> FakeRequest:
+        def run() -> dict[str, Any]:
+            self._service.calls["attachments.get"] += 1
+            return {"data": encode_base64url(self._service.attachments[id])}
+
+        return FakeRequest(run, fields, self._service.network)
+
+
+class _Messages:
+    def __init__(self, service: FakeGmailService) -> None:
+        self._service = service
+
+    def list(
+        self,
+        *,
+        userId: str,
+        q: str,
+        maxResults: int,
+        pageToken: str | None = None,
+        fields: str | None = None,
+        **_: Any,
+    ) -> FakeRequest:
+        def run() -> dict[str, Any]:
+            self._service.calls["messages.list"] += 1
+            ids = self._service.newest_first()
+            excluded = re.search(r"-label:(\S+)", q)
+            if excluded:
+                # Search spells spaces and slashes in label names as dashes.
+                label_id = {
+                    re.sub(r"[\s/]+", "-", name): id for name, id in self._service.label_ids.items()
+                }.get(excluded.group(1))
+                ids = [
+                    message_id
+                    for message_id in ids
+                    if label_id not in self._service.messages[message_id]["labelIds"]
+                ]
+            for operator, seconds in re.findall(r"\b(after|before):(\d+)", q):
+                ids = [
+                    message_id
+                    for message_id in ids
+                    if (
+                        int(self._service.messages[message_id]["internalDate"]) // 1000
+                        > int(seconds)
+                    )
+                    == (operator == "after")
+                ]
+            start = int(pageToken or 0)
+            page = ids[start : start + maxResults]
+            response: dict[str, Any] = {
+                "messages": [
+                    {"id": message_id, "threadId": self._service.messages[message_id]["threadId"]}
+                    for message_id in page
+                ]
+            }
+            if start + maxResults < len(ids):
+                response["nextPageToken"] = str(start + maxResults)
+            return response
+
+        return FakeRequest(run, fields, self._service.network)
+
+    def get(
+        self, *, userId: str, id: str, format: str = "full", fields: str | None = None, **_: Any
+    ) -> FakeRequest:
+        def run() -> dict[str, Any]:
+            self._service.calls["messages.get"] += 1
+            if id in self._service.transient_failures:
+                self._service.transient_failures.remove(id)
+                raise http_error(503)
+            message = self._service.messages[id]
+            if format == "raw":
+                return {**message, "raw": self._service.raw_message(id)}
+            return message
+
+        return FakeRequest(run, fields, self._service.network)
+
+    def batchModify(self, *, userId: str, body: dict[str, Any], **_: Any) -> FakeRequest:
+        def run() -> dict[str, Any]:
+            self._service.calls["messages.batchModify"] += 1
+            assert len(body["ids"]) <= 1000
+            for message_id in body["ids"]:
+                labels = self._service.messages[message_id]["labelIds"]
+                labels.extend(set(body.get("addLabelIds", [])) - set(labels))
+            return {}
+
+        return FakeRequest(run, None, self._service.network)
+
+    def attachments(self) -> _Attachments:
+        return _Attachments(self._service)
+
+
+class _Labels:
+    def __init__(self, service: FakeGmailService) -> None:
+        self._service = service
+
+    def list(self, *, userId: str, fields: str | None = None) -> FakeRequest:
+        def run() -> dict[str, Any]:
+            self._service.calls["labels.list"] += 1
+            labels = [{"id": id, "name": name} for name, id in self._service.label_ids.items()]
+            return {"labels": labels}
+
+        return FakeRequest(run, fields, self._service.network)
+
+    def create(
+        self, *, userId: str, body: dict[str, Any], fields: str | None = None
+    ) -> FakeRequest:
+        def run() -> dict[str, Any]:
+            self._service.calls["labels.create"] += 1
+            label_id = f"Label_{len(self._service.label_ids) + 1}"
+            self._service.label_ids[body["name"]] = label_id
+            return {"id": label_id, "name": body["name"]}
+
+        return FakeRequest(run, fields, self._service.network)
+
+
+class _History:
+    def __init__(self, service: FakeGmailService) -> None:
+        self._service = service
+
+    def list(
+        self, *, userId: str, startHistoryId: str, fields: str | None = None, **_: Any
+    ) -> FakeRequest:
+        def run() -> dict[str, Any]:
+            self._service.calls["history.list"] += 1
+            start = int(startHistoryId)
+            if start < self._service.oldest_history_id:
+                raise http_error(404)
+            records = [
+                {"id": str(history_id), "messagesAdded": [{"message": {"id": message_id}}]}
+                for history_id, message_id in self._service.history
+                if history_id > start
+            ]
+            return {"history": records, "historyId": str(self._service.history_id)}
+
+        return FakeRequest(run, fields, self._service.network)
+
+
+class _Threads:
+    def __init__(self, service: FakeGmailService) -> None:
+        self._service = service
+
+    def get(
+        self, *, userId: str, id: str, format: str, fields: str | None = None, **_: Any
+    ) -> FakeRequest:
+        def run() -> dict[str, Any]:
+            self._service.calls["threads.get"] += 1
+            assert format == "metadata"
+            messages = [
+                message for message in self._service.messages.values() if message["threadId"] == id
+            ]
+            return {"id": id, "messages": messages}
+
+        return FakeRequest(run, fields, self._service.network)
+
+
+class _Users:
+    def __init__(self, service: FakeGmailService) -> None:
+        self._service = service
+
+    def messages(self) -> _Messages:
+        return _Messages(self._service)
+
+    def history(self) -> _History:
+        return _History(self._service)
+
+    def threads(self) -> _Threads:
+        return _Threads(self._service)
+
+    def labels(self) -> _Labels:
+        return _Labels(self._service)
+
+    def getProfile(self, *, userId: str, fields: str | None = None) -> FakeRequest:
+        def run() -> dict[str, Any]:
+            self._service.calls["getProfile"] += 1
+            return {"historyId": str(self._service.history_id)}
+
+        return FakeRequest(run, fields, self._service.network)
+
+
+class FakeGmailService:
+    """Mailbox of messages listed newest first, each carrying one `.ics` attachment."""
+
+    def __init__(self, network: FakeNetwork | None = None) -> None:
+        # In arrival order; listings reverse it, like Gmail's newest-first ordering.
+        self.messages: dict[str, dict[str, Any]] = {}
+        self.attachments: Mapping[str, bytes] = {}
+        self.calls: Counter[str] = Counter()
+        self.history: list[tuple[int, str]] = []
+        self.history_id = 100
+        self.oldest_history_id = 0
+        self.transient_failures: set[str] = set()
+        self.label_ids: dict[str, str] = {}  # user labels by name
+        self.network = network or FakeNetwork()
+        self._listing: list[str] = []
+
+    def newest_first(self) -> list[str]:
+        if len(self._listing) != len(self.messages):
+            self._listing = list(reversed(self.messages))
+        return self._listing
+
+    def add_message(
+        self,
+        message_id: str,
+        ics: bytes | None,
+        *,
+        internal_ms: int = 1770000000000,
+        thread_id: str | None = None,
+        subject: str = "Invitation from Meetup",
+    ) -> None:
+        attachment_id = f"att-{message_id}"
+        if ics is not None:
+            self.attachments[attachment_id] = ics
+        self.history_id += 1
+        self.history.append((self.history_id, message_id))
+        self.messages[message_id] = {
+            "id": message_id,
+            "threadId": thread_id or f"thread-{message_id}",
+            "labelIds": ["INBOX"],
+            "internalDate": str(internal_ms),
+            "payload": {
+                "mimeType": "multipart/mixed",
+                "headers": [{"name": "Subject", "value": subject}],
+                "parts": [
+                    {"mimeType": "text/plain", "filename": "", "body": {"data": ""}},
+                    {
+                        "mimeType": "application/ics",
+                        "filename": "invite.ics",
+                        "body": {"attachmentId": attachment_id},
+                    },
+                ],
+            },
+        }
+
+    def raw_message(self, message_id: str) -> str:
+        """The message as Gmail's `format="raw"` would return it, attachments inlined."""
+        lines = [
+            "MIME-Version: 1.0",
+            f'Content-Type: multipart/mixed; boundary="{RAW_BOUNDARY}"',
+            "",
+        ]
+        for part in self.messages[message_id]["payload"]["parts"]:
+            attachment_id = part["body"].get("attachmentId")
+            if attachment_id is None:
+                lines += [f"--{RAW_BOUNDARY}", "Content-Type: text/plain", "", "You're going!"]
+            elif attachment_id in self.attachments:
+                data = base64.encodebytes(self.attachments[attachment_id]).decode("ascii")
+                lines += [
+                    f"--{RAW_BOUNDARY}",
+                    f"Content-Type: {part['mimeType']}",
+                    f'Content-Disposition: attachment; filename="{part["filename"]}"',
+                    "Content-Transfer-Encoding: base64",
+                    "",
+                    data,
+                ]
+        lines.append(f"--{RAW_BOUNDARY}--")
+        return encode_base64url("\r\n".join(lines).encode("ascii"))
+
+    def users(self) -> _Users:
+        return _Users(self)
+
+    def new_batch_http_request(self, callback: Callable[..., None]) -> FakeBatch:
+        return FakeBatch(self.calls, callback, self.network)
+
+
+class _Events:
+    def __init__(self, service: FakeCalendarService) -> None:
+        self._service = service
+
+    def list(
+        self,
+        *,
+        calendarId: str,
+        pageToken: str | None = None,
+        maxResults: int = 250,
+        privateExtendedProperty: str | None = None,
+        iCalUID: str | None = None,
+        syncToken: str | None = None,
+        fields: str | None = None,
+        **_: Any,
+    ) -> FakeRequest:
+        def run() -> dict[str, Any]:
+            self._service.calls["events.list"] += 1
+            items = list(self._service.items.values())
+            if syncToken is not None:
+                if int(syncToken) < self._service.oldest_sync_token:
+                    raise http_error(410)
+                items = [
+                    {"id": item["id"], "status": "cancelled"}
+                    if item.get("status") == "cancelled"
+                    else item
+                    for item in items
+                    if self._service.versions.get(item["id"], 0) > int(syncToken)
+                ]
+            if privateExtendedProperty:
+                key, value = privateExtendedProperty.split("=", 1)
+                items = [
+                    item
+                    for item in items
+                    if item.get("extendedProperties", {}).get("private", {}).get(key) == value
+                ]
+            if iCalUID:
+                items = [item for item in items if item.get("iCalUID") == iCalUID]
+            start = int(pageToken or 0)
+            response: dict[str, Any] = {"items": items[start : start + maxResults]}
+            if start + maxResults < len(items):
+                response["nextPageToken"] = str(start + maxResults)
+            else:
+                response["nextSyncToken"] = str(self._service.version)
+            return response
+
+        return FakeRequest(run, fields, self._service.network)
+
+    def import_(
+        self, *, calendarId: str, body: dict[str, Any], fields: str | None = None, **_: Any
+    ) -> FakeRequest:
+        def run() -> dict[str, Any]:
+            self._service.calls["events.import"] += 1
+            event_id = f"evt-{len(self._service.items) + 1}"
+            self._service.items[event_id] = {"id": event_id, "status": "confirmed", **body}
+            self._service.touch(event_id)
+            return self._service.items[event_id]
+
+        return FakeRequest(run, fields, self._service.network)
+
+    def patch(
+        self,
+        *,
+        calendarId: str,
+        eventId: str,
+        body: dict[str, Any],
+        fields: str | None = None,
+        **_: Any,
+    ) -> FakeRequest:
+        def run() -> dict[str, Any]:
+            self._service.calls["events.patch"] += 1
+            self._service.items[eventId].update(body)
+            self._service.touch(eventId)
+            return self._service.items[eventId]
+
+        return FakeRequest(run, fields, self._service.network)
+
+    def delete(
+        self, *, calendarId: str, eventId: str, fields: str | None = None, **_: Any
+    ) -> FakeRequest:
+        def run() -> str:
+            self._service.calls["events.delete"] += 1
+            self._service.items[eventId]["status"] = "cancelled"
+            self._service.touch(eventId)
+            return ""
+
+        return FakeRequest(run, fields, self._service.network)
+
+
+class _CalendarList:
+    def __init__(self, service: FakeCalendarService) -> None:
+        self._service = service
+
+    def list(self, *, fields: str | None = None, **_: Any) -> FakeRequest:
+        def run() -> dict[str, Any]:
+            self._service.calls["calendarList.list"] += 1
+            return {"items": [{"id": "cal", "summary": self._service.summary}]}
+
+        return FakeRequest(run, fields, self._service.network)
+
+
+class _Calendars:
+    def __init__(self, service: FakeCalendarService) -> None:
+        self._service = service
+
+    def get(self, *, calendarId: str, fields: str | None = None, **_: Any) -> FakeRequest:
+        def run() -> dict[str, Any]:
+            self._service.calls["calendars.get"] += 1
+            if calendarId not in ("cal", "primary"):
+                raise http_error(404, "notFound")
+            return {"id": "cal", "summary": self._service.summary, "timeZone": "UTC"}
+
+        return FakeRequest(run, fields, self._service.network)
+
+
+class FakeCalendarService:
+    """Single calendar whose events are kept in insertion order."""
+
+    def __init__(self, summary: str = "Meetup", network: FakeNetwork | None = None) -> None:
+        self.summary = summary
+        self.network = network or FakeNetwork()
+        self.items: dict[str, dict[str, Any]] = {}
+        self.calls: Counter[str] = Counter()
+        self.versions: dict[str, int] = {}
+        self.version = 0
+        self.oldest_sync_token = 0
+
+    def touch(self, event_id: str) -> None:
+        self.version += 1
+        self.versions[event_id] = self.version
+
+    def calendarList(self) -> _CalendarList:
+        return _CalendarList(self)
+
+    def calendars(self) -> _Calendars:
+        return _Calendars(self)
+
+    def events(self) -> _Events:
+        return _Events(self)
+
+    def new_batch_http_request(self, callback: Callable[..., None]) -> FakeBatch:
+        return FakeBatch(self.calls, callback, self.network)
+
+
+class _SyntheticInvites(Mapping[str, bytes]):
+    """Attachment bytes rendered on demand, so a 100k mailbox does not hold them all."""
+
+    def __init__(self, count: int, mails_per_event: int) -> None:
+        self._count = count
+        self._mails_per_event = mails_per_event
+
+    def __getitem__(self, attachment_id: str) -> bytes:
+        index = int(attachment_id.rsplit("-", 1)[1])
+        if not 0 <= index < self._count:
+            raise KeyError(attachment_id)
+        return meetup_invite(index // self._mails_per_event, year=2099)
+
+    def __iter__(self) -> Iterator[str]:
+        return (f"att-m-{index}" for index in range(self._count))
+
+    def __len__(self) -> int:
+        return self._count
+
+
+def synthetic_mailbox(
+    count: int,
+    *,
+    mails_per_event: int = 3,
+    network: FakeNetwork | None = None,
+    newest_ms: int = 1770000000000,
+    spacing_ms: int = 3_600_000,
+) -> FakeGmailService:
+    """`count` Meetup mails, `mails_per_event` per event (invite, update, reminder), one per hour.
+
+    Each event's mails share one Gmail thread. Events are dated in 2099, so none of them falls out
+    of the lookback window.
+    """
+    gmail = FakeGmailService(network)
+    for index in range(count):
+        gmail.add_message(
+            f"m-{index}",
+            None,
+            internal_ms=newest_ms - (count - 1 - index) * spacing_ms,
+            thread_id=f"thread-{index // mails_per_event}",
+            subject=f"Python Night #{index // mails_per_event}",
+        )
+    gmail.attachments = _SyntheticInvites(count, mails_per_event)
+    return gmail
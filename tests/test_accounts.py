@@ -0,0 +1,42 @@
+from fakes import FakeCalendarService, FakeGmailService, make_ics
+
+from meetup_gmail_calendar_sync.accounts import load_accounts, run_accounts
+
+
+def test_run_accounts_isolates_failures_and_reports_stats_per_account(tmp_path):
+    config = tmp_path / "accounts.yaml"
+    config.write_text(
+        "defaults:\n"
+        "  credentials: credentials.json\n"
+        "  state_db: null\n"
+        "accounts:\n"
+        "  - {name: alice, token: alice.json}\n"
+        "  - {name: broken, token: broken.json}\n"
+        "  - {name: carol, token: carol.json, state_db: carol.sqlite3, incremental: true}\n",
+        encoding="utf-8",
+    )
+    accounts = load_accounts(config)
+    assert [account.name for account in accounts] == ["alice", "broken", "carol"]
+    assert accounts[0].credentials_path == tmp_path / "credentials.json"
+    assert (accounts[0].state_path, accounts[2].state_path) == (None, tmp_path / "carol.sqlite3")
+
+    mailboxes = {"alice": FakeGmailService(), "carol": FakeGmailService()}
+    for index in range(120):
+        mailboxes["alice"].add_message(f"a{index}", make_ics(f"alice-{index}"))
+    mailboxes["carol"].add_message("c0", make_ics("carol-0"))
+    calendars = {name: FakeCalendarService() for name in mailboxes}
+
+    def build_services(account):
+        if account.name == "broken":
+            raise RuntimeError("Token file not found")
+        return mailboxes[account.name], calendars[account.name]
+
+    results = run_accounts(
+        accounts, dry_run=False, verbose=False, workers=2, build_services=build_services
+    )
+
+    alice, broken, carol = results
+    assert (alice.calendar_id, alice.stats.created) == ("cal", 120)
+    assert (broken.stats, broken.error) == (None, "Token file not found")
+    assert (carol.stats.created, carol.stats.failed) == (1, 0)
+    assert len(calendars["alice"].items) == 120
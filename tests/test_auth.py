@@ -1,6 +1,100 @@
-from meetup_gmail_calendar_sync.auth import _scope_satisfied
-from meetup_gmail_calendar_sync.config import GMAIL_MODIFY_SCOPE, GMAIL_READ_SCOPE
+import json
+import os
+import stat
+from datetime import datetime, timedelta, timezone
+
+from google.oauth2.credentials import Credentials
+
+from meetup_gmail_calendar_sync.auth import CredentialManager, _scope_satisfied, build_credentials
+from meetup_gmail_calendar_sync.config import GMAIL_MODIFY_SCOPE, GMAIL_READ_SCOPE, REQUIRED_SCOPES
 
 
 def test_gmail_modify_satisfies_read_scope():
     assert _scope_satisfied(GMAIL_READ_SCOPE, [GMAIL_MODIFY_SCOPE])
+
+
+def _write_client_files(tmp_path, expiry):
+    credentials_path = tmp_path / "credentials.json"
+    credentials_path.write_text(
+        json.dumps({"installed": {"client_id": "id", "client_secret": "secret"}})
+    )
+    token_path = tmp_path / "token.json"
+    token_path.write_text(
+        json.dumps(
+            {
+                "token": "stale",
+                "refresh_token": "refresh",
+                "scopes": REQUIRED_SCOPES,
+                "expiry": expiry.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            }
+        )
+    )
+    return credentials_path, token_path
+
+
+def test_refreshed_tokens_are_written_back_and_reused(tmp_path, monkeypatch):
+    refreshes = []
+
+    def fake_refresh(self, request):
+        refreshes.append(self.refresh_token)
+        self.token = f"fresh-{len(refreshes)}"
+        self.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+
+    monkeypatch.setattr(Credentials, "refresh", fake_refresh)
+    credentials_path, token_path = _write_client_files(
+        tmp_path, datetime.now(timezone.utc) - timedelta(minutes=5)
+    )
+
+    creds = build_credentials(credentials_path, token_path, required_scopes=REQUIRED_SCOPES)
+    assert creds.token == "fresh-1"
+    assert json.loads(token_path.read_text())["token"] == "fresh-1"
+    if os.name == "posix":
+        assert stat.S_IMODE(token_path.stat().st_mode) == 0o600
+
+    # The next run starts from the persisted token without refreshing again.
+    creds = build_credentials(credentials_path, token_path, required_scopes=REQUIRED_SCOPES)
+    assert creds.token == "fresh-1"
+    assert len(refreshes) == 1
+
+    # Long-running modes refresh once the token is within their margin of expiring.
+    manager = CredentialManager(
+        credentials_path,
+        token_path,
+        required_scopes=REQUIRED_SCOPES,
+        refresh_margin=timedelta(hours=2),
+    )
+    assert manager.ensure_fresh().token == "fresh-2"
+    assert json.loads(token_path.read_text())["token"] == "fresh-2"
+
+
+def test_transport_refresh_does_not_overwrite_a_newer_stored_token(tmp_path):
+    now = datetime.now(timezone.utc)
+    credentials_path, token_path = _write_client_files(tmp_path, now + timedelta(minutes=30))
+    manager = CredentialManager(credentials_path, token_path, required_scopes=REQUIRED_SCOPES)
+
+    # Another sync stored a token that outlives the one this transport refreshed to.
+    stored = json.loads(token_path.read_text())
+    stored.update(token="newer", expiry=(now + timedelta(hours=2)).strftime("%Y-%m-%dT%H:%M:%SZ"))
+    token_path.write_text(json.dumps(stored))
+    manager.credentials.token = "transport"
+    manager.credentials.expiry = (now + timedelta(hours=1)).replace(tzinfo=None)
+
+    assert manager.ensure_fresh().token == "transport"
+    assert json.loads(token_path.read_text())["token"] == "newer"
+
+    manager.credentials.token = "transport-2"
+    manager.credentials.expiry = (now + timedelta(hours=3)).replace(tzinfo=None)
+    manager.ensure_fresh()
+    assert json.loads(token_path.read_text())["token"] == "transport-2"
+
+
+def test_legacy_yaml_token_file_is_rewritten_as_json(tmp_path):
+    credentials_path, token_path = _write_client_files(
+        tmp_path, datetime.now(timezone.utc) + timedelta(hours=1)
+    )
+    token_path.write_text(f"default: '{token_path.read_text()}'\n")
+
+    manager = CredentialManager(credentials_path, token_path, required_scopes=REQUIRED_SCOPES)
+
+    assert manager.credentials.token == "stale"
+    assert json.loads(token_path.read_text())["refresh_token"] == "refresh"
@@ -0,0 +1,64 @@
+from fakes import FakeCalendarService, synced_event
+
+from meetup_gmail_calendar_sync.calendar_client import (
+    find_existing_event_by_uid,
+    list_synced_events,
+    refresh_calendar_mirror,
+    resolve_calendar,
+)
+from meetup_gmail_calendar_sync.store import StateStore
+
+
+def test_list_synced_events_indexes_by_uid():
+    calendar = FakeCalendarService()
+    for index in range(3):
+        calendar.items[f"e{index}"] = synced_event(f"e{index}", f"uid-{index}")
+    calendar.items["old"] = synced_event("old", "uid-0", status="cancelled")
+    calendar.items["manual"] = {"id": "manual", "iCalUID": "other", "status": "confirmed"}
+
+    by_uid = list_synced_events(calendar, "cal")
+
+    assert sorted(by_uid) == ["uid-0", "uid-1", "uid-2"]
+    assert by_uid["uid-0"]["id"] == "e0"
+    assert calendar.calls == {"events.list": 1}
+
+
+def test_calendar_mirror_applies_sync_token_deltas_and_resyncs_on_gone(tmp_path):
+    calendar = FakeCalendarService()
+    calendar.items["e0"] = synced_event("e0", "uid-0")
+    calendar.items["manual"] = {"id": "manual", "iCalUID": "other", "status": "confirmed"}
+
+    with StateStore(tmp_path / "state.sqlite3") as store:
+        assert sorted(refresh_calendar_mirror(calendar, "cal", store)) == ["uid-0"]
+
+        calendar.items["e1"] = synced_event("e1", "uid-1")
+        calendar.touch("e1")
+        calendar.events().delete(calendarId="cal", eventId="e0").execute()
+        mirror = refresh_calendar_mirror(calendar, "cal", store)
+        assert mirror["uid-0"]["status"] == "cancelled"
+        assert mirror["uid-1"]["id"] == "e1"
+        assert find_existing_event_by_uid(calendar, "cal", "uid-1", store=store)["id"] == "e1"
+
+        calendar.oldest_sync_token = calendar.version + 1
+        calendar.calls.clear()
+        assert sorted(refresh_calendar_mirror(calendar, "cal", store)) == ["uid-0", "uid-1"]
+        assert calendar.calls == {"events.list": 2}
+
+
+def test_resolve_calendar_caches_the_id_and_revalidates_it(tmp_path):
+    calendar = FakeCalendarService()
+
+    with StateStore(tmp_path / "state.sqlite3") as store:
+        assert resolve_calendar(calendar, "Meetup", store) == "cal"
+        assert calendar.calls == {"calendarList.list": 1}
+
+        calendar.calls.clear()
+        assert resolve_calendar(calendar, "Meetup", store) == "cal"
+        assert calendar.calls == {"calendars.get": 1}
+
+        # Renamed out from under us: the cached id no longer answers to the name.
+        calendar.calls.clear()
+        store.set_value("calendar_id:Meetup", "gone")
+        assert resolve_calendar(calendar, "Meetup", store) == "cal"
+        assert calendar.calls == {"calendars.get": 1, "calendarList.list": 1}
+        assert store.get_value("calendar_id:Meetup") == "cal"
@@ -0,0 +1,49 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ("googleapiclient", "google.auth", "google_auth_oauthlib", "icalendar", "yaml")
+
+
+def test_cli_import_does_not_load_client_libraries():
+    script = "import sys\nimport meetup_gmail_calendar_sync.cli\nprint('\\n'.join(sys.modules))\n"
+    modules = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    ).stdout.split()
+
+    loaded = [
+        module
+        for module in modules
+        if any(module == heavy or module.startswith(f"{heavy}.") for heavy in HEAVY_MODULES)
+    ]
+    assert loaded == []
+
+
+def test_stats_json_to_stdout_keeps_other_output_on_stderr(monkeypatch, capsys):
+    from meetup_gmail_calendar_sync import cli
+    from meetup_gmail_calendar_sync.sync import SyncStats
+
+    def run_sync(**kwargs):
+        print("warning: something to note")
+        return "cal", SyncStats(created=2)
+
+    monkeypatch.setattr("meetup_gmail_calendar_sync.sync.run_sync", run_sync)
+
+    assert cli.main(["sync", "--no-state-db", "--stats-json", "-"]) == 0
+
+    out, err = capsys.readouterr()
+    assert json.loads(out)["created"] == 2
+    assert "warning: something to note" in err
+    assert "sync complete" in err
+
+
+def test_parse_workers_below_one_is_rejected(capsys):
+    from meetup_gmail_calendar_sync import cli
+
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(["sync", "--parse-workers", "0"])
+
+    assert exit_info.value.code == 2
+    assert "--parse-workers must be at least 1" in capsys.readouterr().err
@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+
+import pytest
+from fakes import FakeCalendarService, FakeGmailService, FakeRequest, make_ics, synced_event
+
+from meetup_gmail_calendar_sync.fields import GMAIL_MESSAGE_FIELDS
+from meetup_gmail_calendar_sync.ics_parser import parse_ics_bytes
+from meetup_gmail_calendar_sync.store import StateStore
+from meetup_gmail_calendar_sync.sync import SyncStats, collect_events, reconcile_events
+
+
+def test_message_mask_keeps_calendar_parts_and_drops_the_rest():
+    gmail = FakeGmailService()
+    gmail.add_message("m1", make_ics("uid-1"))
+
+    message = (
+        gmail.users().messages().get(userId="me", id="m1", fields=GMAIL_MESSAGE_FIELDS).execute()
+    )
+
+    assert message["payload"]["parts"][1]["body"]["attachmentId"] == "att-m1"
+    with pytest.raises(AssertionError, match="threadId"):
+        message.get("threadId")
+
+
+def test_every_call_in_a_sync_requests_a_field_mask(tmp_path, monkeypatch):
+    unmasked: list[str] = []
+    original_init = FakeRequest.__init__
+
+    def recording_init(self, fn, fields=None, network=None):
+        if fields is None:
+            unmasked.append(fn.__qualname__)
+        original_init(self, fn, fields, network)
+
+    monkeypatch.setattr(FakeRequest, "__init__", recording_init)
+
+    gmail = FakeGmailService()
+    gmail.add_message("m1", make_ics("uid-1"))
+    calendar = FakeCalendarService()
+    calendar.items["e2"] = synced_event("e2", "uid-2")
+    calendar.items["e3"] = synced_event("e3", "uid-3")
+    message_ts = datetime(2026, 2, 11, tzinfo=timezone.utc)
+    changes = [
+        *parse_ics_bytes(make_ics("uid-2", summary="Renamed"), message_ts),
+        *parse_ics_bytes(make_ics("uid-3", status="CANCELLED"), message_ts),
+    ]
+
+    with StateStore(tmp_path / "state.sqlite3") as store:
+        for _ in range(2):
+            events = collect_events(
+                gmail, query="q", max_messages=10, verbose=False, store=store, incremental=True
+            )
+            stats = SyncStats()
+            reconcile_events(
+                calendar, "cal", events + changes, stats=stats, verbose=False, store=store
+            )
+            assert stats.failed == 0
+
+    # Deletes have no response body to trim.
+    assert unmasked == ["_Events.delete.<locals>.run"]
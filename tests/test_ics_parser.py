@@ -1,6 +1,17 @@
 from datetime import datetime, timezone
 
-from meetup_gmail_calendar_sync.ics_parser import dedupe_latest, parse_ics_bytes
+from fakes import meetup_invite
+
+from meetup_gmail_calendar_sync.ics_parser import (
+    _decode_ics_with_icalendar,
+    _fast_decode_ics,
+    decode_ics,
+    dedupe_latest,
+    dump_records,
+    events_from_records,
+    load_records,
+    parse_ics_bytes,
+)
 
 
 def test_parse_and_dedupe_latest_sequence():
@@ -48,3 +59,46 @@ def test_parse_and_dedupe_latest_sequence():
     assert len(deduped) == 1
     assert deduped["abc-123"].sequence == 2
     assert deduped["abc-123"].summary == "Meetup One Updated"
+
+
+def test_dumped_records_round_trip_without_binding_message_time():
+    ics = b"\r\n".join(
+        [
+            b"BEGIN:VCALENDAR",
+            b"VERSION:2.0",
+            b"BEGIN:VEVENT",
+            b"UID:tz-1",
+            b"DTSTART;TZID=America/New_York:20260220T170000",
+            b"DTEND;TZID=America/New_York:20260220T190000",
+            b"SUMMARY:Evening meetup",
+            b"END:VEVENT",
+            b"BEGIN:VEVENT",
+            b"UID:allday-1",
+            b"DTSTAMP:20260210T120000Z",
+            b"DTSTART;VALUE=DATE:20260221",
+            b"END:VEVENT",
+            b"END:VCALENDAR",
+            b"",
+        ]
+    )
+    records = decode_ics(ics)
+    later_ts = datetime(2026, 2, 12, 8, 0, tzinfo=timezone.utc)
+
+    restored = events_from_records(load_records(dump_records(records)), later_ts)
+
+    assert restored == parse_ics_bytes(ics, later_ts)
+    assert restored[0].dtstamp == later_ts
+
+
+def test_fast_parser_matches_icalendar_on_meetup_invites():
+    corpus = [meetup_invite(index) for index in range(60)]
+
+    for ics in corpus:
+        fast = _fast_decode_ics(ics)
+        full = _decode_ics_with_icalendar(ics)
+        if b"RRULE:FREQ=WEEKLY" in ics:
+            assert fast is None
+            assert decode_ics(ics) == full
+            continue
+        assert fast is not None
+        assert dump_records(fast) == dump_records(full)
@@ -0,0 +1,67 @@
+from fakes import FakeCalendarService, FakeGmailService, FakeRequest, http_error, make_ics
+
+from meetup_gmail_calendar_sync import metrics
+from meetup_gmail_calendar_sync.batch import execute_batched
+from meetup_gmail_calendar_sync.sync import SyncStats, collect_events, reconcile_events
+from meetup_gmail_calendar_sync.throttle import execute
+
+
+def test_sync_records_stages_calls_retries_and_decoded_bytes(monkeypatch):
+    monkeypatch.setattr("meetup_gmail_calendar_sync.throttle.backoff_delay", lambda attempt: 0)
+    gmail = FakeGmailService()
+    payloads = [make_ics(f"uid-{index}") for index in range(3)]
+    for index, ics in enumerate(payloads):
+        gmail.add_message(f"m{index}", ics)
+    answers = [http_error(429), {"ok": True}]
+
+    def flaky():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    request = FakeRequest(flaky)
+    request.methodId = "gmail.users.getProfile"
+
+    started = metrics.snapshot()
+    execute(request)
+    events = collect_events(gmail, query="q", max_messages=10, verbose=False)
+    reconcile_events(FakeCalendarService(), "cal", events, stats=SyncStats(), verbose=False)
+    run = metrics.snapshot().since(started)
+
+    assert set(run.stage_seconds) == {
+        "list",
+        "messages",
+        "attachments",
+        "parse",
+        "calendar_list",
+        "calendar_write",
+    }
+    assert run.api_calls["gmail.users.getProfile"] == 2
+    assert (run.retries, run.throttled) == (
+        {"gmail.users.getProfile": 1},
+        {"gmail.users.getProfile": 1},
+    )
+    # Fakes carry no method id; one list, three gets, three attachments, one listing, three
+    # imports.
+    assert run.api_calls[metrics.UNKNOWN_METHOD] == 11
+    assert run.bytes_decoded == sum(len(ics) for ics in payloads)
+
+    text = metrics.render_prometheus(run, SyncStats(created=3).outcomes(), labels={"account": "a"})
+    assert 'meetup_gcal_sync_api_calls{account="a",method="gmail.users.getProfile"} 2' in text
+    assert 'meetup_gcal_sync_events{account="a",outcome="created"} 3' in text
+    assert "# TYPE meetup_gcal_sync_stage_seconds gauge" in text
+
+
+def test_batched_failure_on_the_last_attempt_is_not_counted_as_a_retry():
+    gmail = FakeGmailService()
+    gmail.add_message("m0", make_ics("uid-0"))
+    gmail.transient_failures.add("m0")
+    requests = {"m0": lambda: gmail.users().messages().get(userId="me", id="m0")}
+
+    started = metrics.snapshot()
+    results, errors = execute_batched(gmail, requests, max_attempts=1)
+    run = metrics.snapshot().since(started)
+
+    assert (results, list(errors)) == ({}, ["m0"])
+    assert sum(run.retries.values()) == 0
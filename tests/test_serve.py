@@ -0,0 +1,48 @@
+import threading
+
+from meetup_gmail_calendar_sync.serve import PollSchedule, serve_loop
+from meetup_gmail_calendar_sync.sync import SyncStats
+
+
+class RecordingStop(threading.Event):
+    """Stops after a fixed number of waits and records the requested intervals."""
+
+    def __init__(self, cycles: int) -> None:
+        super().__init__()
+        self.cycles = cycles
+        self.waits: list[float] = []
+
+    def wait(self, timeout: float | None = None) -> bool:
+        self.waits.append(timeout)
+        if len(self.waits) >= self.cycles:
+            self.set()
+        return self.is_set()
+
+
+def test_poll_interval_follows_the_invite_arrival_rate(capsys):
+    # Backfill, then a burst of invites, then quiet cycles, one of which fails.
+    arrivals = iter([500, 6, 6, 0, RuntimeError("token revoked"), 0])
+    now = [0.0]
+
+    def run_cycle():
+        count = next(arrivals)
+        if isinstance(count, Exception):
+            raise count
+        return SyncStats(created=count), count
+
+    def clock():
+        now[0] += 600
+        return now[0]
+
+    stop = RecordingStop(cycles=6)
+    cycles = serve_loop(run_cycle, PollSchedule(60, 3600), stop, clock=clock)
+
+    assert cycles == 6
+    # The backfill is ignored, the burst shortens the interval, quiet cycles stretch it again.
+    assert stop.waits[0] == 3600
+    assert stop.waits[1] < stop.waits[0]
+    assert stop.waits[2] < stop.waits[1]
+    assert stop.waits[3] < stop.waits[4] < stop.waits[5]
+    out = capsys.readouterr().out
+    assert "cycle complete new_messages=6" in out
+    assert "warning: sync cycle failed: token revoked" in out
@@ -0,0 +1,39 @@
+import sqlite3
+
+from meetup_gmail_calendar_sync.store import StateStore
+
+
+def test_parse_cache_evicts_least_recently_used_entries(tmp_path):
+    with StateStore(tmp_path / "state.sqlite3", parse_cache_max_bytes=20) as store:
+        store.put_parsed_ics("a", "x" * 8)
+        store.put_parsed_ics("b", "y" * 8)
+        assert store.get_parsed_ics("a") == "x" * 8
+
+        store.put_parsed_ics("c", "z" * 8)
+
+        assert store.get_parsed_ics("b") is None
+        assert store.get_parsed_ics("a") == "x" * 8
+        assert store.get_parsed_ics("c") == "z" * 8
+
+
+def test_parse_cache_hits_are_written_back_in_one_transaction(tmp_path):
+    path = tmp_path / "state.sqlite3"
+    with StateStore(path) as store:
+        store.put_parsed_ics("a", "x")
+        store.put_parsed_ics("b", "y")
+        statements: list[str] = []
+        store._conn.set_trace_callback(statements.append)
+
+        for _ in range(3):
+            assert store.get_parsed_ics("a") == "x"
+        assert not any(statement.startswith("UPDATE") for statement in statements)
+
+        store.flush_parse_cache_usage()
+        assert sum(statement.startswith("COMMIT") for statement in statements) == 1
+
+    with sqlite3.connect(path) as conn:
+        order = [
+            digest for (digest,) in conn.execute("SELECT digest FROM parsed_ics ORDER BY last_used")
+        ]
+    conn.close()
+    assert order == ["b", "a"]
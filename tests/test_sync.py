@@ -0,0 +1,509 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fakes import (
+    FakeCalendarService,
+    FakeGmailService,
+    FakeNetwork,
+    make_ics,
+    synced_event,
+    synthetic_mailbox,
+)
+
+from meetup_gmail_calendar_sync import throttle
+from meetup_gmail_calendar_sync.config import INVITE_LEAD_DAYS_DEFAULT
+from meetup_gmail_calendar_sync.gmail_client import iter_message_ids
+from meetup_gmail_calendar_sync.ics_parser import parse_ics_bytes
+from meetup_gmail_calendar_sync.pipeline import run_pipeline
+from meetup_gmail_calendar_sync.store import StateStore
+from meetup_gmail_calendar_sync.sync import (
+    SyncStats,
+    collect_events,
+    oldest_useful_message,
+    reconcile_events,
+    run_steps,
+    select_eligible,
+    sync_steps,
+)
+
+
+def test_collect_events_skips_messages_already_in_store(tmp_path):
+    gmail = FakeGmailService()
+    gmail.add_message("m1", make_ics("uid-1"))
+    gmail.add_message("m2", make_ics("uid-2"))
+
+    with StateStore(tmp_path / "state.sqlite3") as store:
+        first = collect_events(gmail, query="q", max_messages=10, verbose=False, store=store)
+        gmail.calls.clear()
+        second = collect_events(gmail, query="q", max_messages=10, verbose=False, store=store)
+
+    assert sorted(event.uid for event in first) == ["uid-1", "uid-2"]
+    assert second == first
+    assert gmail.calls == {"messages.list": 1}
+
+
+def test_collect_events_batches_fetches_and_retries_only_failed_items(tmp_path, monkeypatch):
+    monkeypatch.setattr("meetup_gmail_calendar_sync.batch.backoff_delay", lambda attempt: 0)
+    gmail = FakeGmailService()
+    for index in range(3):
+        gmail.add_message(f"m{index}", make_ics(f"uid-{index}"))
+    gmail.transient_failures.add("m1")
+
+    events = collect_events(gmail, query="q", max_messages=10, verbose=False)
+
+    assert sorted(event.uid for event in events) == ["uid-0", "uid-1", "uid-2"]
+    assert gmail.calls["messages.get"] == 4
+    # One batch of gets, one retry batch for the failed message, one batch of attachments.
+    assert gmail.calls["batch"] == 3
+
+
+def test_incremental_collect_only_lists_mail_added_since_checkpoint(tmp_path):
+    gmail = FakeGmailService()
+    gmail.add_message("m1", make_ics("uid-1"))
+
+    with StateStore(tmp_path / "state.sqlite3") as store:
+        collect_events(
+            gmail, query="q", max_messages=10, verbose=False, store=store, incremental=True
+        )
+
+        gmail.calls.clear()
+        idle = collect_events(
+            gmail, query="q", max_messages=10, verbose=False, store=store, incremental=True
+        )
+        assert [event.uid for event in idle] == ["uid-1"]
+        assert gmail.calls == {"history.list": 1}
+
+        gmail.add_message("m2", make_ics("uid-2"))
+        gmail.calls.clear()
+        updated = collect_events(
+            gmail, query="q", max_messages=10, verbose=False, store=store, incremental=True
+        )
+        assert sorted(event.uid for event in updated) == ["uid-1", "uid-2"]
+        assert gmail.calls == {
+            "history.list": 1,
+            "messages.list": 1,
+            "messages.get": 1,
+            "attachments.get": 1,
+            "batch": 2,
+        }
+
+        gmail.oldest_history_id = gmail.history_id + 1
+        gmail.calls.clear()
+        collect_events(
+            gmail, query="q", max_messages=10, verbose=False, store=store, incremental=True
+        )
+        assert gmail.calls == {"history.list": 1, "getProfile": 1, "messages.list": 1}
+
+
+def test_incremental_replay_only_includes_mail_listed_by_the_same_query(tmp_path):
+    gmail = FakeGmailService()
+    gmail.add_message("m1", make_ics("uid-1"))
+    gmail.add_message("m2", make_ics("uid-2"))
+    gmail.label_ids["done"] = "Label_done"
+    gmail.messages["m1"]["labelIds"].append("Label_done")
+
+    with StateStore(tmp_path / "state.sqlite3") as store:
+
+        def collect(query):
+            events = collect_events(
+                gmail, query=query, max_messages=10, verbose=False, store=store, incremental=True
+            )
+            return sorted(event.uid for event in events)
+
+        assert collect("q") == ["uid-1", "uid-2"]
+        assert collect("q -label:done") == ["uid-2"]
+        # Replayed from the state db: m1 was stored, but only the other query listed it.
+        assert collect("q -label:done") == ["uid-2"]
+        assert collect("q") == ["uid-1", "uid-2"]
+
+
+def test_reconcile_events_sends_writes_as_one_batch():
+    calendar = FakeCalendarService()
+    calendar.items["e1"] = synced_event("e1", "uid-1")
+    calendar.items["e2"] = synced_event("e2", "uid-2")
+    message_ts = datetime(2026, 2, 11, tzinfo=timezone.utc)
+    eligible = [
+        *parse_ics_bytes(make_ics("uid-0"), message_ts),
+        *parse_ics_bytes(make_ics("uid-1", summary="Renamed"), message_ts),
+        *parse_ics_bytes(make_ics("uid-2", status="CANCELLED"), message_ts),
+    ]
+    stats = SyncStats()
+
+    reconcile_events(calendar, "cal", eligible, stats=stats, verbose=False)
+
+    assert (stats.created, stats.updated, stats.deleted, stats.failed) == (1, 1, 1, 0)
+    assert calendar.calls["batch"] == 1
+    assert calendar.items["e1"]["summary"] == "Renamed"
+    assert calendar.items["e2"]["status"] == "cancelled"
+
+
+def test_reconcile_events_skips_events_that_are_already_up_to_date():
+    calendar = FakeCalendarService()
+    message_ts = datetime(2026, 2, 11, tzinfo=timezone.utc)
+    eligible = parse_ics_bytes(make_ics("uid-0", sequence=2), message_ts)
+    reconcile_events(calendar, "cal", eligible, stats=SyncStats(), verbose=False)
+
+    calendar.calls.clear()
+    stale = parse_ics_bytes(make_ics("uid-0", sequence=1, summary="Old title"), message_ts)
+    stats = SyncStats()
+    reconcile_events(calendar, "cal", eligible + stale, stats=stats, verbose=False)
+
+    assert stats.unchanged == 2
+    assert calendar.calls == {"events.list": 1}
+
+
+def test_collect_events_parses_on_a_process_pool(capsys):
+    gmail = FakeGmailService()
+    gmail.add_message("m0", make_ics("uid-0"))
+    gmail.add_message("m1", make_ics("uid-1"))
+    gmail.add_message("broken", b"BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nUID:x\r\nEND:VEVENT\r\n")
+
+    inline = collect_events(gmail, query="q", max_messages=10, verbose=False)
+    pooled = collect_events(gmail, query="q", max_messages=10, verbose=False, parse_workers=2)
+
+    by_uid = {event.uid: event for event in inline}
+    assert {event.uid: event for event in pooled} == by_uid
+    assert capsys.readouterr().out.count("failed to parse ICS for message broken") == 2
+
+
+def test_raw_fetch_format_finds_the_same_invites_without_attachment_calls():
+    gmail = FakeGmailService()
+    for index in range(3):
+        gmail.add_message(f"m{index}", make_ics(f"uid-{index}"))
+
+    full = collect_events(gmail, query="q", max_messages=10, verbose=False)
+    gmail.calls.clear()
+    raw = collect_events(gmail, query="q", max_messages=10, verbose=False, fetch_format="raw")
+
+    assert raw == full
+    assert gmail.calls == {"messages.list": 1, "messages.get": 3, "batch": 1}
+
+
+def test_collapse_threads_downloads_the_newest_invite_of_each_thread(tmp_path):
+    gmail = FakeGmailService()
+    for sequence in range(3):
+        gmail.add_message(f"a{sequence}", make_ics("uid-a", sequence=sequence), thread_id="ta")
+    gmail.add_message("b0", make_ics("uid-b"), thread_id="tb")
+    gmail.add_message("b1", None, thread_id="tb")
+    gmail.messages["b1"]["payload"]["parts"].pop()  # a reply without the invite
+
+    events = collect_events(gmail, query="q", max_messages=10, verbose=False, collapse_threads=True)
+
+    assert sorted((event.uid, event.sequence) for event in events) == [("uid-a", 2), ("uid-b", 0)]
+    # a2 and b1 head their threads; b0 is fetched because b1 carries no invite.
+    assert gmail.calls["messages.get"] == 3
+    assert gmail.calls["attachments.get"] == 2
+
+    with StateStore(tmp_path / "state.sqlite3") as store:
+        pipelined = run_pipeline(
+            lambda: gmail,
+            FakeCalendarService,
+            "cal",
+            query="q",
+            max_messages=10,
+            lookback_days=36500,
+            dry_run=True,
+            verbose=False,
+            store=store,
+            collapse_threads=True,
+        )
+    assert (pipelined.parsed, pipelined.deduped) == (2, 2)
+
+
+@pytest.mark.parametrize("engine", ["steps", "pipeline"])
+def test_collapse_threads_fetches_held_mail_for_other_events(engine):
+    gmail = FakeGmailService()
+    # A recurring Meetup: Gmail threads each week's invite with the next one.
+    gmail.add_message("week1", make_ics("uid-week1"), thread_id="t", subject="Run on Mar 3")
+    gmail.add_message("week2", make_ics("uid-week2"), thread_id="t", subject="Run on Mar 10")
+    gmail.add_message(
+        "week2-update",
+        make_ics("uid-week2", sequence=1),
+        thread_id="t",
+        subject="Re: Run on Mar 10",
+    )
+    calendar = FakeCalendarService()
+
+    options = dict(
+        query="q",
+        max_messages=10,
+        lookback_days=36500,
+        dry_run=False,
+        verbose=False,
+        collapse_threads=True,
+    )
+    if engine == "pipeline":
+        stats = run_pipeline(lambda: gmail, lambda: calendar, "cal", **options)
+    else:
+        stats = run_steps(sync_steps(gmail, calendar, "cal", **options))
+
+    assert stats.created == 2
+    assert sorted(
+        item["extendedProperties"]["private"]["meetup_uid"] for item in calendar.items.values()
+    ) == ["uid-week1", "uid-week2"]
+    # One subject lookup; the update's older revision stays held back.
+    assert gmail.calls["threads.get"] == 1
+    assert gmail.calls["messages.get"] == 2
+
+
+def test_pipeline_engine_matches_phased_sync(tmp_path):
+    gmail = FakeGmailService()
+    for index in range(120):
+        gmail.add_message(f"m{index}", make_ics(f"uid-{index % 40}", sequence=index // 40))
+    gmail.add_message("cancel", make_ics("uid-0", sequence=9, status="CANCELLED"))
+
+    phased_calendar = FakeCalendarService()
+    events = collect_events(gmail, query="q", max_messages=500, verbose=False)
+    _, eligible = select_eligible(events, lookback_days=36500)
+    phased = SyncStats(parsed=len(events), processed=len(eligible))
+    reconcile_events(phased_calendar, "cal", eligible, stats=phased, verbose=False)
+
+    pipeline_calendar = FakeCalendarService()
+    with StateStore(tmp_path / "state.sqlite3") as store:
+        pipelined = run_pipeline(
+            lambda: gmail,
+            lambda: pipeline_calendar,
+            "cal",
+            query="q",
+            max_messages=500,
+            lookback_days=36500,
+            dry_run=False,
+            verbose=False,
+            store=store,
+        )
+
+    assert (pipelined.parsed, pipelined.deduped, pipelined.processed) == (121, 40, 40)
+    assert (pipelined.created, pipelined.deleted, pipelined.failed) == (39, 0, 0)
+    assert (pipelined.created, pipelined.skipped) == (phased.created, phased.skipped)
+    assert sorted(e["iCalUID"] for e in pipeline_calendar.items.values()) == sorted(
+        e["iCalUID"] for e in phased_calendar.items.values()
+    )
+
+
+def test_stop_early_skips_mail_too_old_to_announce_eligible_events(tmp_path):
+    now = datetime.now(timezone.utc)
+
+    def stamp(days: float) -> str:
+        return (now + timedelta(days=days)).strftime("%Y%m%dT%H%M%SZ")
+
+    def received(days_ago: float) -> int:
+        return int((now - timedelta(days=days_ago)).timestamp() * 1000)
+
+    gmail = FakeGmailService()
+    gmail.add_message(
+        "ancient",
+        make_ics("uid-old", start=stamp(-371), end=stamp(-370)),
+        internal_ms=received(400),
+    )
+    gmail.add_message(
+        "recent", make_ics("uid-new", start=stamp(29), end=stamp(30)), internal_ms=received(1)
+    )
+
+    with StateStore(tmp_path / "state.sqlite3") as store:
+        first_bound = oldest_useful_message(store, lookback_days=2, now=now)
+        assert first_bound == now - timedelta(days=2 + INVITE_LEAD_DAYS_DEFAULT)
+
+        events = collect_events(
+            gmail, query="q", max_messages=10, verbose=False, store=store, not_before=first_bound
+        )
+        assert [event.uid for event in events] == ["uid-new"]
+        assert gmail.calls["messages.get"] == 1
+
+        # The observed 31-day lead replaces the default and tightens the next run's window.
+        second_bound = oldest_useful_message(store, lookback_days=2, now=now)
+        assert now - timedelta(days=48) < second_bound < now - timedelta(days=46)
+
+
+def test_sync_rides_out_injected_failures(monkeypatch):
+    monkeypatch.setattr("meetup_gmail_calendar_sync.batch.backoff_delay", lambda attempt: 0)
+    monkeypatch.setattr("meetup_gmail_calendar_sync.throttle.backoff_delay", lambda attempt: 0)
+    # Only the retries are under test here, not the quota pacing.
+    monkeypatch.setitem(throttle.SCHEDULER_LIMITS, "gmail", (1e9, 1e9))
+
+    def sync(network):
+        gmail = synthetic_mailbox(300, network=network)
+        calendar = FakeCalendarService(network=network)
+        stats = run_steps(
+            sync_steps(
+                gmail,
+                calendar,
+                "cal",
+                query="q",
+                max_messages=300,
+                lookback_days=2,
+                dry_run=False,
+                verbose=False,
+            )
+        )
+        return stats, sorted(item["iCalUID"] for item in calendar.items.values())
+
+    clean_stats, clean_uids = sync(FakeNetwork())
+    flaky = FakeNetwork(failure_rate=0.05, seed=1)
+    flaky_stats, flaky_uids = sync(flaky)
+
+    assert flaky.failures > 0
+    assert (flaky_stats.parsed, flaky_stats.failed) == (300, 0)
+    assert flaky_stats.created == clean_stats.created > 0
+    assert flaky_uids == clean_uids
+
+
+def test_label_synced_marks_written_mail_and_skips_it_next_time():
+    gmail = FakeGmailService()
+    gmail.add_message("m0", make_ics("uid-0"))
+    gmail.add_message("m1", make_ics("uid-1"))
+    gmail.add_message("broken", b"BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nUID:x\r\nEND:VEVENT\r\n")
+    calendar = FakeCalendarService()
+
+    def sync(dry_run=False):
+        return run_steps(
+            sync_steps(
+                gmail,
+                calendar,
+                "cal",
+                query="q",
+                max_messages=10,
+                lookback_days=36500,
+                dry_run=dry_run,
+                verbose=False,
+                synced_label="meetup-synced",
+            )
+        )
+
+    assert sync(dry_run=True).labeled == 0
+    assert "labels.list" not in gmail.calls
+
+    first = sync()
+    label_id = gmail.label_ids["meetup-synced"]
+    assert (first.created, first.labeled) == (2, 2)
+    assert [m for m in gmail.messages if label_id in gmail.messages[m]["labelIds"]] == ["m0", "m1"]
+
+    gmail.calls.clear()
+    second = sync()
+    # Only the unparseable message is still listed, and it stays unlabeled.
+    assert (second.parsed, second.labeled) == (0, 0)
+    assert gmail.calls["messages.get"] == 1
+    assert "messages.batchModify" not in gmail.calls
+
+
+@pytest.mark.parametrize("engine", ["steps", "pipeline"])
+def test_label_synced_leaves_messages_held_back_by_collapse_threads_unlabeled(engine):
+    gmail = FakeGmailService()
+    gmail.add_message("week1", make_ics("uid-week1"), thread_id="t")
+    gmail.add_message("week2", make_ics("uid-week2"), thread_id="t")
+    calendar = FakeCalendarService()
+
+    def sync(collapse_threads):
+        options = dict(
+            query="q",
+            max_messages=10,
+            lookback_days=36500,
+            dry_run=False,
+            verbose=False,
+            collapse_threads=collapse_threads,
+            synced_label="meetup-synced",
+        )
+        if engine == "pipeline":
+            return run_pipeline(lambda: gmail, lambda: calendar, "cal", **options)
+        return run_steps(sync_steps(gmail, calendar, "cal", **options))
+
+    first = sync(collapse_threads=True)
+    label_id = gmail.label_ids["meetup-synced"]
+    assert [m for m in gmail.messages if label_id in gmail.messages[m]["labelIds"]] == ["week2"]
+    assert first.labeled == 1
+
+    # The held message is still listed, so its event is not lost.
+    second = sync(collapse_threads=False)
+    assert (second.parsed, second.labeled) == (1, 1)
+    assert sorted(
+        synced["extendedProperties"]["private"]["meetup_uid"] for synced in calendar.items.values()
+    ) == [
+        "uid-week1",
+        "uid-week2",
+    ]
+
+
+@pytest.mark.parametrize("engine", ["steps", "pipeline"])
+def test_label_synced_with_store_only_labels_newly_listed_mail(tmp_path, engine):
+    gmail = FakeGmailService()
+    gmail.add_message("m0", make_ics("uid-0"))
+    calendar = FakeCalendarService()
+
+    with StateStore(tmp_path / "state.sqlite3") as store:
+
+        def sync():
+            options = dict(
+                query="q",
+                max_messages=10,
+                lookback_days=36500,
+                dry_run=False,
+                verbose=False,
+                store=store,
+                incremental=True,
+                synced_label="meetup-synced",
+            )
+            if engine == "pipeline":
+                return run_pipeline(lambda: gmail, lambda: calendar, "cal", **options)
+            return run_steps(sync_steps(gmail, calendar, "cal", **options))
+
+        assert sync().labeled == 1
+
+        gmail.calls.clear()
+        idle = sync()
+        # Mail replayed from the state db was labeled last time, so nothing is relabeled.
+        assert idle.labeled == 0
+        assert "labels.list" not in gmail.calls
+        assert "messages.batchModify" not in gmail.calls
+
+        gmail.add_message("m1", make_ics("uid-1"))
+        gmail.calls.clear()
+        assert sync().labeled == 1
+        # The label id is cached in the state db rather than looked up again.
+        assert "labels.list" not in gmail.calls
+        assert gmail.calls["messages.batchModify"] == 1
+
+
+def test_sharded_listing_matches_the_sequential_listing():
+    newest = 1770000000
+    gmail = synthetic_mailbox(250, newest_ms=newest * 1000, spacing_ms=86_400_000)
+    query = f"from:meetup after:{newest - 400 * 86_400}"
+
+    sequential = list(iter_message_ids(gmail, query, 1000))
+    gmail.calls.clear()
+    sharded = list(iter_message_ids(gmail, query, 1000, shards=4))
+
+    assert len(sequential) == 250
+    assert sharded == sequential
+    # The mailbox spans several shards, each listed on its own.
+    assert gmail.calls["messages.list"] >= 3
+    assert list(iter_message_ids(gmail, query, 40, shards=4)) == sequential[:40]
+
+
+class _InlineExecutor:
+    """Runs each submitted shard to completion on submit, newest shard first."""
+
+    def __init__(self, **kwargs):
+        pass
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+    def shutdown(self, **kwargs):
+        pass
+
+
+def test_sharded_listing_shares_one_budget_across_shards(monkeypatch):
+    monkeypatch.setattr(
+        "meetup_gmail_calendar_sync.gmail_client.ThreadPoolExecutor", _InlineExecutor
+    )
+    newest = int(datetime.now(timezone.utc).timestamp())
+    gmail = synthetic_mailbox(1000, newest_ms=newest * 1000, spacing_ms=28_800_000)
+    query = f"from:meetup after:{newest - 400 * 86_400}"
+
+    sequential = list(iter_message_ids(gmail, query, 250))
+    assert gmail.calls["messages.list"] == 3
+    gmail.calls.clear()
+    sharded = list(iter_message_ids(gmail, query, 250, shards=4))
+
+    assert sharded == sequential
+    # The newest shard fills the budget, so the older shards never list a page.
+    assert gmail.calls["messages.list"] == 3
@@ -0,0 +1,52 @@
+from fakes import FakeRequest, http_error
+
+from meetup_gmail_calendar_sync.throttle import ApiScheduler, TokenBucket
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_spends_quota_units_and_waits_for_refill():
+    clock = FakeClock()
+    bucket = TokenBucket(250, 500, clock=clock, sleep=clock.sleep)
+
+    for _ in range(100):
+        bucket.acquire(5)
+    assert clock.sleeps == []
+
+    bucket.acquire(50)
+    assert clock.sleeps == [0.2]
+
+
+def test_scheduler_retries_throttled_calls_and_backs_off_concurrency():
+    clock = FakeClock()
+    scheduler = ApiScheduler(250, 500, initial_concurrency=8, clock=clock, sleep=clock.sleep)
+    answers = [http_error(429), http_error(403, "userRateLimitExceeded"), {"ok": True}]
+
+    def run():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    request = FakeRequest(run)
+    request.methodId = "gmail.users.messages.get"
+
+    assert scheduler.execute(request) == {"ok": True}
+    assert (scheduler.retries, scheduler.throttled) == (2, 2)
+    assert len(clock.sleeps) == 2
+    # 8 -> 4 -> 2 after two throttles, then additive growth of about one per window of calls.
+    assert scheduler.concurrency.limit == 2
+    for _ in range(5):
+        scheduler.execute(FakeRequest(lambda: {}))
+    assert scheduler.concurrency.limit == 4
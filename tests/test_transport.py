@@ -0,0 +1,46 @@
+import json
+
+import requests
+from google.oauth2.credentials import Credentials
+from requests.adapters import BaseAdapter
+
+from meetup_gmail_calendar_sync import transport
+from meetup_gmail_calendar_sync.fields import GMAIL_PROFILE_FIELDS
+from meetup_gmail_calendar_sync.throttle import execute, scheduler_for
+
+
+class RecordingAdapter(BaseAdapter):
+    def __init__(self) -> None:
+        super().__init__()
+        self.sent: list[requests.PreparedRequest] = []
+
+    def send(self, request, **kwargs):
+        self.sent.append(request)
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = "application/json"
+        response._content = json.dumps({"historyId": "42"}).encode("utf-8")
+        response.request = request
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+def test_services_share_one_authorized_pooled_transport():
+    creds = Credentials(token="access-token")
+    gmail, calendar = transport.build_services(creds)
+    http = gmail._http
+    assert calendar._http is http
+    assert http.session.get_adapter("https://gmail.googleapis.com") is transport.shared_adapter()
+
+    adapter = RecordingAdapter()
+    http.session.mount("https://", adapter)
+    request = gmail.users().getProfile(userId="me", fields=GMAIL_PROFILE_FIELDS)
+
+    assert execute(request) == {"historyId": "42"}
+    assert adapter.sent[0].headers["Authorization"] == "Bearer access-token"
+    # Quota accounting still sees whose request it is.
+    assert scheduler_for(request) is scheduler_for(gmail.users().getProfile(userId="me"))
+    other_gmail, _ = transport.build_services(Credentials(token="other"))
+    assert scheduler_for(request) is not scheduler_for(other_gmail.users().getProfile(userId="me"))